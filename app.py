@@ -1,14 +1,17 @@
 from flask import Flask, render_template, request, Response, url_for
 import pandas as pd
+import numpy as np
 import os
 import fastf1
 import time
+import click
 from datetime import datetime
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask import Flask, render_template, request, Response, url_for, redirect
 from flask_login import LoginManager
-from model import db, User, UserRaceResult
+from model import db, User, UserRaceResult, add_missing_columns, backfill_driver_ids, check_driver_ids
+from log_utils import get_logger
 
 
 from core_utils import (
@@ -17,19 +20,32 @@ from core_utils import (
     get_cached_race,
     is_race_cached,
     fetch_and_cache_race,
-    delete_duplicate_grand_prix_files
+    delete_duplicate_grand_prix_files,
+    bump_data_version,
+    race_dir,
+    list_race_files,
+    get_schedule,
+    race_start,
+    utc_now
 )
 from points_utils import (
     generate_all_driver_ratings,
     process_latest_race_and_apply_boosts,
     process_single_race_and_apply_boosts,
     generate_driver_rating,
-    calculate_fantasy_value
+    calculate_fantasy_value,
+    load_driver_ratings
 )
+from projection_utils import get_projections, get_driver_projection
+from scoring import format_breakdown
+from response_cache import cached_view
+from concurrency import limit_concurrency
+from driver_registry import get_registry
 
 
 
 fastf1.Cache.enable_cache("/mnt/f1_cache")
+log = get_logger("app")
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:////mnt/f1_cache/users.db'
@@ -40,31 +56,6 @@ login_manager.login_view = 'login'
 from flask_cors import CORS
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
-# Mapping of driver abbreviations to full names
-DRIVER_NAME_MAP = {
-    "VER": "Max Verstappen",
-    "TSU": "Yuki Tsunoda",
-    "LEC": "Charles Leclerc",
-    "HAM": "Lewis Hamilton",
-    "RUS": "George Russell",
-    "ANT": "Andrea Kimi Antonelli",
-    "NOR": "Lando Norris",
-    "PIA": "Oscar Piastri",
-    "ALO": "Fernando Alonso",
-    "STR": "Lance Stroll",
-    "GAS": "Pierre Gasly",
-    "COL": "Franco Colapinto",
-    "OCO": "Esteban Ocon",
-    "BEA": "Oliver Bearman",
-    "ALB": "Alex Albon",
-    "SAI": "Carlos Sainz",
-    "HUL": "Nico Hülkenberg",
-    "BOR": "Gabriel Bortoleto",
-    "HAD": "Isack Hadjar",
-    "LAW": "Liam Lawson",
-    "DOO": "Jack Doohan",
-}
-
 
 def normalize_points(values_dict):
     """Return a new dict scaled between 1-100 for numeric values."""
@@ -97,6 +88,7 @@ CACHE_DIR = "/mnt/f1_cache"
 
 
 @app.route("/")
+@cached_view(per_user=True)
 def home():
     drivers = get_all_cached_drivers()
 
@@ -104,28 +96,20 @@ def home():
     driver_points_raw = {}
     driver_last3_raw = {}
 
+    ratings = load_driver_ratings()
     for d in drivers:
         try:
-            path = os.path.join(CACHE_DIR, f"Driver Rating - {d}.csv")
-            if not os.path.exists(path):
-                raise FileNotFoundError
-
-            df = pd.read_csv(path)
-
-            seasonal = df[df["Scope"] == "Seasonal Average"]
-            career = df[df["Scope"] == "Career Average"]
-            last_3 = df[df["Scope"] == "Last 3 Races Avg"]
-            last_race = df[df["Scope"].isna()]
-
-            seasonal_avg = seasonal["Total Points"].values[0] if not seasonal.empty else None
-            career_avg = career["Total Points"].values[0] if not career.empty else None
-            last_3_avg = last_3["Total Points"].values[0] if not last_3.empty else None
-            last_points = last_race["Total Points"].iloc[0] if not last_race.empty else None
+            rating = ratings.get(d)
+            if rating is None:
+                # No saved rating yet (e.g. a new driver): expected, not an error.
+                driver_values[d] = "N/A"
+                continue
 
-            if seasonal_avg is not None and career_avg is not None and last_3_avg is not None:
-                fantasy_value = calculate_fantasy_value(career_avg, seasonal_avg, last_3_avg)
-            else:
-                fantasy_value = None
+            seasonal_avg = rating.points("seasonal")
+            career_avg = rating.points("career")
+            last_3_avg = rating.points("last_3")
+            last_points = rating.last_points
+            fantasy_value = calculate_fantasy_value(career_avg, seasonal_avg, last_3_avg)
 
             driver_values[d] = f"${fantasy_value:,.0f}" if fantasy_value else "N/A"
             if last_points is not None:
@@ -134,7 +118,7 @@ def home():
                 driver_last3_raw[d] = last_3_avg
 
         except Exception as e:
-            print(f"⚠️ {d}: {e}")
+            log.warning("⚠️ Could not value %s on the home page: %s", d, e)
             driver_values[d] = "N/A"
 
     # Normalize points
@@ -150,14 +134,13 @@ def home():
 
     last_race_used = get_last_processed_race() or "Unknown"
 
-    print("✅ Drivers:", drivers)
-    print("✅ Top Drivers:", top_drivers)
+    log.debug("✅ Home: %d drivers, top drivers %s", len(drivers), top_drivers)
 
     return render_template(
         "home.html",
         drivers=drivers,
         top_drivers=top_drivers,
-        driver_name_map=DRIVER_NAME_MAP,
+        driver_name_map=get_registry().name_map(),
         last_race_used=last_race_used,
         driver_values=driver_values,
         driver_points=driver_points
@@ -165,32 +148,13 @@ def home():
 
 @app.route("/scrape/top-driver")
 def scrape_top_driver():
-    drivers = get_all_cached_drivers()
-    top_driver = None
-    top_points = None
-    driver_last3 = {}
-
-    for d in drivers:
-        try:
-            path = os.path.join(CACHE_DIR, f"Driver Rating - {d}.csv")
-            if not os.path.exists(path):
-                continue
-            df = pd.read_csv(path)
-            last_3 = df[df["Scope"] == "Last 3 Races Avg"]
-            last_3_avg = last_3["Total Points"].values[0] if not last_3.empty else None
-            if last_3_avg is not None:
-                driver_last3[d] = last_3_avg
-                if not top_driver or last_3_avg > top_points:
-                    top_driver = d
-                    top_points = last_3_avg
-        except Exception:
-            continue
+    from points_utils import last_3_points, top_driver
 
-    if top_driver:
-        norm_map = normalize_points(driver_last3)
-        norm_points = norm_map.get(top_driver, "N/A")
+    driver, _ = top_driver()
+    if driver:
+        norm_points = normalize_points(last_3_points()).get(driver, "N/A")
         html = f"""
-        <span class="driver">{DRIVER_NAME_MAP.get(top_driver, top_driver)}</span>
+        <span class="driver">{get_registry().name(driver)}</span>
         <span class="points">{norm_points}</span>
         """
         return html
@@ -220,37 +184,80 @@ def reset_user(user_id):
 
 @app.route("/api/top-driver")
 def api_top_driver():
-    drivers = get_all_cached_drivers()
-    top_driver = None
-    top_points = None
+    from flask import jsonify
+    from points_utils import top_driver
 
-    for d in drivers:
-        try:
-            path = os.path.join(CACHE_DIR, f"Driver Rating - {d}.csv")
-            if not os.path.exists(path):
-                continue
-            df = pd.read_csv(path)
-            last_3 = df[df["Scope"] == "Last 3 Races Avg"]
-            last_3_avg = last_3["Total Points"].values[0] if not last_3.empty else None
-            if last_3_avg is not None:
-                if not top_driver or last_3_avg > top_points:
-                    top_driver = d
-                    top_points = last_3_avg
-        except:
-            continue
+    driver, points = top_driver()
+    if driver:
+        return jsonify(driver=driver, points=round(points, 2))
+    else:
+        return {"driver": None, "points": None}
 
-    if top_driver:
-        from flask import jsonify
 
-        return jsonify(driver=top_driver, points=round(top_points, 2))
+def _live_busy():
+    from live_updates import POLL_AFTER
+    response = Response("Live stream is full; poll /api/live?since=<version> instead.", status=503)
+    response.headers["Retry-After"] = str(POLL_AFTER)
+    return response
+
 
+@app.route("/api/live/stream")
+def live_stream():
+    """Server-sent events: leaderboard, top driver and latest race on every data change.
+
+    Reconnecting clients send Last-Event-ID (the data version) and only get
+    a frame once something newer is published. Frames are pushed by the
+    broadcaster into this client's mailbox; beyond MAX_STREAMS open streams
+    the request is refused with 503.
+    """
+    from live_updates import get_broadcaster
+    broadcaster = get_broadcaster(app)
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("since", "")
+    client = broadcaster.subscribe()
+    if client is None:
+        return _live_busy()
+    response = Response(broadcaster.stream(client, int(last_id) if last_id.isdigit() else None),
+                        mimetype="text/event-stream")
+    response.call_on_close(lambda: broadcaster.unsubscribe(client))
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/api/live")
+def live_snapshot():
+    """The live snapshot as JSON, answered immediately.
+
+    Pass the last seen version as ?since=<version> (or If-None-Match): an
+    unchanged version gets an empty 304. Retry-After says when to poll again.
+    """
+    from flask import jsonify
+    from live_updates import get_broadcaster, POLL_AFTER
+    broadcaster = get_broadcaster(app)
+    since = request.args.get("since", type=int)
+
+    if broadcaster.version is None:
+        broadcaster.refresh()
+    version, snapshot = broadcaster.version, broadcaster.snapshot
+    etag = str(version)
+    if since == version or request.if_none_match.contains(etag):
+        response = Response(status=304)
     else:
-        return {"driver": None, "points": None}
+        response = jsonify(snapshot)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Retry-After"] = str(POLL_AFTER)
+    return response
 
 
-@app.route("/generate_all_driver_ratings", methods=["GET", "POST"])
+@app.route("/generate_all_driver_ratings", methods=["POST"])
+@login_required
+@limit_concurrency(1, retry_after=30)
 def generate_all_driver_ratings_route():
-    print("🚀 POST /generate_all_driver_ratings triggered")
+    if current_user.username not in {"admin", "siaaah"}:
+        return "⛔ Access Denied", 403
+
+    log.info("🚀 /generate_all_driver_ratings triggered")
     generate_all_driver_ratings()
     return "<h2>✅ Driver ratings generated.</h2><a href='/'>⬅ Back</a>"
 
@@ -266,18 +273,25 @@ def clear_driver_ratings():
                     yield f"<li>✅ Deleted {file}</li>"
                 except Exception as e:
                     yield f"<li>❌ Failed to delete {file}: {e}</li>"
+        bump_data_version()
         yield "</ul><a href='/'>⬅ Back</a>"
     return Response(generate(), mimetype='text/html')
 
 
-@app.route("/test_boosts", methods=["GET"])
+@app.route("/test_boosts", methods=["POST"])
+@login_required
+@limit_concurrency(1, retry_after=30)
 def test_boosts():
+    if current_user.username not in {"admin", "siaaah"}:
+        return "⛔ Access Denied", 403
+
     from points_utils import process_latest_race_and_apply_boosts
-    print("🚨 Calling boost processor manually from test route")
+    log.info("🚨 Calling boost processor manually from test route")
     success, message = process_latest_race_and_apply_boosts()
     return message
 
 @app.route("/weighted")
+@cached_view()
 def weighted():
     weighted_path = os.path.join(CACHE_DIR, "Weighted Driver Averages.csv")
     if not os.path.exists(weighted_path):
@@ -292,51 +306,33 @@ def weighted():
 from model import RosteredDrivers
 
 @app.route("/generate_driver_rating", methods=["GET", "POST"])
+@cached_view(per_user=True, vary=lambda: datetime.utcnow().date())
+@limit_concurrency(4, max_queue=32, timeout=10)
 def generate_driver_rating_route():
     from model import RosteredDrivers
 
-    driver_image_map = {
-        "ALB": "Alex.webp", "SAI": "Carlos.webp", "LEC": "Charles.webp",
-        "OCO": "Ocon.webp", "ALO": "Fernando.webp", "BOR": "Gabe.webp",
-        "RUS": "FuckFace.webp", "HAD": "Isack.webp", "DOO": "Jack.webp",
-        "ANT": "Kimi.webp", "STR": "Lance.webp", "NOR": "Lando.webp",
-        "HAM": "Lewis.webp", "PIA": "Oscar.webp", "GAS": "Pierre.webp",
-        "SAR": "Logan.webp", "VER": "Max.webp", "ZHO": "Guanyu.webp",
-        "TSU": "Yuki.webp", "BOT": "Valtteri.webp", "HUL": "Nico.webp"
-    }
-
     driver = request.form.get("driver") if request.method == "POST" else request.args.get("driver")
     if not driver:
         return "<h2>⚠️ Please enter a valid driver abbreviation.</h2><a href='/'>⬅ Back</a>"
 
     driver = driver.upper().strip()
-    img_filename = driver_image_map.get(driver, "placeholder.webp")
-    driver_img_url = url_for("static", filename=f"driver_images/{img_filename}")
+    registry = get_registry()
+    driver_img_url = url_for("static", filename=f"driver_images/{registry.image(driver)}")
     weekday = datetime.utcnow().weekday()
 
     try:
-        df, weighted_avg, fantasy_value, previous_weighted_avg = generate_driver_rating(driver)
-
-        if df.empty:
+        rating = generate_driver_rating(driver)
+        if rating.empty:
             return f"<h2>❌ No data available for {driver}</h2><a href='/'>⬅ Back</a>", 404
 
-        # Filter clean rows
-        real_races_df = df[df["Scope"].isna()].sort_values(by="EventDate", ascending=False)
-
-
-        # Stat rows
-        season_avg_row = df[df["Scope"] == "Seasonal Average"].drop(columns=["Q/R/+O", "Year", "Grand Prix"])
-        last_3_row = df[df["Scope"] == "Last 3 Races Avg"].drop(columns=["Q/R/+O", "Year", "Grand Prix"])
-        prev_3_row = df[df["Scope"] == "Prev 3 Races Avg"].drop(columns=["Q/R/+O", "Year", "Grand Prix"])
-        last_race_row = real_races_df.head(1).drop(columns=["Q/R/+O", "Year", "Grand Prix"])
-
-        # NEW: Last 3 scored races
-        last_3_scored = real_races_df.head(3).drop(columns=["Q/R/+O", "Scope"]).to_dict(orient="records")
-
+        fantasy_value = rating.fantasy_value
+        previous_weighted_avg = rating.previous_weighted
+        season_avg = rating.aggregate("seasonal")
+        last_3_scored = rating.recent(3)
 
         fantasy_value_display = f"${round(fantasy_value):,}" if fantasy_value else "N/A"
         previous_value = (
-            round((season_avg_row["Total Points"].values[0] * 0.9 + previous_weighted_avg * 0.1) * 250000)
+            round((season_avg["Total Points"] * 0.9 + previous_weighted_avg * 0.1) * 250000)
             if previous_weighted_avg else None
         )
         previous_value_display = f"${previous_value:,}" if previous_value else "N/A"
@@ -347,10 +343,12 @@ def generate_driver_rating_route():
             if fantasy_value and previous_value else ""
         )
 
+        projection = get_driver_projection(driver)
+
         # Get user-specific data
         user_stats = None
         if current_user.is_authenticated:
-            user_roster = RosteredDrivers.query.filter_by(user_id=current_user.id, driver=driver).first()
+            user_roster = RosteredDrivers.query.filter_by(user_id=current_user.id, driver_id=registry.id(driver)).first()
             if user_roster:
                 user_stats = {
                     "value_at_buy": round(user_roster.value_at_buy),
@@ -367,13 +365,14 @@ def generate_driver_rating_route():
             previous_value=previous_value_display,
             value_color=value_color,
             percent_display=percent_display,
-            season_avg=season_avg_row.to_dict(orient="records")[0],
-            last_3=last_3_row.to_dict(orient="records")[0],
-            prev_3=prev_3_row.to_dict(orient="records")[0],
-            last_race=last_race_row.to_dict(orient="records")[0],
+            season_avg=season_avg,
+            last_3=rating.aggregate("last_3"),
+            prev_3=rating.aggregate("prev_3"),
+            last_race=last_3_scored[0],
             last_3_scored=last_3_scored,
             weekday=weekday,
-            user_stats=user_stats
+            user_stats=user_stats,
+            projection=projection
         )
 
     except Exception as e:
@@ -381,14 +380,162 @@ def generate_driver_rating_route():
 
 
 
+@app.route("/api/projections")
+def api_projections():
+    from flask import jsonify
+
+    df = get_projections()
+    drivers = [d.strip().upper() for d in request.args.get("drivers", "").split(",") if d.strip()]
+    if drivers and not df.empty:
+        df = df[df["Driver"].isin(drivers)]
+    return jsonify(projections=df.to_dict(orient="records"))
+
+
+def _driver_list_arg(name):
+    return [d.strip().upper() for d in request.args.get(name, "").split(",") if d.strip()]
+
+
+API_DRIVER_FIELDS = ("name", "weighted_total", "fantasy_value", "previous_weighted", "averages", "last_n_avg", "recent")
+RECENT_COLUMNS = ["Year", "Grand Prix", "EventDate", "Quali", "Race",
+                  "points_from_quali", "points_from_race", "points_from_gain", "Total Points"]
+SCOPE_KEYS = ("seasonal", "career", "last_3", "prev_3")
+
+
+def _recent_value(column, value):
+    from json_utils import clean
+    if pd.isna(value):
+        return None
+    if column == "EventDate":
+        return value.date().isoformat()
+    if column == "Year":
+        return int(value)
+    return clean(value)
+
+
+@app.route("/api/drivers")
+def api_drivers():
+    """Ratings, values, averages and recent races for many drivers in one call.
+
+    ?drivers=VER,HAM (default: all), ?fields=fantasy_value,recent (default: all),
+    ?n=3 recent races / last-N average. Served from the precomputed rating
+    files; ETag is the data version plus the query, so unchanged data costs a 304.
+    """
+    import zlib
+    from json_utils import dumps, clean
+    from points_utils import get_price_table
+    from core_utils import get_data_version
+
+    fields = [f.strip().lower() for f in request.args.get("fields", "").split(",") if f.strip()]
+    unknown = sorted(set(fields) - set(API_DRIVER_FIELDS))
+    if unknown:
+        return Response(dumps({"error": f"Unknown fields: {', '.join(unknown)}", "fields": API_DRIVER_FIELDS}),
+                        status=400, mimetype="application/json")
+    fields = set(fields or API_DRIVER_FIELDS)
+    n = min(max(request.args.get("n", 3, type=int), 1), 20)
+
+    version = get_data_version()
+    etag = f"{version}-{zlib.crc32(request.query_string):08x}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    prices = get_price_table()
+    ratings = load_driver_ratings()
+
+    registry = get_registry()
+    requested = _driver_list_arg("drivers")
+    known = set(prices.index) | set(ratings)
+    drivers = requested or sorted(known)
+
+    payload = []
+    for driver in drivers:
+        if driver not in known:
+            continue
+        entry = {"driver": driver}
+        if "name" in fields:
+            entry["name"] = registry.name(driver)
+        for field, column in (("weighted_total", "Weighted Total"), ("fantasy_value", "Fantasy Value"),
+                              ("previous_weighted", "Previous Weighted")):
+            if field in fields:
+                entry[field] = clean(prices.at[driver, column]) if driver in prices.index and column in prices else None
+        rating = ratings.get(driver)
+        if "averages" in fields:
+            entry["averages"] = {} if rating is None else {
+                scope: clean(round(rating.points(scope), 2))
+                for scope in SCOPE_KEYS if getattr(rating, scope) is not None
+            }
+        if "last_n_avg" in fields:
+            entry["last_n_avg"] = (
+                clean(round(float(np.nanmean(rating.column("Total Points")[-n:])), 2))
+                if rating is not None and not rating.empty else None
+            )
+        if "recent" in fields:
+            entry["recent"] = [] if rating is None else [
+                {column: _recent_value(column, race[column]) for column in RECENT_COLUMNS}
+                for race in rating.recent(n)
+            ]
+        payload.append(entry)
+
+    body = dumps({
+        "version": version,
+        "n": n,
+        "drivers": payload,
+        "missing": [d for d in requested if d not in known],
+    })
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@app.route("/api/solver")
+def api_solver():
+    from flask import jsonify
+    from team_solver import best_rosters, STARTING_BALANCE
+
+    metric = request.args.get("metric", "projected")
+    budget = request.args.get("budget", STARTING_BALANCE, type=float)
+    k = min(max(request.args.get("k", 5, type=int), 1), 50)
+    try:
+        rosters = best_rosters(metric, budget, k=k, include=_driver_list_arg("include"),
+                               exclude=_driver_list_arg("exclude"))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(metric=metric, budget=budget, rosters=rosters)
+
+
+@app.route("/api/solver/swaps")
+@login_required
+def api_solver_swaps():
+    from flask import jsonify
+    from team_solver import best_swaps
+
+    metric = request.args.get("metric", "projected")
+    k = min(max(request.args.get("k", 5, type=int), 1), 50)
+    max_swaps = request.args.get("max_swaps", type=int)
+
+    team = current_user.drivers.split(",") if current_user.drivers else []
+    records = {r.driver: r for r in RosteredDrivers.query.filter_by(user_id=current_user.id).all()}
+    # Same refund remove_driver would pay out.
+    holdings = {d: (records[d].current_value if d in records else get_driver_price(d)) for d in team}
+    try:
+        swaps = best_swaps(current_user.balance, holdings, metric=metric, k=k, max_swaps=max_swaps,
+                           exclude=_driver_list_arg("exclude"))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(metric=metric, balance=current_user.balance, current=team, options=swaps)
+
+
 @app.route("/admin/management")
 @login_required
 def admin_management():
     if current_user.username not in {"admin", "siaaah"}:
         return "⛔ Access Denied", 403
 
-    cached_races = [f for f in os.listdir(CACHE_DIR) if f.endswith(".csv") and " - " in f]
-    return render_template("admin_management.html", cached_races=sorted(cached_races))
+    from scoring import RULE_SETS, CURRENT_RULES
+    return render_template("admin_management.html", cached_races=list_race_files(),
+                           rule_versions=sorted(RULE_SETS), current_rules=CURRENT_RULES)
 
 
 @app.route("/boost/<category>", methods=["POST"])
@@ -423,95 +570,104 @@ def update_users():
     if current_user.username not in {"admin", "siaaah"}:
         return "⛔ Access Denied", 403
 
-    users = User.query.all()
-    for user in users:
-        bal_key = f"balance_{user.id}"
-        drv_key = f"drivers_{user.id}"
+    # Only the users rendered on the submitted page have fields in the form.
+    submitted = {}
+    for key, value in request.form.items():
+        field, _, user_id = key.partition("_")
+        if field in {"balance", "drivers"} and user_id.isdigit():
+            submitted.setdefault(int(user_id), {})[field] = value
+
+    updates = []
+    if submitted:
+        current = db.session.query(User.id, User.balance, User.drivers).filter(User.id.in_(list(submitted)))
+        for user_id, balance, drivers in current:
+            fields = submitted[user_id]
+            change = {}
+            if "balance" in fields:
+                try:
+                    new_balance = float(fields["balance"])
+                    if new_balance != balance:
+                        change["balance"] = new_balance
+                except ValueError:
+                    pass
+            if "drivers" in fields and fields["drivers"] != (drivers or ""):
+                change["drivers"] = fields["drivers"]
+            if change:
+                updates.append({"id": user_id, **change})
+
+    if updates:
+        db.session.bulk_update_mappings(User, updates)
+        db.session.commit()
+    log.info("🛠️ Admin updated %d of %d submitted users", len(updates), len(submitted))
 
-        if bal_key in request.form:
-            try:
-                user.balance = float(request.form[bal_key])
-            except ValueError:
-                pass
-
-        if drv_key in request.form:
-            user.drivers = request.form[drv_key]
-
-    db.session.commit()
-    return redirect("/admin/users")
+    return redirect(url_for("admin_users", page=request.form.get("page", 1), q=request.form.get("q", "")))
 
 
 from model import RosteredDrivers
 
-@app.route("/add_driver/<driver>", methods=["POST"])
-@login_required
-def add_driver(driver):
-    driver = driver.upper()
-    team = current_user.drivers.split(",") if current_user.drivers else []
-    MAX_TEAM_SIZE = 5
-
-    if driver in team:
-        return "❌ Already on your team.", 400
-
-    if len(team) >= MAX_TEAM_SIZE:
-        return "❌ Team full.", 400
-
-    price = get_driver_price(driver)
-    if current_user.balance < price:
-        return f"❌ Not enough balance. {driver} costs ${price:,}", 400
-
-    _, hype, value, _ = generate_driver_rating(driver)
-    rostered = RosteredDrivers(
-        user_id=current_user.id,
-        driver=driver,
-        hype_at_buy=hype,
-        value_at_buy=value,
-        current_value=value
-    )
-    db.session.add(rostered)
+# F1_ORDER_QUEUE=1: trades are queued and cleared in batched transactions
+# instead of one commit each (see order_queue.py).
+from order_queue import ENABLED as ORDER_QUEUE_ENABLED
+order_queue = None
+if ORDER_QUEUE_ENABLED:
+    from order_queue import OrderQueue
+    order_queue = OrderQueue(app).start()
+ORDER_WAIT = 5  # seconds a trade request waits for its batch before answering 202
 
-    team.append(driver)
-    current_user.drivers = ",".join(team)
-    current_user.balance -= price
-    db.session.commit()
-    return redirect("/")
 
+def _trade(side, driver):
+    """(ok, message, order) for a buy/sell, direct or through the order queue."""
+    if order_queue is None:
+        from trade_utils import buy_driver, sell_driver
+        ok, message = (buy_driver if side == "buy" else sell_driver)(current_user.id, driver)
+        return ok, message, None
+    order = order_queue.submit(current_user.id, side, driver)
+    order.wait(ORDER_WAIT)
+    return order.ok, order.message, order
 
-    # Update user record
-    team.append(driver)
-    current_user.drivers = ",".join(team)
-    current_user.balance -= price
 
-    db.session.commit()
-    return redirect("/")
+def _trade_response(ok, message, order, redirect_to):
+    if order is not None and order.status == "queued":
+        return f"{message} Check /api/orders/{order.id} for the result.", 202
+    if not ok:
+        return message, 400
+    return redirect(redirect_to)
 
 
+@app.route("/add_driver/<driver>", methods=["POST"])
+@login_required
+def add_driver(driver):
+    return _trade_response(*_trade("buy", driver), redirect_to="/")
 
 
 @app.route("/remove_driver/<driver>", methods=["POST"])
 @login_required
 def remove_driver(driver):
-    driver = driver.upper()
-    team = current_user.drivers.split(",")
+    return _trade_response(*_trade("sell", driver), redirect_to="/profile")
 
-    if driver not in team:
-        return "❌ Driver not on your team.", 400
 
-    # Refund value based on current value
-    record = RosteredDrivers.query.filter_by(user_id=current_user.id, driver=driver).first()
-    refund = record.current_value if record else get_driver_price(driver)
-
-    # Remove from rostered drivers
-    if record:
-        db.session.delete(record)
+@app.route("/api/orders/<int:order_id>")
+@login_required
+def api_order(order_id):
+    from flask import jsonify
+    order = order_queue.get(order_id) if order_queue is not None else None
+    if order is None or order.user_id != current_user.id:
+        return jsonify(error="Unknown order"), 404
+    return jsonify(order.to_dict())
 
-    # Update team
-    team.remove(driver)
-    current_user.drivers = ",".join(team)
-    current_user.balance += refund
 
-    db.session.commit()
-    return redirect("/profile")
+@app.route("/api/trades")
+@login_required
+def api_trades():
+    """The current user's most recent buys and sells from the trade ledger."""
+    from flask import jsonify
+    from trade_utils import recent_trades
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+    return jsonify(trades=[
+        {"driver": t.driver, "side": t.side, "price": t.price, "balance_after": t.balance_after,
+         "at": datetime.utcfromtimestamp(t.created_at).isoformat() + "Z"}
+        for t in recent_trades(current_user.id, limit)
+    ])
 
 
 def get_user_driver_data(user_id):
@@ -531,39 +687,19 @@ def get_user_driver_data(user_id):
 
 @app.route("/preload", methods=["POST"])
 def preload():
-    year = int(request.form.get("year", 2023))
-    print(f"🔁 Manually triggered preload for {year}")
+    from score_cube import get_cube
 
-    try:
-        schedule = fastf1.get_event_schedule(year)
+    year = int(request.form.get("year", 2023))
+    log.info("🔁 Manually triggered preload for %s", year)
 
-        # Limit to races before Miami 2025 (exclusive)
-        if year == 2025:
-            schedule = schedule[schedule["EventName"] != "Miami Grand Prix"]
-        else:
-            schedule = schedule[schedule['EventDate'] < pd.Timestamp.now()]
-    except Exception as e:
-        return f"<h2>Failed to get schedule for {year}: {e}</h2>", 500
-
-    all_results = []
-    for _, row in schedule.iterrows():
-        df = calculate_points(year, row["EventName"])
-        if not df.empty:
-            all_results.append(df)
-        time.sleep(1)
-
-    if all_results:
-        avg_cache_file = os.path.join(CACHE_DIR, f"averages_{year}.csv")
-        df = pd.concat(all_results)
-        drivers = df["Driver"].value_counts()
-        df = df[df["Driver"].isin(drivers[drivers >= 5].index)]
-        avg_df = df.groupby("Driver")[["Quali", "Race", "+Pos", "Total Points"]].mean().round(2).reset_index()
-        avg_df = avg_df.sort_values("Total Points", ascending=False)
-        avg_df.to_csv(avg_cache_file, index=False)
-        return f"<h2>✅ Preloaded and cached averages for {year}</h2><a href='/'>⬅ Back</a>"
-    else:
+    cube = get_cube()
+    if cube.season_id(year) is None:
         return f"<h2>⚠️ No valid data for {year}</h2><a href='/'>⬅ Back</a>"
 
+    avg_df = cube.season_table(year, min_races=5).sort_values("Total Points", ascending=False)
+    avg_df.to_csv(os.path.join(CACHE_DIR, f"averages_{year}.csv"), index=False)
+    return f"<h2>✅ Preloaded and cached averages for {year}</h2><a href='/'>⬅ Back</a>"
+
 
 @app.route("/admin/delete_race", methods=["POST"])
 @login_required
@@ -572,7 +708,7 @@ def delete_race_file():
         return "⛔ Access Denied", 403
 
     race_file = request.form.get("race_file")
-    path = os.path.join(CACHE_DIR, race_file)
+    path = os.path.join(race_dir(), race_file)
 
     if not os.path.exists(path):
         return f"⚠️ File not found: {race_file}<br><a href='/admin/management'>⬅ Back</a>"
@@ -613,7 +749,12 @@ def delete_race_file():
             df = df[df["Grand Prix"] != gp_name]
             df.to_csv(avg_path, index=False)
 
-        # Step 6: Remove FastF1 session cache
+        # Step 6: Remove archived session results
+        from archive_utils import delete_event
+        delete_event(year, raw_gp_name)
+        delete_event(year, gp_name)
+
+        # Step 7: Remove FastF1 session cache
         try:
             import shutil
             event = fastf1.get_event(year, gp_name)
@@ -621,8 +762,9 @@ def delete_race_file():
             if os.path.exists(session_path):
                 shutil.rmtree(session_path)
         except Exception as e:
-            print(f"⚠️ Failed to delete FastF1 session cache: {e}")
+            log.warning("⚠️ Failed to delete FastF1 session cache: %s", e)
 
+        bump_data_version()
         return f"✅ Deleted all traces of {race_file}<br><a href='/admin/management'>⬅ Back</a>"
     except Exception as e:
         return f"❌ Error deleting {race_file}: {e}<br><a href='/admin/management'>⬅ Back</a>"
@@ -630,21 +772,16 @@ def delete_race_file():
 
 
 @app.route("/season")
+@cached_view()
 def season():
-    year = 2023
-    schedule = fastf1.get_event_schedule(year)
-    schedule = schedule[schedule['EventDate'] < pd.Timestamp.now()]  # Only past races
-    all_results = []
-    for _, row in schedule.iterrows():
-        df = calculate_points(year, row["EventName"])
-        if not df.empty:
-            df["Race ID"] = row["EventName"]
-            all_results.append(df)
-
-    if not all_results:
+    from score_cube import get_cube
+
+    year = request.args.get("year", 2023, type=int)
+    season_df = get_cube().rows([year])
+    if season_df.empty:
         return "<h2>No valid race data for this season.</h2>"
 
-    season_df = pd.concat(all_results)
+    season_df = season_df.assign(**{"Race ID": season_df["Grand Prix"]})
     races = season_df.to_dict(orient="records")
     return render_template("season.html", races=races)
 
@@ -654,13 +791,14 @@ def admin_preload():
     if current_user.username not in {"admin", "siaaah"}:
         return "⛔ Access Denied", 403
 
-    year_limit = int(request.form.get("year_limit", 2025))
-    stop_gp = request.form.get("stop_gp", "Miami Grand Prix").strip()
+    year_limit = request.form.get("year_limit", type=int)
+    stop_gp = request.form.get("stop_gp", "").strip() or None
 
     try:
         from core_utils import preload_race_data_until
         preload_race_data_until(year_limit, stop_gp)
-        return f"<h2>✅ Preloaded all races up to {stop_gp} in {year_limit}</h2><a href='/admin/management'>⬅ Back</a>"
+        until = f"{stop_gp} in {year_limit}" if stop_gp else (year_limit or "today")
+        return f"<h2>✅ Preloaded all races up to {until}</h2><a href='/admin/management'>⬅ Back</a>"
     except Exception as e:
         return f"<h2>❌ Failed to preload races: {e}</h2><a href='/admin/management'>⬅ Back</a>", 500
 
@@ -675,7 +813,7 @@ def admin_fetch_race():
     gp_name = clean_gp_name(request.form.get("gp_name", "").strip())
 
     from core_utils import fetch_and_cache_race
-    success = fetch_and_cache_race(year, gp_name)
+    success = fetch_and_cache_race(year, gp_name, refresh=True)
     if success:
         return f"<h2>✅ Fetched and cached {gp_name} ({year})</h2><a href='/admin/management'>⬅ Back</a>"
     else:
@@ -683,39 +821,20 @@ def admin_fetch_race():
 
 
 @app.route("/averages")
+@cached_view()
 def averages():
-    year = int(request.args.get("year", 2023))
-    cache_path = os.path.join(CACHE_DIR, f"averages_{year}.csv")
-
-    if os.path.exists(cache_path):
-        avg_df = pd.read_csv(cache_path)
-        print(f"✅ Loaded cached averages for {year}")
-    else:
-        try:
-            schedule = fastf1.get_event_schedule(year)
-            schedule = schedule[schedule['EventDate'] < pd.Timestamp.now()]  # Only past races
-        except Exception as e:
-            return f"<h2>Failed to load schedule for {year}: {e}</h2>", 500
+    from score_cube import get_cube
 
-        all_results = []
-        for _, row in schedule.iterrows():
-            df = calculate_points(year, row["EventName"])
-            if not df.empty:
-                all_results.append(df)
-            time.sleep(1)
-
-        if not all_results:
-            return "<h2>No data to average.</h2>"
-
-        df = pd.concat(all_results)
-        drivers = df["Driver"].value_counts()
-        df = df[df["Driver"].isin(drivers[drivers >= 5].index)]
-        avg_df = df.groupby("Driver")[["Quali", "Race", "+Pos", "Total Points"]].mean().round(2).reset_index()
-        avg_df = avg_df.sort_values("Total Points", ascending=False)
-        avg_df.to_csv(cache_path, index=False)
+    year = int(request.args.get("year", 2023))
+    cube = get_cube()
+    season = cube.season_id(year)
+    if season is None:
+        return "<h2>No data to average.</h2>"
 
+    avg_df = cube.season_table(year, min_races=5).sort_values("Total Points", ascending=False)
+    race_count = int(cube.race_mask[season].sum())
     html_table = avg_df.to_html(classes="table table-bordered text-center", index=False)
-    return render_template("averages.html", table=html_table, year=year, race_count=len(avg_df))
+    return render_template("averages.html", table=html_table, year=year, race_count=race_count)
 
 
 @app.route("/delete_averages")
@@ -730,6 +849,7 @@ def delete_averages():
     try:
         if os.path.exists(cache_path):
             os.remove(cache_path)
+            bump_data_version()
             return f"🗑️ Deleted cached averages for {year}"
         else:
             return f"ℹ️ No cached file found for year {year}"
@@ -738,36 +858,12 @@ def delete_averages():
 
 @app.route("/profile")
 @login_required
+@limit_concurrency(4, max_queue=32, timeout=10)
 def profile():
     drivers = current_user.drivers.split(",") if current_user.drivers else []
     driver_cards = []
 
-    driver_info = {
-        "VER": {"name": "Max Verstappen", "image": "Max.webp"},
-        "TSU": {"name": "Yuki Tsunoda", "image": "Yuki.webp"},
-        "LEC": {"name": "Charles Leclerc", "image": "Charles.webp"},
-        "HAM": {"name": "Lewis Hamilton", "image": "Lewis.webp"},
-        "RUS": {"name": "George Russell", "image": "FuckFace.webp"},
-        "ANT": {"name": "Andrea Kimi Antonelli", "image": "Kimi.webp"},
-        "NOR": {"name": "Lando Norris", "image": "Lando.webp"},
-        "PIA": {"name": "Oscar Piastri", "image": "Oscar.webp"},
-        "ALO": {"name": "Fernando Alonso", "image": "Fernando.webp"},
-        "STR": {"name": "Lance Stroll", "image": "Lance.webp"},
-        "GAS": {"name": "Pierre Gasly", "image": "Pierre.webp"},
-        "COL": {"name": "Franco Colapinto", "image": "placeholder.webp"},
-        "OCO": {"name": "Esteban Ocon", "image": "Ocon.webp"},
-        "BEA": {"name": "Oliver Bearman", "image": "placeholder.webp"},
-        "ALB": {"name": "Alex Albon", "image": "Alex.webp"},
-        "SAI": {"name": "Carlos Sainz", "image": "Carlos.webp"},
-        "HUL": {"name": "Nico Hülkenberg", "image": "Nico.webp"},
-        "BOR": {"name": "Gabriel Bortoleto", "image": "Gabe.webp"},
-        "HAD": {"name": "Isack Hadjar", "image": "Isack.webp"},
-        "LAW": {"name": "Liam Lawson", "image": "placeholder.webp"},
-        "DOO": {"name": "Jack Doohan", "image": "Jack.webp"},
-        "SAR": {"name": "Logan Sargeant", "image": "Logan.webp"},
-        "BOT": {"name": "Valtteri Bottas", "image": "Valtteri.webp"},
-        "ZHO": {"name": "Guanyu Zhou", "image": "Guanyu.webp"}
-    }
+    registry = get_registry()
 
     total_driver_value = 0
     boosts = current_user.boosts.split(";") if current_user.boosts else []
@@ -779,9 +875,10 @@ def profile():
 
     for code in drivers:
         try:
-            df, hype, value, previous = generate_driver_rating(code)
-            if not df.empty:
-                driver_rec = RosteredDrivers.query.filter_by(user_id=current_user.id, driver=code).first()
+            rating = generate_driver_rating(code)
+            hype, value = rating.weighted_total, rating.fantasy_value
+            if not rating.empty:
+                driver_rec = RosteredDrivers.query.filter_by(user_id=current_user.id, driver_id=registry.id(code)).first()
                 value_at_buy = driver_rec.value_at_buy if driver_rec else value
                 boost_pts = driver_rec.boost_points if driver_rec else 0
                 races_owned = driver_rec.races_owned if driver_rec else 0
@@ -789,9 +886,8 @@ def profile():
                 delta = round(value - value_at_buy) if value and value_at_buy else 0
                 delta_class = "text-success" if delta >= 0 else "text-danger"
 
-                img_filename = driver_info.get(code, {}).get("image", "placeholder.webp")
-                full_name = driver_info.get(code, {}).get("name", code)
-                driver_img_url = url_for("static", filename=f"driver_images/{img_filename}")
+                full_name = registry.name(code)
+                driver_img_url = url_for("static", filename=f"driver_images/{registry.image(code)}")
                 total_driver_value += value or 0
 
                 driver_cards.append({
@@ -807,7 +903,7 @@ def profile():
                     "delta_class": delta_class
                 })
         except Exception as e:
-            print(f"❌ Failed to load driver {code}: {e}")
+            log.error("❌ Failed to load driver %s: %s", code, e)
             continue
 
     balance = current_user.balance
@@ -831,6 +927,204 @@ def profile():
         available_boosts=available_boosts
     )
 
+@app.route("/leaderboard")
+def leaderboard():
+    from standings_utils import latest_standings_year, leaderboard_page, standing_to_dict
+
+    year = request.args.get("year", type=int) or latest_standings_year()
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", 50, type=int), 1), 200)
+
+    if year is None:
+        return render_template("leaderboard.html", year=None, rows=[], pagination=None, my_standing=None)
+
+    pagination = leaderboard_page(year, page, per_page)
+    rows = [standing_to_dict(standing, username) for standing, username in pagination.items]
+
+    my_standing = None
+    if current_user.is_authenticated:
+        from model import Standing
+        mine = Standing.query.filter_by(year=year, user_id=current_user.id).first()
+        if mine:
+            my_standing = standing_to_dict(mine, current_user.username)
+
+    return render_template("leaderboard.html", year=year, rows=rows, pagination=pagination, my_standing=my_standing)
+
+
+@app.route("/api/leaderboard")
+def api_leaderboard():
+    from flask import jsonify
+    from standings_utils import latest_standings_year, leaderboard_page, standing_to_dict
+
+    year = request.args.get("year", type=int) or latest_standings_year()
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", 50, type=int), 1), 200)
+    if year is None:
+        return jsonify(year=None, page=page, per_page=per_page, total=0, standings=[])
+
+    pagination = leaderboard_page(year, page, per_page)
+    return jsonify(
+        year=year,
+        page=page,
+        per_page=per_page,
+        total=pagination.total,
+        standings=[standing_to_dict(standing, username) for standing, username in pagination.items],
+    )
+
+
+@app.cli.command("rebuild_standings")
+def rebuild_standings_command():
+    from standings_utils import rebuild_standings
+    years = [y for (y,) in db.session.query(UserRaceResult.year).distinct() if y is not None]
+    for year in years:
+        rebuild_standings(year)
+    print(f"✅ Rebuilt standings for {len(years)} season(s)")
+
+
+@app.cli.command("settle_race")
+@click.argument("year", type=int)
+@click.argument("gp_name")
+@click.option("--force", is_flag=True,
+              help="Reverse a settled race's results and settle the same users again with the teams and "
+                   "boosts they were settled with (e.g. after correcting race data).")
+@click.option("--dry-run", is_flag=True, help="Only preview what settlement would change.")
+def settle_race_command(year, gp_name, force, dry_run):
+    """Settle (or resume settling) one cached race."""
+    if dry_run:
+        from core_utils import get_cached_race
+        from settlement_preview import preview_settlement
+        df = get_cached_race(year, gp_name)
+        if df.empty:
+            print(f"❌ Race not cached: {year} - {gp_name}")
+            return
+        preview = preview_settlement(df, gp_name, year)
+        totals = preview["totals"]
+        print(f"🔍 {year} - {gp_name}: {preview['users']} users, {totals['results']} results, "
+              f"{totals['total_points']:.0f} points ({totals['bonus_points']:.0f} from boosts) "
+              f"in {preview['elapsed_ms']} ms")
+        print(pd.DataFrame(preview["top_movers"]).to_string(index=False))
+        for name, rows in preview["anomalies"].items():
+            if rows:
+                print(f"⚠️ {name}: {len(rows)}")
+        return
+    from points_utils import settle_race
+    success, message = settle_race(year, gp_name, force=force)
+    print(message)
+
+
+@app.route("/api/settlements")
+@login_required
+def api_settlements():
+    """Progress of the most recent race settlements (running ones first)."""
+    from flask import jsonify
+    from model import RaceSettlement
+    if current_user.username not in {"admin", "siaaah"}:
+        return jsonify(error="Access denied"), 403
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 200)
+    markers = RaceSettlement.query.order_by(
+        (RaceSettlement.status == "running").desc(), RaceSettlement.settled_at.desc()
+    ).limit(limit)
+    return jsonify(settlements=[marker.progress() for marker in markers])
+
+
+@app.cli.command("backtest")
+@click.option("--step", type=float, default=0.05, help="Weight grid resolution.")
+@click.option("--season", "seasons", type=int, multiple=True, help="Season(s) to replay (default: all stored).")
+@click.option("--top", type=int, default=15, help="Rows of the ranking to print.")
+@click.option("--sort", "sort_by", type=click.Choice(["mae", "rmse", "corr", "team_points"]), default="mae")
+def backtest_command(step, seasons, top, sort_by):
+    """Replay stored races and rank (career, seasonal, last 3) value weights by predictive error."""
+    from backtest import run_backtest
+    result = run_backtest(step, seasons or None)
+    if not result.attrs["pairs"]:
+        print("⚠️ No stored races to backtest.")
+        return
+    ranked = result.sort_values(sort_by, ascending=sort_by in ("mae", "rmse"), ignore_index=True)
+    print(f"📐 {len(result)} weight sets, {result.attrs['races']} races, {result.attrs['pairs']} driver-race pairs; "
+          f"best possible team: {result.attrs['oracle_team_points']:.1f} pts/race")
+    print(result[result["label"] != ""].to_string(index=False, float_format="{:.3f}".format))
+    print(ranked.head(top).to_string(index=False, float_format="{:.3f}".format))
+
+
+@app.cli.command("watch_races")
+@click.option("--once", is_flag=True, help="Poll due races once and exit.")
+def watch_races_command(once):
+    """Ingest and settle races as soon as their results are published."""
+    from race_watcher import RaceWatcher
+    watcher = RaceWatcher(app)
+    if once:
+        processed = watcher.tick()
+        print(f"✅ Processed {len(processed)} race(s): {processed}")
+        return
+    watcher.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+@app.cli.command("rederive")
+def rederive_command():
+    """Rebuild every race CSV and the ratings from the raw results archive."""
+    from core_utils import rebuild_races_from_archive
+    races = rebuild_races_from_archive()
+    generate_all_driver_ratings()
+    print(f"✅ Re-derived {races} races and driver ratings from the archive")
+
+
+@app.cli.command("rescore")
+@click.option("--rules", "rules_version", type=int, default=None, help="Scoring rules version (default: current).")
+@click.option("--no-ratings", is_flag=True, help="Skip regenerating driver ratings.")
+@click.option("--results", is_flag=True, help="Also recompute UserRaceResult totals and standings.")
+def rescore_command(rules_version, no_ratings, results):
+    """Re-score every stored race from its raw positions (no network)."""
+    from rescore import rescore_all
+    from scoring import get_rules
+    try:
+        get_rules(rules_version)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--rules")
+    summary = rescore_all(rules_version, regenerate=not no_ratings, recompute_results=results)
+    if not summary["generation"]:
+        print("⚠️ No stored races to rescore.")
+        return
+    print(f"✅ {summary['generation']}: {summary['races']} races, {summary['rows']} rows re-scored "
+          f"under rules v{summary['rules_version']}; {summary['user_results']} user results updated")
+    print(summary["report"].head(20).to_string(index=False))
+
+
+@app.route("/admin/rescore", methods=["POST"])
+@login_required
+def admin_rescore():
+    if current_user.username not in {"admin", "siaaah"}:
+        return "⛔ Access Denied", 403
+
+    from rescore import rescore_all
+    try:
+        summary = rescore_all(
+            request.form.get("rules_version", type=int),
+            recompute_results=request.form.get("recompute_results") == "on",
+        )
+    except ValueError as e:
+        return f"❌ {e}<br><a href='/admin/management'>⬅ Back</a>", 400
+    if not summary["generation"]:
+        return "⚠️ No stored races to rescore.<br><a href='/admin/management'>⬅ Back</a>"
+
+    table = summary["report"].to_html(classes="table table-sm table-striped text-center", index=False)
+    return (
+        f"<h2>✅ Re-scored {summary['races']} races into {summary['generation']} "
+        f"(rules v{summary['rules_version']})</h2>"
+        f"<p>{summary['drivers_changed']} driver values changed, "
+        f"{summary['user_results']} user results updated.</p>{table}"
+        f"<a href='/admin/management'>⬅ Back</a>"
+    )
+
+
+@app.template_filter('qro')
+def qro_filter(row):
+    return format_breakdown(row)
+
 @app.template_filter('format_string')
 def format_string_filter(value, fmt="{:,}"):
     try:
@@ -844,17 +1138,25 @@ def admin_users():
     if current_user.username not in {"admin", "siaaah"}:
         return "⛔ Access Denied", 403
 
-    all_users = User.query.all()
-    users_with_drivers = []
+    from sqlalchemy.orm import selectinload
+
+    q = request.args.get("q", "").strip()
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", 50, type=int), 1), 200)
 
-    for user in all_users:
-        drivers = RosteredDrivers.query.filter_by(user_id=user.id).all()
-        users_with_drivers.append({
-            "user": user,
-            "rostered_drivers": drivers
-        })
+    # Rosters for the whole page come from one extra IN query, not one per user.
+    query = User.query.options(selectinload(User.rostered_drivers)).order_by(User.id)
+    if q:
+        pattern = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.filter(User.username.like(f"{pattern}%", escape="\\"))
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
 
-    return render_template("admin_users.html", users=users_with_drivers)
+    users_with_drivers = [
+        {"user": user, "rostered_drivers": user.rostered_drivers}
+        for user in pagination.items
+    ]
+
+    return render_template("admin_users.html", users=users_with_drivers, pagination=pagination, q=q)
 
 
 @app.route("/signup", methods=["GET", "POST"])
@@ -896,48 +1198,23 @@ def logout():
 @login_required
 def driver_season_view(driver):
     from model import UserRaceResult
+    from score_cube import get_cube
 
-    all_races = []
-    boost_lookup = {}
-
-    for year in [2025, 2024, 2023, 2022, 2021]:
-        try:
-            schedule = fastf1.get_event_schedule(year)
-            schedule = schedule[schedule['EventDate'] < pd.Timestamp.now()]  # ⛔ Filter future races
-
-            for _, row in schedule.iterrows():
-                gp_name = clean_gp_name(row["EventName"])
-                df = calculate_single_race(year, gp_name)  # ✅ avoid overwriting last race file
-                if not df.empty and driver in df["Driver"].values:
-                    row_df = df[df["Driver"] == driver].copy()
-                    row_df["Year"] = year
-                    row_df["Grand Prix"] = gp_name
-
-                    # Check if this user has a boosted record
-                    result = UserRaceResult.query.filter_by(
-                        user_id=current_user.id,
-                        driver=driver,
-                        year=year,
-                        race=gp_name,
-                        boosted=True
-                    ).first()
-
-                    if result:
-                        row_df["Boost Note"] = f"Boosted for +{int(result.total_points - result.base_points)} points"
-                    else:
-                        row_df["Boost Note"] = ""
-
-                    all_races.append(row_df)
-        except Exception as e:
-            print(f"⚠️ Failed for {year} {driver}: {e}")
-            continue
-
-    if not all_races:
+    driver = driver.upper()
+    df = get_cube().driver_rows(driver)
+    if df.empty:
         return "<h2>⚠️ No data available.</h2><a href='/'>⬅ Back</a>"
 
-    df = pd.concat(all_races)
-    df = df[["Year", "Grand Prix", "Quali", "Race", "+Pos", "Q/R/+O", "Total Points", "Boost Note"]]
-    df = df.sort_values(by=["Year", "Grand Prix"], ascending=[False, False])
+    boosted = {
+        (r.year, r.race): r.total_points - r.base_points
+        for r in UserRaceResult.query.filter_by(user_id=current_user.id, driver_id=get_registry().id(driver), boosted=True)
+    }
+    df["Boost Note"] = [
+        f"Boosted for +{int(boosted[key])} points" if key in boosted else ""
+        for key in zip(df["Year"], df["Grand Prix"].map(clean_gp_name))
+    ]
+    df = df[["Year", "Grand Prix", "Quali", "Race", "+Pos", "points_from_quali", "points_from_race",
+             "points_from_gain", "Total Points", "Boost Note"]]
     return render_template("season.html", races=df.to_dict(orient="records"))
 
 
@@ -960,8 +1237,53 @@ def activate_boost(category, driver):
     return redirect("/profile")
 
 
+@app.route("/admin/settlement_preview")
+@login_required
+def settlement_preview():
+    """Dry run of /update_latest_race: what settlement would change, without writing."""
+    if current_user.username not in {"admin", "siaaah"}:
+        return "⛔ Access Denied", 403
+
+    from settlement_preview import preview_latest_race
+    ok, preview = preview_latest_race()
+    if not ok:
+        return f"<h2>{preview}</h2><a href='/admin/management'>⬅ Back</a>"
+    if request.args.get("format") == "json":
+        from flask import jsonify
+        return jsonify({k: v for k, v in preview.items() if k not in ("results", "users_frame")})
+
+    def table(rows):
+        if not rows:
+            return "<p>None</p>"
+        return pd.DataFrame(rows).to_html(classes="table table-sm table-striped text-center", index=False)
+
+    totals = preview["totals"]
+    anomalies = "".join(
+        f"<h4>⚠️ {name.replace('_', ' ').title()} ({len(rows)})</h4>{table(rows)}"
+        for name, rows in preview["anomalies"].items() if rows
+    )
+    status = "" if preview["would_settle"] else "<p>⏭️ Already settled; running it would skip this race.</p>"
+    return (
+        f"<h2>🔍 Preview: {preview['year']} - {preview['race']}</h2>{status}"
+        f"<p>{preview['users']} users, {totals['results']} results ({totals['boosted']} boosted): "
+        f"{totals['base_points']:.0f} base + {totals['bonus_points']:.0f} bonus = "
+        f"{totals['total_points']:.0f} points; roster value change ${totals['value_change']:,.0f}. "
+        f"Computed in {preview['elapsed_ms']} ms.</p>"
+        f"<h4>🏅 Top Scorers</h4>{table(preview['top_scorers'])}"
+        f"<h4>📈 Top Movers</h4>{table(preview['top_movers'])}"
+        f"<h4>💰 Driver Values</h4>{table(preview['drivers'])}"
+        f"{anomalies or '<p>✅ No anomalies.</p>'}"
+        f"<a href='/admin/management'>⬅ Back</a>"
+    )
+
+
 @app.route("/update_latest_race", methods=["POST"])
+@login_required
+@limit_concurrency(1, retry_after=30)
 def update_latest_race():
+    if current_user.username not in {"admin", "siaaah"}:
+        return "⛔ Access Denied", 403
+
     from points_utils import process_latest_race_and_apply_boosts
     success, message = process_latest_race_and_apply_boosts()
     return f"<h2>{message}</h2><a href='/'>⬅ Back</a>"
@@ -970,11 +1292,11 @@ def update_latest_race():
 # Functions Not Routes
 
 def get_driver_price(driver_code):
+    from trade_utils import quote
     try:
-        _, _, fantasy_value, _ = generate_driver_rating(driver_code)
-        return round(fantasy_value or 0)
+        return quote(driver_code)[0]
     except Exception as e:
-        print(f"⚠️ Could not get price for {driver_code}: {e}")
+        log.warning("⚠️ Could not get price for %s: %s", driver_code, e)
         return 0
 
 import os
@@ -990,14 +1312,41 @@ def clean_gp_name(gp_name):
 
 db_path = "/mnt/f1_cache/users.db"
 if not os.path.exists(db_path):
-    print("📦 Creating users.db and tables...")
-    with app.app_context():
-        db.create_all()
-    print("✅ User table created.")
+    log.info("📦 Creating users.db and tables...")
 else:
-    print("ℹ️ users.db already exists.")
+    log.info("ℹ️ users.db already exists, checking for new tables/columns.")
+# create_all() only adds missing tables; add_missing_columns() handles new columns.
+with app.app_context():
+    db.create_all()
+    add_missing_columns()
+    if backfill_driver_ids():
+        log.info("🆔 Backfilled driver ids on roster and result rows.")
+    repaired = check_driver_ids()
+    if repaired:
+        log.warning("⚠️ Re-mapped %d rows whose driver ids no longer matched drivers.json.", repaired)
+
+# Build in-memory indexes in the background; /ready reports when done.
+# F1_WARMUP=0 skips it (indexes are then built on first request).
+if os.environ.get("F1_WARMUP", "1") != "0":
+    from warmup import start_warmup
+    start_warmup()
+
+
+@app.route("/ready")
+def ready():
+    from flask import jsonify
+    from warmup import warmup_status
+    status = warmup_status()
+    if os.environ.get("F1_WARMUP", "1") == "0":
+        status["ready"] = True
+    return jsonify(status), 200 if status["ready"] else 503
+
 
 if __name__ == "__main__":
+    # F1_RACE_WATCHER=0 disables automatic post-race ingest and settlement.
+    if os.environ.get("F1_RACE_WATCHER", "1") != "0":
+        from race_watcher import RaceWatcher
+        RaceWatcher(app).start()
     app.run(host="0.0.0.0", port=5000)
 
 
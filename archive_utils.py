@@ -0,0 +1,99 @@
+import os
+import shutil
+import pandas as pd
+from log_utils import get_logger
+
+log = get_logger("archive")
+
+CACHE_DIR = "/mnt/f1_cache"
+# Raw FastF1 session results, one gzipped CSV per (year, event, session):
+#   results_archive/<year>/<event>/<session>.csv.gz
+# Written once at ingest; every race CSV, rating and rescore derives from it.
+ARCHIVE_DIR = os.path.join(CACHE_DIR, "results_archive")
+RACE_SESSIONS = ("Qualifying", "Race")
+TIMEDELTA_COLUMNS = ("Q1", "Q2", "Q3", "Time")
+
+
+def archive_path(year, event, session_name):
+    return os.path.join(ARCHIVE_DIR, str(year), event, f"{session_name}.csv.gz")
+
+
+def has_session(year, event, session_name):
+    return os.path.exists(archive_path(year, event, session_name))
+
+
+def has_race(year, event):
+    return all(has_session(year, event, s) for s in RACE_SESSIONS)
+
+
+def save_session_results(year, event, session_name, results, session_date=None):
+    """Archive a session's full results table (every column FastF1 returns)."""
+    path = archive_path(year, event, session_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df = pd.DataFrame(results).reset_index(drop=True)
+    df["SessionDate"] = pd.to_datetime(session_date) if session_date is not None else pd.NaT
+    tmp = path + ".tmp"
+    df.to_csv(tmp, index=False, compression="gzip")
+    os.replace(tmp, path)
+    log.info("🗄️ Archived %s - %s %s (%d rows)", year, event, session_name, len(df))
+    return path
+
+
+def load_session_results(year, event, session_name):
+    path = archive_path(year, event, session_name)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    try:
+        df = pd.read_csv(path, compression="gzip")
+    except Exception as e:
+        log.error("❌ Failed to read archive %s: %s", path, e)
+        return pd.DataFrame()
+    for column in TIMEDELTA_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_timedelta(df[column], errors="coerce")
+    if "SessionDate" in df.columns:
+        df["SessionDate"] = pd.to_datetime(df["SessionDate"], errors="coerce")
+    return df
+
+
+def archived_races():
+    """[(year, event)] for every event with both qualifying and race archived."""
+    races = []
+    if not os.path.isdir(ARCHIVE_DIR):
+        return races
+    for year in sorted(os.listdir(ARCHIVE_DIR)):
+        year_dir = os.path.join(ARCHIVE_DIR, year)
+        if not year.isdigit() or not os.path.isdir(year_dir):
+            continue
+        for event in sorted(os.listdir(year_dir)):
+            if has_race(int(year), event):
+                races.append((int(year), event))
+    return races
+
+
+def race_positions(q_results, r_results, race_date):
+    """Driver / Quali / Race / EventDate rows from qualifying and race results."""
+    df = pd.merge(
+        q_results[["Abbreviation", "Position"]].rename(columns={"Position": "Quali"}),
+        r_results[["Abbreviation", "Position"]].rename(columns={"Position": "Race"}),
+        on="Abbreviation",
+    ).rename(columns={"Abbreviation": "Driver"})
+    df["EventDate"] = pd.to_datetime(race_date)
+    return df
+
+
+def load_race_positions(year, event):
+    """race_positions() for an archived event, or an empty frame if not archived."""
+    quali = load_session_results(year, event, "Qualifying")
+    race = load_session_results(year, event, "Race")
+    if quali.empty or race.empty:
+        return pd.DataFrame()
+    return race_positions(quali, race, race["SessionDate"].iloc[0])
+
+
+def delete_event(year, event):
+    path = os.path.join(ARCHIVE_DIR, str(year), event)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+        return True
+    return False
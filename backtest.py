@@ -0,0 +1,206 @@
+import warnings
+import numpy as np
+import pandas as pd
+from log_utils import get_logger, stage
+
+log = get_logger("backtest")
+
+FEATURES = ("career", "seasonal", "last_3")
+TEAM_SIZE = 5
+MIN_DRIVERS = 3   # races with fewer eligible drivers are left out of the correlation
+
+
+def weight_grid(step=0.05):
+    """Every (career, seasonal, last_3) weight triple on the simplex at `step` resolution."""
+    n = int(round(1 / step))
+    return np.array([(i / n, j / n, (n - i - j) / n) for i in range(n + 1) for j in range(n + 1 - i)])
+
+
+def baseline_weights():
+    """{label: weights} for the formulas the app uses today."""
+    from points_utils import VALUE_WEIGHTS, HYPE_WEIGHTS
+    return {"fantasy_value": VALUE_WEIGHTS, "weighted_total": HYPE_WEIGHTS}
+
+
+class Replay:
+    """Driver averages as they stood after every stored race, as (T, D) arrays.
+
+    Rows are the stored rounds in calendar order (all seasons), columns are
+    the cube's drivers. career / seasonal / last_3 match what
+    DriverRating.from_races would have produced right after that race (with
+    the replayed season as the rating season); they are NaN until a driver
+    has a result that season. target is the driver's points in the next
+    round of the same season (NaN if they didn't take part or it was the
+    season finale).
+    """
+
+    def __init__(self, cube, seasons=None):
+        points, mask = cube.values["points"], cube.mask
+        season_of = np.repeat(cube.seasons, cube.race_mask.shape[1]).reshape(cube.race_mask.shape)
+        keep = cube.race_mask
+        if seasons is not None:
+            keep = keep & np.isin(season_of, list(seasons))
+        # Earlier seasons still count towards career averages.
+        upto = (np.cumsum(keep.ravel()[::-1])[::-1] > 0).reshape(keep.shape)
+        rows = (cube.race_mask & upto).ravel()
+
+        self.drivers = cube.drivers
+        self.seasons = season_of.ravel()[rows]
+        self.races = cube.races.ravel()[rows]
+        self.evaluated = keep.ravel()[rows]
+        points = points.reshape(-1, points.shape[-1])[rows]
+        valid = mask.reshape(-1, mask.shape[-1])[rows] & np.isfinite(points)
+        self.points = np.where(valid, points, np.nan)
+        self.valid = valid
+        self._build(np.where(valid, points, 0.0), valid)
+
+    def _build(self, points, valid):
+        T, D = points.shape
+        n = np.cumsum(valid, axis=0)                                   # results so far (career)
+        new_season = np.r_[True, self.seasons[1:] != self.seasons[:-1]]
+        season_start = np.maximum.accumulate(np.where(new_season, np.arange(T), 0))
+        before = np.vstack([np.zeros((1, D), dtype=int), n])[season_start]
+        k = n - before                                                 # results so far this season
+
+        # G[d, i] = sum of a driver's first i results, so any run of their
+        # most recent results is a difference of two prefix sums.
+        G = np.zeros((D, int(n.max()) + 1 if n.size else 1))
+        t_idx, d_idx = np.nonzero(valid)
+        G[d_idx, n[t_idx, d_idx]] = points[t_idx, d_idx]
+        G = np.cumsum(G, axis=1)
+        cols = np.arange(D)[None, :]
+
+        def last(m):
+            return np.divide(G[cols, n] - G[cols, n - m], m, out=np.full((T, D), np.nan), where=m > 0)
+
+        self.career = last(n)
+        self.seasonal = last(k)
+        self.last_3 = last(np.minimum(k, 3))
+        self.seasonal[k == 0] = np.nan
+        self.career[k == 0] = np.nan
+        self.last_3[k == 0] = np.nan
+
+        same_season = np.r_[self.seasons[1:] == self.seasons[:-1], False]
+        self.target = np.full((T, D), np.nan)
+        self.target[:-1] = self.points[1:]
+        self.target[~same_season] = np.nan
+
+    @property
+    def features(self):
+        return np.stack([self.career, self.seasonal, self.last_3])   # (3, T, D)
+
+    def eligible(self):
+        """(T, D) pairs with a rating after race t and a result in the next race."""
+        return (~np.isnan(self.seasonal) & ~np.isnan(self.target)) & self.evaluated[:, None]
+
+    def predict(self, weights):
+        """(P, T, D) weighted points for each parameter set."""
+        return np.einsum("pf,ftd->ptd", np.asarray(weights, dtype=float), np.nan_to_num(self.features))
+
+
+def _masked_mean(values, mask, axis):
+    n = mask.sum(axis=axis)
+    total = np.where(mask, values, 0.0).sum(axis=axis)
+    return np.divide(total, n, out=np.full(np.shape(total), np.nan), where=n > 0)
+
+
+def evaluate(replay, weights, team_size=TEAM_SIZE):
+    """Error and outcome metrics for every parameter set at once -> DataFrame (one row per set).
+
+    mae / rmse / bias: weighted points (value / VALUE_SCALE) vs next-race points.
+    corr: mean per-race Pearson correlation of value with next-race points.
+    team_points: mean next-race points of a team of the `team_size` highest
+    valued drivers after each race (what a user buying by price would score).
+    volatility: mean absolute race-to-race price change per driver, in $.
+    """
+    from points_utils import VALUE_SCALE
+
+    weights = np.asarray(weights, dtype=float)
+    pred = replay.predict(weights)                       # (P, T, D)
+    target = np.nan_to_num(replay.target)[None]          # (1, T, D)
+    mask = replay.eligible()[None]                       # (1, T, D)
+    err = pred - target
+    n = mask.sum()
+
+    # Per-race Pearson correlation, vectorized over parameter sets and races.
+    per_race = mask.sum(axis=2)
+    pm, tm = _masked_mean(pred, mask, 2)[..., None], _masked_mean(target, mask, 2)[..., None]
+    cov = np.where(mask, (pred - pm) * (target - tm), 0).sum(axis=2)
+    sp = np.sqrt(np.where(mask, (pred - pm) ** 2, 0).sum(axis=2))
+    st = np.sqrt(np.where(mask, (target - tm) ** 2, 0).sum(axis=2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = cov / (sp * st)
+    corr = np.where((per_race >= MIN_DRIVERS) & np.isfinite(corr), corr, np.nan)
+
+    # Top-valued team after each race, scored on the next race.
+    ranked = np.argsort(np.where(mask, -pred, np.inf), axis=2, kind="stable")[..., :team_size]
+    picked = np.take_along_axis(np.broadcast_to(target, pred.shape), ranked, axis=2)
+    picked_ok = np.take_along_axis(np.broadcast_to(mask, pred.shape), ranked, axis=2)
+    team = np.where(picked_ok, picked, 0).sum(axis=2)
+    races = per_race[0] >= team_size
+
+    # Price moves between consecutive rated races of the same season.
+    rated = ~np.isnan(replay.seasonal)
+    moved = (rated[1:] & rated[:-1] & (replay.seasons[1:] == replay.seasons[:-1])[:, None]
+             & replay.evaluated[1:, None])[None]
+    volatility = _masked_mean(np.abs(np.diff(pred, axis=1)), moved, (1, 2)) * VALUE_SCALE
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        result = pd.DataFrame({
+            **{feature: weights[:, i] for i, feature in enumerate(FEATURES)},
+            "mae": np.where(mask, np.abs(err), 0).sum(axis=(1, 2)) / max(n, 1),
+            "rmse": np.sqrt(np.where(mask, err ** 2, 0).sum(axis=(1, 2)) / max(n, 1)),
+            "bias": np.where(mask, err, 0).sum(axis=(1, 2)) / max(n, 1),
+            "corr": np.nanmean(corr, axis=1) if np.isfinite(corr).any() else np.nan,
+            "team_points": team[:, races].mean(axis=1) if races.any() else np.nan,
+            "volatility": volatility,
+        })
+    result.attrs.update(pairs=int(n), races=int((per_race[0] > 0).sum()))
+    return result
+
+
+def run_backtest(step=0.05, seasons=None, weights=None, cube=None):
+    """Replay the stored seasons and score a weight sweep plus the current formulas.
+
+    Returns a DataFrame sorted by mae with a "label" column naming the
+    baselines; attrs carry the number of evaluated (driver, race) pairs,
+    races, and the best achievable team score for reference.
+    """
+    from score_cube import get_cube
+
+    with stage("backtest"):
+        replay = Replay(cube if cube is not None else get_cube(), seasons)
+        baselines = baseline_weights()
+        grid = weight_grid(step) if weights is None else np.asarray(weights, dtype=float)
+        sets = np.vstack([np.array(list(baselines.values()), dtype=float), grid])
+        result = evaluate(replay, sets)
+        result.insert(0, "label", list(baselines) + [""] * len(grid))
+
+        mask = replay.eligible()
+        best = np.sort(np.where(mask, replay.target, -np.inf), axis=1)[:, ::-1][:, :TEAM_SIZE]
+        full = mask.sum(axis=1) >= TEAM_SIZE
+        result.attrs["oracle_team_points"] = float(best[full].sum(axis=1).mean()) if full.any() else None
+
+    log.info("📐 Backtested %d weight sets over %d races (%d driver-race pairs)",
+             len(sets), result.attrs["races"], result.attrs["pairs"])
+    return result.sort_values("mae", ignore_index=True)
+
+
+def replay_prices(weights, seasons=None, cube=None):
+    """Long DataFrame of the price every driver would have had after every race under `weights`."""
+    from points_utils import VALUE_SCALE
+    from score_cube import get_cube
+
+    replay = Replay(cube if cube is not None else get_cube(), seasons)
+    value = replay.predict([weights])[0] * VALUE_SCALE
+    rated = ~np.isnan(replay.seasonal) & replay.evaluated[:, None]
+    t, d = np.nonzero(rated)
+    return pd.DataFrame({
+        "Year": replay.seasons[t],
+        "Grand Prix": replay.races[t],
+        "Driver": replay.drivers[d],
+        "Fantasy Value": np.round(value[t, d]),
+        "Points": replay.points[t, d],
+        "Next Points": replay.target[t, d],
+    })
@@ -0,0 +1,107 @@
+import threading
+from functools import wraps
+from flask import make_response
+from log_utils import get_logger, count
+
+log = get_logger("concurrency")
+
+
+class SingleFlight:
+    """Share one in-flight computation between concurrent callers of the same key.
+
+    The first caller runs fn(); callers arriving while it runs wait for it and
+    get the same result (or the same exception). Nothing is kept afterwards;
+    longer-lived caching is the job of the data-version memos.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        if not leader:
+            count("single_flight.shared")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+
+class RouteLimiter:
+    """At most `max_concurrent` requests run; up to `max_queue` wait `timeout` seconds.
+
+    Anything beyond that is shed immediately with 503 and Retry-After.
+    """
+
+    def __init__(self, name, max_concurrent, max_queue=0, timeout=10, retry_after=5):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._waiting = 0
+
+    def acquire(self):
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                return False
+            self._waiting += 1
+        try:
+            return self._slots.acquire(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def release(self):
+        self._slots.release()
+
+    def shed(self):
+        count("limiter.shed")
+        log.warning("🚦 Shedding request to %s (busy)", self.name)
+        response = make_response(f"<h2>🚦 {self.name} is busy, please retry shortly.</h2>", 503)
+        response.headers["Retry-After"] = str(self.retry_after)
+        return response
+
+
+def limit_concurrency(max_concurrent, max_queue=0, timeout=10, retry_after=5):
+    """Per-route admission control decorator (queue-or-shed)."""
+    def decorator(view):
+        limiter = RouteLimiter(view.__name__, max_concurrent, max_queue, timeout, retry_after)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not limiter.acquire():
+                return limiter.shed()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                limiter.release()
+        wrapper.limiter = limiter
+        return wrapper
+    return decorator
@@ -1,24 +1,170 @@
 import os
+import json
 import time
+import fcntl
+import logging
 import pandas as pd
 import fastf1
 from datetime import datetime
+from log_utils import get_logger, log_sampled, pipeline_run, stage, count
+from scoring import score_frame
+from archive_utils import (
+    has_race, save_session_results, load_race_positions, race_positions, archived_races, load_session_results
+)
+from driver_registry import driver_ids, observe_results
+
+log = get_logger("core")
 
 CACHE_DIR = "/mnt/f1_cache"
 fastf1.Cache.enable_cache(CACHE_DIR)
 
+# A counter bumped whenever race files or derived ratings change. Anything
+# memoized from the cache directory keys on get_data_version() and rebuilds
+# when it moves; versions only ever grow, so they can be compared.
+DATA_VERSION_PATH = os.path.join(CACHE_DIR, "data_version")
+DATA_VERSION_LOCK = DATA_VERSION_PATH + ".lock"
+
+# Race CSVs live in a store generation. Until the first rescore the store is
+# CACHE_DIR itself; afterwards STORE_DIR/CURRENT names the generation in use
+# and is swapped atomically, so readers never see a half-written store.
+STORE_DIR = os.path.join(CACHE_DIR, "store")
+STORE_POINTER = os.path.join(STORE_DIR, "CURRENT")
+
+
+def get_data_version():
+    try:
+        with open(DATA_VERSION_PATH) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def bump_data_version():
+    """Increment the counter; the lock keeps concurrent writers from reusing a number."""
+    with open(DATA_VERSION_LOCK, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Never below the clock: a lost or corrupt counter (read as 0) must
+            # still move past every version a running process has already seen.
+            version = max(get_data_version() + 1, time.time_ns())
+            tmp = f"{DATA_VERSION_PATH}.tmp-{os.getpid()}"
+            with open(tmp, "w") as f:
+                f.write(str(version))
+            os.replace(tmp, DATA_VERSION_PATH)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return version
+
+
+def is_race_file(file):
+    """True for "<year> - <Grand Prix>.csv" race files, not derived CSVs."""
+    if not file.endswith(".csv") or " - " not in file:
+        return False
+    return file.split(" - ", 1)[0].isdigit()
+
+
+def current_generation():
+    """Name of the store generation in use, or None for the legacy flat store."""
+    try:
+        with open(STORE_POINTER) as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return name if name and os.path.isdir(os.path.join(STORE_DIR, name)) else None
+
+
+def race_dir():
+    generation = current_generation()
+    return os.path.join(STORE_DIR, generation) if generation else CACHE_DIR
+
+
+def store_rules_version():
+    """Scoring rules the store generation in use was scored under (None: the current rules).
+
+    rescore.write_generation records it in the generation's manifest.json;
+    races added to that generation later must be scored the same way.
+    """
+    generation = current_generation()
+    if generation is None:
+        return None
+    try:
+        with open(os.path.join(STORE_DIR, generation, "manifest.json")) as f:
+            return json.load(f).get("rules_version")
+    except (OSError, ValueError) as e:
+        log.warning("⚠️ No readable manifest for store %s, scoring with current rules: %s", generation, e)
+        return None
+
+
+def race_path(year, gp_name):
+    return os.path.join(race_dir(), f"{year} - {gp_name}.csv")
+
+
+def list_race_files():
+    return sorted(f for f in os.listdir(race_dir()) if is_race_file(f))
+
+
+def publish_generation(name):
+    """Point readers at STORE_DIR/<name> (atomic rename) and bump the data version."""
+    tmp = STORE_POINTER + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(name)
+    os.replace(tmp, STORE_POINTER)
+    bump_data_version()
+
+
+def read_race_history():
+    """Every cached race file parsed into one DataFrame with Year / Grand Prix / DriverId columns.
+
+    Not memoized: only the score cube builder calls this. Everything else
+    reads the shared cube (get_cube()).
+    """
+    frames = []
+    directory = race_dir()
+    for file in list_race_files():
+        year, gp_name = file[:-4].split(" - ", 1)
+        try:
+            df = pd.read_csv(os.path.join(directory, file))
+        except Exception as e:
+            log.warning("⚠️ Failed to read %s: %s", file, e)
+            continue
+        if df.empty or "Driver" not in df.columns:
+            continue
+        df["Year"] = int(year)
+        df["Grand Prix"] = gp_name
+        frames.append(df)
+
+    history = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if "EventDate" in history.columns:
+        history["EventDate"] = pd.to_datetime(history["EventDate"], errors="coerce")
+        history = history.sort_values(["EventDate", "Driver"], ignore_index=True)
+    if "Driver" in history.columns:
+        history["DriverId"] = driver_ids(history["Driver"])
+    return history
+
+
+def load_race_history():
+    """Every cached race in one DataFrame with Year / Grand Prix / DriverId columns.
+
+    DriverId is the driver's registry id, for integer joins and lookups.
+    Rebuilt from the shared score cube on every call and not kept: it is a
+    full private copy, so it is for admin and CLI use. Request paths read the
+    cube's arrays directly (get_cube()).
+    """
+    from score_cube import get_cube
+    return get_cube().to_history()
+
 
 def is_race_cached(year, gp_name):
-    return os.path.exists(os.path.join(CACHE_DIR, f"{year} - {gp_name}.csv"))
+    return os.path.exists(race_path(year, gp_name))
 
 
 def get_cached_race(year, gp_name):
-    path = os.path.join(CACHE_DIR, f"{year} - {gp_name}.csv")
+    path = race_path(year, gp_name)
     if os.path.exists(path):
         try:
             return pd.read_csv(path)
         except Exception as e:
-            print(f"❌ Failed to read cache: {e}")
+            log.error("❌ Failed to read cache %s: %s", path, e)
     return pd.DataFrame()
 
 
@@ -29,72 +175,149 @@ def get_last_processed_race():
     return None
 
 
-def fetch_and_cache_race(year, gp_name):
+def fetch_and_cache_race(year, gp_name, refresh=False):
+    """Build the race CSV for one event.
+
+    Served from the raw results archive when the event is archived; otherwise
+    (or with refresh=True) the sessions are loaded from FastF1 and archived.
+    """
+    with pipeline_run("fetch_race"):
+        return _fetch_and_cache_race(year, gp_name, refresh)
+
+
+def _load_and_archive_sessions(year, gp_name):
+    event = fastf1.get_event(year, gp_name)
+    quali = event.get_session('Qualifying')
+    race = event.get_session('Race')
+    quali.load(telemetry=False, weather=False, laps=False, messages=False)
+    time.sleep(1)
+    race.load(telemetry=False, weather=False, laps=False, messages=False)
+    time.sleep(1)
+
+    q_results = quali.results
+    r_results = race.results
+    if q_results is None or r_results is None:
+        return pd.DataFrame()
+
+    save_session_results(year, gp_name, "Qualifying", q_results, quali.date)
+    save_session_results(year, gp_name, "Race", r_results, race.date)
+    observe_results(year, r_results)
+    if "sprint" in str(event.get("EventFormat", "")).lower():
+        try:
+            sprint = event.get_session('Sprint')
+            sprint.load(telemetry=False, weather=False, laps=False, messages=False)
+            if sprint.results is not None:
+                save_session_results(year, gp_name, "Sprint", sprint.results, sprint.date)
+        except Exception as e:
+            log.warning("⚠️ Could not archive sprint for %s - %s: %s", year, gp_name, e)
+    count("archive.sessions_loaded")
+    return race_positions(q_results, r_results, race.date)
+
+
+def _fetch_and_cache_race(year, gp_name, refresh=False):
     try:
-        event = fastf1.get_event(year, gp_name)
-        quali = event.get_session('Qualifying')
-        race = event.get_session('Race')
-        quali.load(telemetry=False, weather=False, laps=False, messages=False)
-        time.sleep(1)
-        race.load(telemetry=False, weather=False, laps=False, messages=False)
-        time.sleep(1)
-
-        q_results = quali.results
-        r_results = race.results
-        if q_results is None or r_results is None:
+        with stage("ingest", items=1):
+            if has_race(year, gp_name) and not refresh:
+                count("archive.hits")
+                df = load_race_positions(year, gp_name)
+            else:
+                df = _load_and_archive_sessions(year, gp_name)
+        if df.empty:
             return False
 
-        df = pd.merge(
-            q_results[['Abbreviation', 'Position']].rename(columns={'Position': 'position_quali'}),
-            r_results[['Abbreviation', 'Position']].rename(columns={'Position': 'position_race'}),
-            on='Abbreviation'
-        )
-
-        df["EventDate"] = pd.to_datetime(race.date)
-        df['positions_gained'] = df['position_quali'] - df['position_race']
-        df['positions_gained'] = df['positions_gained'].apply(lambda x: max(0, x))
-        df['points_from_race'] = 21 - df['position_race']
-        df['points_from_gain'] = df['positions_gained'] * 2
-        df['points_from_quali'] = (21 - df['position_quali']) * 3
-        df['total_points'] = df['points_from_race'] + df['points_from_gain'] + df['points_from_quali']
-
-        df = df.rename(columns={
-            'Abbreviation': 'Driver',
-            'position_quali': 'Quali',
-            'position_race': 'Race',
-            'positions_gained': '+Pos',
-            'total_points': 'Total Points'
-        })
-
-        df['Q/R/+O'] = df.apply(
-            lambda row: f"{row['points_from_quali']}/{row['points_from_race']}/{row['points_from_gain']}", axis=1
-        )
-
-        df.to_csv(os.path.join(CACHE_DIR, f"{year} - {gp_name}.csv"), index=False)
-        print(f"✅ Fetched and cached: {year} - {gp_name}")
+        with stage("score", items=1):
+            # The Q/R/+O breakdown is formatted at render time from the components.
+            df = score_frame(df, store_rules_version())
+
+        df.to_csv(race_path(year, gp_name), index=False)
+        bump_data_version()
+        count("races_cached")
+        log.info("✅ Fetched and cached: %s - %s", year, gp_name)
         return True
     except Exception as e:
-        print(f"❌ Error caching {year} - {gp_name}: {e}")
+        log.error("❌ Error caching %s - %s: %s", year, gp_name, e)
         return False
 
-def preload_race_data_until(year_limit=2025, stop_gp="Miami Grand Prix"):
-    print(f"🔁 Preloading races up to {year_limit} - {stop_gp}")
+
+def rebuild_races_from_archive():
+    """Regenerate every race CSV from the archive; a pure local read, no FastF1 loads."""
+    with pipeline_run("rederive"):
+        races = archived_races()
+        rules = store_rules_version()
+        with stage("score", items=len(races)):
+            for year, gp_name in races:
+                df = load_race_positions(year, gp_name)
+                if df.empty:
+                    continue
+                observe_results(year, load_session_results(year, gp_name, "Race"))
+                score_frame(df, rules).to_csv(race_path(year, gp_name), index=False)
+                count("races_cached")
+        if races:
+            bump_data_version()
+    log.info("✅ Rebuilt %d races from the results archive", len(races))
+    return len(races)
+
+SCHEDULE_TTL = 6 * 60 * 60
+_schedules = {}
+
+
+def get_schedule(year):
+    """FastF1 event schedule for a season (no testing), memoized for SCHEDULE_TTL."""
+    cached = _schedules.get(year)
+    if cached and time.time() - cached[0] < SCHEDULE_TTL:
+        return cached[1]
+    schedule = fastf1.get_event_schedule(year, include_testing=False)
+    _schedules[year] = (time.time(), schedule)
+    return schedule
+
+
+def utc_now():
+    return pd.Timestamp.now(tz="UTC").tz_localize(None)
+
+
+def race_start(event):
+    """UTC start of an event's race session, falling back to EventDate."""
+    for n in range(1, 6):
+        if event.get(f"Session{n}") == "Race":
+            start = event.get(f"Session{n}DateUtc")
+            if pd.notna(start):
+                start = pd.Timestamp(start)
+                return start.tz_convert(None) if start.tzinfo else start
+    return pd.Timestamp(event["EventDate"])
+
+
+def race_calendar(year):
+    """[(gp_name, race start in UTC)] for a season, in calendar order."""
+    return [(clean_gp_name(row["EventName"]), race_start(row)) for _, row in get_schedule(year).iterrows()]
+
+
+def preload_race_data_until(year_limit=None, stop_gp=None):
+    """Cache every race that has already been run, up to year_limit.
+
+    stop_gp optionally stops before that Grand Prix in the final year.
+    """
+    with pipeline_run("preload"):
+        _preload_race_data_until(year_limit or utc_now().year, stop_gp or None)
+
+
+def _preload_race_data_until(year_limit, stop_gp):
+    log.info("🔁 Preloading races up to %s%s", year_limit, f" - {stop_gp}" if stop_gp else "")
+    now = utc_now()
     for year in range(2021, year_limit + 1):
         try:
-            schedule = fastf1.get_event_schedule(year)
-            if year == year_limit:
-                if stop_gp in schedule["EventName"].values:
-                    stop_index = schedule[schedule["EventName"] == stop_gp].index[0]
-                    schedule = schedule.loc[:stop_index - 1]
-            else:
-                schedule = schedule[schedule["EventDate"] < pd.Timestamp.now()]
+            schedule = get_schedule(year)
+            completed = [race_start(row) < now for _, row in schedule.iterrows()]
+            schedule = schedule[completed]
+            if year == year_limit and stop_gp and stop_gp in schedule["EventName"].values:
+                stop_index = schedule[schedule["EventName"] == stop_gp].index[0]
+                schedule = schedule.loc[:stop_index - 1]
         except Exception as e:
-            print(f"⚠️ Failed to get schedule for {year}: {e}")
+            log.warning("⚠️ Failed to get schedule for %s: %s", year, e)
             continue
 
         for _, row in schedule.iterrows():
-            gp_name = row["EventName"]
-            path = os.path.join(CACHE_DIR, f"{year} - {gp_name}.csv")
+            gp_name = clean_gp_name(row["EventName"])
+            path = race_path(year, gp_name)
 
             # Cache if not already done or if missing EventDate
             recache = False
@@ -102,37 +325,34 @@ def preload_race_data_until(year_limit=2025, stop_gp="Miami Grand Prix"):
                 try:
                     df = pd.read_csv(path)
                     if "EventDate" not in df.columns:
-                        print(f"♻️ Refreshing {year} - {gp_name}: missing EventDate")
+                        log_sampled(log, "preload.refresh", "♻️ Refreshing %s - %s: missing EventDate", year, gp_name, level=logging.INFO)
                         recache = True
                 except Exception as e:
-                    print(f"⚠️ Could not read {path}, forcing re-cache: {e}")
+                    log.warning("⚠️ Could not read %s, forcing re-cache: %s", path, e)
                     recache = True
             else:
                 recache = True
 
             if recache:
                 fetch_and_cache_race(year, gp_name)
+            else:
+                count("races_skipped")
+                log_sampled(log, "preload.skip", "⏭️ Already cached: %s - %s", year, gp_name)
 
-    print("✅ Preload complete.")
+    log.info("✅ Preload complete.")
 
 
 
 def get_all_cached_drivers():
-    last_race_info = get_most_recent_race_by_event_date()
-    if not last_race_info:
-        print("⚠️ No valid race files found.")
-        return []
+    """Drivers in the most recent cached race (read from the score cube)."""
+    from score_cube import get_cube
 
-    try:
-        df = pd.read_csv(last_race_info["path"])
-        if "Driver" in df.columns:
-            return sorted(df["Driver"].dropna().unique())
-        else:
-            print(f"⚠️ 'Driver' column missing in {last_race_info['path']}")
-            return []
-    except Exception as e:
-        print(f"❌ Failed to load latest race file: {e}")
+    cube = get_cube()
+    latest = cube.latest_race()
+    if latest is None:
+        log.warning("⚠️ No valid race files found.")
         return []
+    return sorted(cube.drivers[cube.mask[latest]])
 
 
 def clean_gp_name(gp_name):
@@ -147,8 +367,9 @@ def delete_duplicate_grand_prix_files():
     seen = {}
     to_delete = []
     renamed = []
+    directory = race_dir()
 
-    for file in os.listdir(CACHE_DIR):
+    for file in os.listdir(directory):
         if not file.endswith(".csv") or " - " not in file:
             continue
 
@@ -157,8 +378,8 @@ def delete_duplicate_grand_prix_files():
             clean_name = clean_gp_name(raw_gp)
             clean_filename = f"{year} - {clean_name}.csv"
 
-            original_path = os.path.join(CACHE_DIR, file)
-            clean_path = os.path.join(CACHE_DIR, clean_filename)
+            original_path = os.path.join(directory, file)
+            clean_path = os.path.join(directory, clean_filename)
 
             if raw_gp != clean_name and not os.path.exists(clean_path):
                 os.rename(original_path, clean_path)
@@ -170,41 +391,34 @@ def delete_duplicate_grand_prix_files():
                 seen[clean_filename] = original_path
 
         except Exception as e:
-            print(f"❌ Error processing {file}: {e}")
+            log.error("❌ Error processing %s: %s", file, e)
 
     for path in to_delete:
         try:
             os.remove(path)
-            print(f"🗑️ Deleted duplicate: {os.path.basename(path)}")
+            log.info("🗑️ Deleted duplicate: %s", os.path.basename(path))
         except Exception as e:
-            print(f"❌ Failed to delete {path}: {e}")
+            log.error("❌ Failed to delete %s: %s", path, e)
 
     for old, new in renamed:
-        print(f"🔁 Renamed: {old} ➡️ {new}")
+        log.info("🔁 Renamed: %s ➡️ %s", old, new)
+    if renamed or to_delete:
+        bump_data_version()
 
-    print(f"\n✅ Cleanup complete. {len(renamed)} renamed, {len(to_delete)} deleted.")
+    log.info("✅ Cleanup complete. %d renamed, %d deleted.", len(renamed), len(to_delete))
 
 
 def get_most_recent_race_by_event_date():
-    most_recent_date = pd.Timestamp("1900-01-01")
-    most_recent_info = None
-
-    for file in os.listdir(CACHE_DIR):
-        if file.endswith(".csv") and " - " in file and not file.startswith("averages") and not file.startswith("Driver Rating"):
-            path = os.path.join(CACHE_DIR, file)
-            try:
-                df = pd.read_csv(path)
-                if "EventDate" in df.columns:
-                    latest_in_file = pd.to_datetime(df["EventDate"].max())
-                    if latest_in_file > most_recent_date:
-                        most_recent_date = latest_in_file
-                        most_recent_info = {
-                            "path": path,
-                            "gp_name": file.replace(".csv", "").split(" - ", 1)[1],
-                            "year": file.split(" - ", 1)[0]
-                        }
-            except Exception as e:
-                print(f"⚠️ Failed to process {file}: {e}")
-                continue
-
-    return most_recent_info
+    """{"path", "gp_name", "year"} of the cached race with the latest EventDate."""
+    from score_cube import get_cube
+
+    cube = get_cube()
+    latest = cube.latest_race()
+    if latest is None:
+        return None
+    year, gp_name = int(cube.seasons[latest[0]]), cube.races[latest]
+    return {
+        "path": race_path(year, gp_name),
+        "gp_name": gp_name,
+        "year": str(year),
+    }
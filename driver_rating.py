@@ -0,0 +1,181 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+# Per-race stat columns carried by a rating, in array column order.
+STAT_COLUMNS = ("Quali", "Race", "+Pos", "points_from_quali", "points_from_race", "points_from_gain", "Total Points")
+# aggregate field -> Scope label used by the "Driver Rating - X.csv" files
+SCOPES = {
+    "last_3": "Last 3 Races Avg",
+    "prev_3": "Prev 3 Races Avg",
+    "seasonal": "Seasonal Average",
+    "career": "Career Average",
+}
+_POINTS = STAT_COLUMNS.index("Total Points")
+
+
+def _mean(stats):
+    """Column means of an (N, C) array ignoring NaN, or None for no rows."""
+    if not len(stats):
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmean(stats, axis=0)
+
+
+class DriverRating:
+    """One driver's rating: per-race arrays plus named aggregates.
+
+    years / races / dates / stats are parallel arrays in calendar order
+    (oldest first); stats is (N, len(STAT_COLUMNS)). last_3 / prev_3 /
+    seasonal / career are (len(STAT_COLUMNS),) mean arrays or None.
+    Instances are shared between requests for a data version; treat them as
+    read-only.
+    """
+
+    __slots__ = ("driver", "season", "years", "races", "dates", "stats",
+                 "last_3", "prev_3", "seasonal", "career",
+                 "weighted_total", "fantasy_value", "previous_weighted")
+
+    def __init__(self, driver, season, years, races, dates, stats, last_3=None, prev_3=None, seasonal=None,
+                 career=None, weighted_total=None, fantasy_value=None, previous_weighted=None):
+        self.driver = driver
+        self.season = season
+        self.years = years
+        self.races = races
+        self.dates = dates
+        self.stats = stats
+        self.last_3 = last_3
+        self.prev_3 = prev_3
+        self.seasonal = seasonal
+        self.career = career
+        self.weighted_total = weighted_total
+        self.fantasy_value = fantasy_value
+        self.previous_weighted = previous_weighted
+
+    @classmethod
+    def empty_for(cls, driver, season=None):
+        return cls(driver, season, np.array([], dtype=int), np.array([], dtype=object),
+                   np.array([], dtype="datetime64[ns]"), np.zeros((0, len(STAT_COLUMNS))))
+
+    @classmethod
+    def from_races(cls, driver, season, races):
+        """Aggregates over a driver's race rows (store columns, oldest first)."""
+        stats = races.reindex(columns=list(STAT_COLUMNS)).apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        years = races["Year"].to_numpy(dtype=int)
+        rating = cls(driver, season, years, races["Grand Prix"].to_numpy(dtype=object),
+                     pd.to_datetime(races["EventDate"]).to_numpy(dtype="datetime64[ns]"), stats)
+        in_season = stats[years == season]
+        rating.last_3 = _mean(in_season[-3:])
+        rating.prev_3 = _mean(in_season[-4:-1]) if len(in_season) >= 4 else rating.last_3
+        rating.seasonal = _mean(in_season)
+        rating.career = _mean(stats)
+        return rating
+
+    # -- access ------------------------------------------------------------
+
+    @property
+    def empty(self):
+        return len(self.years) == 0
+
+    def __len__(self):
+        return len(self.years)
+
+    def season_races(self):
+        return int((self.years == self.season).sum())
+
+    def column(self, name):
+        return self.stats[:, STAT_COLUMNS.index(name)]
+
+    def points(self, scope):
+        """Total Points of an aggregate ("last_3", "seasonal", ...) or None."""
+        values = getattr(self, scope)
+        return None if values is None else float(values[_POINTS])
+
+    @property
+    def last_points(self):
+        return float(self.stats[-1, _POINTS]) if len(self.stats) else None
+
+    def aggregate(self, scope):
+        """{stat column: value} for templates; NaN where the aggregate is missing."""
+        values = getattr(self, scope)
+        if values is None:
+            return dict.fromkeys(STAT_COLUMNS, float("nan"))
+        return dict(zip(STAT_COLUMNS, values.tolist()))
+
+    def race(self, i):
+        return {
+            "Year": int(self.years[i]),
+            "Grand Prix": self.races[i],
+            "EventDate": pd.Timestamp(self.dates[i]),
+            **dict(zip(STAT_COLUMNS, self.stats[i].tolist())),
+        }
+
+    def recent(self, n=None):
+        """Race dicts, newest first (all races when n is None)."""
+        count = len(self) if n is None else min(n, len(self))
+        return [self.race(i) for i in range(len(self) - 1, len(self) - 1 - count, -1)]
+
+    def to_dict(self, races=None):
+        """JSON-ready dict; races limits how many recent races are included."""
+        def clean(value):
+            return None if value is None or pd.isna(value) else value
+
+        recent = self.recent(races)
+        for race in recent:
+            race["EventDate"] = race["EventDate"].date().isoformat() if pd.notna(race["EventDate"]) else None
+            for column in STAT_COLUMNS:
+                race[column] = clean(race[column])
+        return {
+            "driver": self.driver,
+            "weighted_total": clean(self.weighted_total),
+            "fantasy_value": clean(self.fantasy_value),
+            "previous_weighted": clean(self.previous_weighted),
+            "averages": {scope: clean(self.points(scope)) for scope in SCOPES if getattr(self, scope) is not None},
+            "races": recent,
+        }
+
+    # -- "Driver Rating - X.csv" compatibility ----------------------------------
+
+    def to_frame(self):
+        """The legacy frame: race rows, then one row per Scope aggregate."""
+        df = pd.DataFrame(self.stats, columns=list(STAT_COLUMNS))
+        df.insert(0, "Driver", self.driver)
+        df["Year"] = self.years
+        df["Grand Prix"] = self.races
+        df["EventDate"] = self.dates
+        df["Scope"] = None
+        scope_rows = []
+        for scope, label in SCOPES.items():
+            values = getattr(self, scope)
+            if values is None:
+                continue
+            year = int(self.years.max()) if scope == "career" else self.season
+            scope_rows.append({"Driver": self.driver, **dict(zip(STAT_COLUMNS, values)), "Year": year, "Scope": label})
+        if scope_rows:
+            df = pd.concat([df, pd.DataFrame(scope_rows)], ignore_index=True)
+        return df
+
+    @classmethod
+    def from_frame(cls, df, season=None):
+        """Read a legacy frame (race rows plus Scope rows) back into a record.
+
+        Weighted totals are not stored in that format and are left as None.
+        """
+        if "Scope" not in df.columns:
+            df = df.assign(Scope=None)
+        driver = df["Driver"].dropna().iloc[0] if "Driver" in df.columns and df["Driver"].notna().any() else None
+        races = df[df["Scope"].isna()]
+        if "EventDate" in races.columns:
+            races = races.assign(EventDate=pd.to_datetime(races["EventDate"], errors="coerce")).sort_values("EventDate")
+        else:
+            races = races.assign(EventDate=pd.NaT)
+        if season is None:
+            season = int(races["Year"].max()) if len(races) else None
+        rating = cls.from_races(driver, season, races)
+        stats = df.reindex(columns=list(STAT_COLUMNS)).apply(pd.to_numeric, errors="coerce")
+        for scope, label in SCOPES.items():
+            rows = stats[(df["Scope"] == label).to_numpy()]
+            if len(rows):
+                setattr(rating, scope, rows.iloc[0].to_numpy(dtype=float))
+        return rating
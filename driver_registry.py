@@ -0,0 +1,250 @@
+import os
+import json
+import fcntl
+import threading
+import numpy as np
+import pandas as pd
+from log_utils import get_logger
+
+log = get_logger("drivers")
+
+CACHE_DIR = "/mnt/f1_cache"
+# One row per driver ever seen, each with its integer id. Ids are assigned in
+# order and stored with the row, so they only ever grow and stay valid in the
+# DB and the race store. Files written before ids were stored use positions.
+REGISTRY_PATH = os.path.join(CACHE_DIR, "drivers.json")
+LOCK_PATH = REGISTRY_PATH + ".lock"
+PLACEHOLDER_IMAGE = "placeholder.webp"
+UNKNOWN_ID = -1
+
+# (code, full name, image, {season: team}). Order fixes the ids of a fresh
+# registry, so append new drivers at the end.
+SEED = [
+    ("VER", "Max Verstappen", "Max.webp", {2025: "Red Bull Racing"}),
+    ("TSU", "Yuki Tsunoda", "Yuki.webp", {2025: "Red Bull Racing"}),
+    ("LEC", "Charles Leclerc", "Charles.webp", {2025: "Ferrari"}),
+    ("HAM", "Lewis Hamilton", "Lewis.webp", {2025: "Ferrari"}),
+    ("RUS", "George Russell", "FuckFace.webp", {2025: "Mercedes"}),
+    ("ANT", "Andrea Kimi Antonelli", "Kimi.webp", {2025: "Mercedes"}),
+    ("NOR", "Lando Norris", "Lando.webp", {2025: "McLaren"}),
+    ("PIA", "Oscar Piastri", "Oscar.webp", {2025: "McLaren"}),
+    ("ALO", "Fernando Alonso", "Fernando.webp", {2025: "Aston Martin"}),
+    ("STR", "Lance Stroll", "Lance.webp", {2025: "Aston Martin"}),
+    ("GAS", "Pierre Gasly", "Pierre.webp", {2025: "Alpine"}),
+    ("COL", "Franco Colapinto", "Franco.webp", {2025: "Alpine"}),
+    ("OCO", "Esteban Ocon", "Ocon.webp", {2025: "Haas F1 Team"}),
+    ("BEA", "Oliver Bearman", "Oliver.webp", {2025: "Haas F1 Team"}),
+    ("ALB", "Alex Albon", "Alex.webp", {2025: "Williams"}),
+    ("SAI", "Carlos Sainz", "Carlos.webp", {2025: "Williams"}),
+    ("HUL", "Nico Hülkenberg", "Nico.webp", {2025: "Kick Sauber"}),
+    ("BOR", "Gabriel Bortoleto", "Gabe.webp", {2025: "Kick Sauber"}),
+    ("HAD", "Isack Hadjar", "Isack.webp", {2025: "Racing Bulls"}),
+    ("LAW", "Liam Lawson", PLACEHOLDER_IMAGE, {2025: "Racing Bulls"}),
+    ("DOO", "Jack Doohan", "Jack.webp", {2025: "Alpine"}),
+    ("SAR", "Logan Sargeant", "Logan.webp", {}),
+    ("BOT", "Valtteri Bottas", "Valtteri.webp", {}),
+    ("ZHO", "Guanyu Zhou", "Guanyu.webp", {}),
+]
+
+
+class Driver:
+    __slots__ = ("id", "code", "name", "image", "teams")
+
+    def __init__(self, id, code, name=None, image=None, teams=None):
+        self.id = id
+        self.code = code
+        self.name = name or code
+        self.image = image or PLACEHOLDER_IMAGE
+        self.teams = {int(season): team for season, team in (teams or {}).items()}
+
+    def team(self, season=None):
+        """Team for a season (default: the latest season on record)."""
+        if not self.teams:
+            return None
+        if season is None:
+            return self.teams[max(self.teams)]
+        return self.teams.get(int(season))
+
+    def to_dict(self):
+        return {"id": self.id, "code": self.code, "name": self.name, "image": self.image,
+                "teams": {str(season): team for season, team in sorted(self.teams.items())}}
+
+
+class DriverRegistry:
+    """Interned driver metadata with compact integer ids (0..n-1).
+
+    codes[id] is the driver code; ids() maps a column of codes to an int
+    array in one vectorized pass, so the rating engine, the race store and
+    the roster tables can join on integers instead of comparing strings.
+    Unknown codes map to UNKNOWN_ID in both id() and ids().
+    """
+
+    def __init__(self, drivers):
+        self.drivers = drivers
+        self.codes = np.array([d.code for d in drivers], dtype=object)
+        self._index = pd.Index(self.codes)
+        self._by_code = {d.code: d for d in drivers}
+
+    def __len__(self):
+        return len(self.drivers)
+
+    def __contains__(self, code):
+        return code in self._by_code
+
+    def get(self, code):
+        return self._by_code.get(code)
+
+    def id(self, code):
+        driver = self._by_code.get(code)
+        return driver.id if driver else UNKNOWN_ID
+
+    def code(self, driver_id):
+        return self.codes[driver_id] if 0 <= driver_id < len(self.codes) else None
+
+    def ids(self, codes):
+        """Int array of ids for an array of codes; UNKNOWN_ID where a code is unknown."""
+        return self._index.get_indexer(np.asarray(codes, dtype=object))
+
+    def name(self, code):
+        driver = self._by_code.get(code)
+        return driver.name if driver else code
+
+    def image(self, code):
+        driver = self._by_code.get(code)
+        return driver.image if driver else PLACEHOLDER_IMAGE
+
+    def team(self, code, season=None):
+        driver = self._by_code.get(code)
+        return driver.team(season) if driver else None
+
+    def name_map(self):
+        return {d.code: d.name for d in self.drivers}
+
+
+_registry = {"mtime": None, "registry": None}
+_lock = threading.Lock()
+
+
+def _seed_registry():
+    return DriverRegistry([Driver(i, code, name, image, teams) for i, (code, name, image, teams) in enumerate(SEED)])
+
+
+def _read():
+    with open(REGISTRY_PATH) as f:
+        rows = json.load(f)
+    drivers = sorted((Driver(row.pop("id", i), **row) for i, row in enumerate(rows)), key=lambda d: d.id)
+    if [d.id for d in drivers] != list(range(len(drivers))):
+        raise ValueError("driver ids are not 0..n-1")
+    return DriverRegistry(drivers)
+
+
+def _write(registry):
+    tmp = f"{REGISTRY_PATH}.tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump([d.to_dict() for d in registry.drivers], f, ensure_ascii=False, indent=1)
+    os.replace(tmp, REGISTRY_PATH)
+
+
+def _mtime():
+    try:
+        return os.stat(REGISTRY_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_registry():
+    """The registry, loaded once and reloaded only when another process changed the file."""
+    mtime = _mtime()
+    if _registry["registry"] is not None and mtime == _registry["mtime"]:
+        return _registry["registry"]
+    with _lock:
+        mtime = _mtime()
+        if mtime is None:
+            registry = _seed_registry()
+        else:
+            try:
+                registry = _read()
+            except (OSError, ValueError, TypeError) as e:
+                log.error("❌ Could not read driver registry, using the built-in seed: %s", e)
+                registry = _seed_registry()
+        _registry.update(mtime=mtime, registry=registry)
+    return registry
+
+
+def _update(change):
+    """Apply change(drivers) under the file lock and persist if it returned True."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with _lock, open(LOCK_PATH, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Re-read under the lock so concurrent workers append, not overwrite.
+            current = _read() if _mtime() is not None else _seed_registry()
+            drivers = list(current.drivers)
+            if change(drivers) or _mtime() is None:
+                registry = DriverRegistry(drivers)
+                _write(registry)
+            else:
+                registry = current
+            _registry.update(mtime=_mtime(), registry=registry)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return registry
+
+
+def intern(codes, names=None, teams=None, season=None):
+    """Ids for `codes`, registering any unknown driver first.
+
+    names / teams optionally map code -> full name / team for `season`, so a
+    race ingest records new drivers and their current team in one place.
+    """
+    codes = [c for c in pd.unique(np.asarray(codes, dtype=object)) if isinstance(c, str) and c]
+    names, teams = names or {}, teams or {}
+    registry = get_registry()
+    stale = [
+        c for c in codes
+        if c not in registry
+        or (c in names and registry.get(c).name == c)
+        or (season is not None and c in teams and registry.team(c, season) != teams[c])
+    ]
+    if stale:
+        def change(drivers):
+            by_code = {d.code: d for d in drivers}
+            changed = False
+            for code in stale:
+                driver = by_code.get(code)
+                if driver is None:
+                    driver = Driver(len(drivers), code, names.get(code))
+                    drivers.append(driver)
+                    log.info("🆕 Registered driver %s as id %d", code, driver.id)
+                    changed = True
+                elif code in names and driver.name == code:
+                    driver.name = names[code]
+                    changed = True
+                if season is not None and code in teams and driver.teams.get(int(season)) != teams[code]:
+                    driver.teams[int(season)] = teams[code]
+                    changed = True
+            return changed
+        registry = _update(change)
+    return registry
+
+
+def observe_results(year, results):
+    """Record drivers, names and teams from a FastF1 session results table."""
+    if results is None or len(results) == 0 or "Abbreviation" not in results:
+        return get_registry()
+    df = pd.DataFrame(results).dropna(subset=["Abbreviation"])
+    names = dict(zip(df["Abbreviation"], df["FullName"])) if "FullName" in df else {}
+    teams = dict(zip(df["Abbreviation"], df["TeamName"])) if "TeamName" in df else {}
+    return intern(df["Abbreviation"], names={k: v for k, v in names.items() if isinstance(v, str)},
+                  teams={k: v for k, v in teams.items() if isinstance(v, str)}, season=year)
+
+
+def driver_ids(codes):
+    """Vectorized code -> id for a column of codes, interning unknown codes."""
+    codes = np.asarray(codes, dtype=object)
+    registry = get_registry()
+    ids = registry.ids(codes)
+    if (ids == UNKNOWN_ID).any():
+        registry = intern(codes[ids == UNKNOWN_ID])
+        ids = registry.ids(codes)
+    return ids
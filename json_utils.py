@@ -0,0 +1,23 @@
+import json
+import math
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+def clean(value):
+    """NaN/inf -> None and NumPy scalars -> Python, so the payload is valid JSON."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def dumps(obj):
+    """Serialize to compact JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode()
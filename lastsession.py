@@ -3,6 +3,7 @@ import pandas as pd
 import os
 
 from fastf1.core import Laps
+from scoring import score_frame
 
 # Cache location
 CACHE_DIR = 'f1_cache'
@@ -27,28 +28,13 @@ def calculate_points(year, gp_name):
             return pd.DataFrame()
 
         df = pd.merge(
-            q_results[['Abbreviation', 'Position']].rename(columns={'Position': 'position_quali'}),
-            r_results[['Abbreviation', 'Position']].rename(columns={'Position': 'position_race'}),
+            q_results[['Abbreviation', 'Position']].rename(columns={'Position': 'Quali'}),
+            r_results[['Abbreviation', 'Position']].rename(columns={'Position': 'Race'}),
             on='Abbreviation'
-        )
-
-        df['positions_gained'] = df['position_quali'] - df['position_race']
-        df['positions_gained'] = df['positions_gained'].apply(lambda x: max(0, x))
-        df['points_from_race'] = (21 - df['position_race']) * 1
-        df['points_from_gain'] = df['positions_gained'] * 2
-        df['points_from_quali'] = (21 - df['position_quali']) * 3
-        df['total_points'] = df['points_from_race'] + df['points_from_gain'] + df['points_from_quali']
-
-        df = df.rename(columns={
-            'Abbreviation': 'Driver',
-            'position_quali': 'Quali',
-            'position_race': 'Race',
-            'positions_gained': '+Pos',
-            'total_points': 'Total Points'
-        })
-
-        df['Q/R/+O'] = df.apply(lambda row: f"{row['points_from_quali']}/{row['points_from_race']}/{row['points_from_gain']}", axis=1)
-        return df[['Driver', 'Quali', 'Race', '+Pos', 'Q/R/+O', 'Total Points']]
+        ).rename(columns={'Abbreviation': 'Driver'})
+
+        df = score_frame(df)
+        return df[['Driver', 'Quali', 'Race', '+Pos', 'points_from_quali', 'points_from_race', 'points_from_gain', 'Total Points']]
 
     except Exception as e:
         print(f"Error processing {year} {gp_name}: {e}")
@@ -0,0 +1,189 @@
+import os
+import time
+import queue
+import threading
+from core_utils import get_data_version
+from json_utils import dumps
+from log_utils import get_logger, count
+
+log = get_logger("live")
+
+POLL_INTERVAL = float(os.environ.get("F1_LIVE_POLL", "1.0"))        # seconds between data version checks
+HEARTBEAT = 15                                                       # seconds between SSE keep-alive comments
+MAX_STREAMS = int(os.environ.get("F1_LIVE_MAX_STREAMS", "128"))      # open SSE streams per process
+STREAM_LIFETIME = 300                                                # seconds before a stream closes and frees its slot
+POLL_AFTER = 15                                                      # Retry-After for /api/live pollers and refused streams
+LEADERBOARD_SIZE = 10
+
+
+def build_snapshot():
+    """Leaderboard top, top driver and latest race for the current data (needs an app context)."""
+    from core_utils import get_last_processed_race
+    from points_utils import top_driver
+    from driver_registry import get_registry
+    from standings_utils import latest_standings_year, leaderboard_page, standing_to_dict
+
+    driver, points = top_driver()
+    year = latest_standings_year()
+    standings = []
+    if year is not None:
+        page = leaderboard_page(year, 1, LEADERBOARD_SIZE)
+        standings = [standing_to_dict(standing, username) for standing, username in page.items]
+    return {
+        "latest_race": get_last_processed_race(),
+        "top_driver": {
+            "driver": driver,
+            "name": get_registry().name(driver) if driver else None,
+            "points": round(points, 2) if driver else None,
+        },
+        "leaderboard": {"year": year, "standings": standings},
+    }
+
+
+class Broadcaster:
+    """One snapshot per data version, fanned out to every subscriber.
+
+    A single background thread watches the data version, rebuilds the
+    snapshot (and its serialized SSE frame) once when it moves, and drops
+    the shared bytes into every subscriber's one-slot mailbox. A client
+    that falls behind only ever gets the newest frame, so a slow reader
+    never delays the others or piles up memory.
+
+    Each open stream still holds the thread serving its request while it
+    waits on its mailbox (idle, no polling). The app runs under werkzeug's
+    threaded server, which starts a thread per connection rather than
+    drawing from a fixed pool, so streams do not starve page requests.
+    They are still capped at MAX_STREAMS per process and recycled after
+    `lifetime` seconds (EventSource reconnects on its own). Streaming
+    without a thread per client would need an async server (gevent/ASGI).
+    """
+
+    def __init__(self, app, build=build_snapshot, poll_interval=POLL_INTERVAL, max_subscribers=MAX_STREAMS,
+                 lifetime=STREAM_LIFETIME):
+        self.app = app
+        self.build = build
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self.lifetime = lifetime
+        self.version = None
+        self.snapshot = None
+        self.frame = None
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    # -- publisher ---------------------------------------------------------
+
+    def refresh(self):
+        """Rebuild and publish if the data version moved; True if it did."""
+        version = get_data_version()
+        if version == self.version:
+            return False
+        with self.app.app_context():
+            snapshot = dict(self.build(), version=version)
+        frame = f"id: {version}\nevent: update\ndata: ".encode() + dumps(snapshot) + b"\n\n"
+        with self._lock:
+            self.version, self.snapshot, self.frame = version, snapshot, frame
+            self._publish(frame)
+        count("live.published")
+        log.info("📣 Published live snapshot for version %s to %d subscribers", version, self.subscribers)
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                log.warning("⚠️ Live snapshot failed: %s", e)
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._run, name="live-broadcaster", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            for client in self._clients:
+                self._deliver(client, None)
+
+    @property
+    def subscribers(self):
+        return len(self._clients)
+
+    @staticmethod
+    def _deliver(client, frame):
+        # One-slot mailbox: replace whatever the client has not read yet.
+        try:
+            client.get_nowait()
+        except queue.Empty:
+            pass
+        client.put_nowait(frame)
+
+    def _publish(self, frame):
+        for client in self._clients:
+            self._deliver(client, frame)
+
+    # -- subscribers -------------------------------------------------------
+
+    def subscribe(self):
+        """A mailbox for a new stream, or None (answer 503) when this process is already full."""
+        with self._lock:
+            if len(self._clients) >= self.max_subscribers:
+                count("live.rejected")
+                return None
+            client = queue.Queue(maxsize=1)
+            self._clients.add(client)
+            return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def stream(self, client, last_event_id=None):
+        """SSE frames: the current snapshot (unless already seen), then one per new version.
+
+        Ends after `lifetime` seconds so a slot is never held indefinitely.
+        """
+        closes_at = time.monotonic() + self.lifetime
+        yield f"retry: {int(self.poll_interval * 1000) + 1000}\n\n".encode()
+        with self._lock:
+            version, sent = self.version, self.frame
+        if sent is not None and version != last_event_id:
+            count("live.frames_sent")
+            yield sent
+        while not self._stop.is_set():
+            remaining = closes_at - time.monotonic()
+            if remaining <= 0:
+                count("live.streams_recycled")
+                return
+            try:
+                frame = client.get(timeout=min(HEARTBEAT, remaining))
+            except queue.Empty:
+                yield b": ping\n\n"
+                continue
+            if frame is None:
+                return
+            if frame is sent:   # published between subscribe() and the first frame
+                continue
+            sent = frame
+            count("live.frames_sent")
+            yield frame
+
+
+_broadcaster = None
+_lock = threading.Lock()
+
+
+def get_broadcaster(app):
+    """The process's broadcaster, started on first use."""
+    global _broadcaster
+    with _lock:
+        if _broadcaster is None:
+            _broadcaster = Broadcaster(app).start()
+    return _broadcaster
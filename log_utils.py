@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+CACHE_DIR = "/mnt/f1_cache"
+RUN_LOG_PATH = os.path.join(CACHE_DIR, "pipeline_runs.jsonl")
+
+# F1_LOG_LEVEL=WARNING is "quiet mode": per-item messages are skipped before
+# any formatting happens, and stage spans only cost a perf_counter() pair.
+LOG_LEVEL = os.environ.get("F1_LOG_LEVEL", "INFO").upper()
+# Per-item messages logged through log_sampled() are emitted once every N calls.
+SAMPLE_EVERY = max(1, int(os.environ.get("F1_LOG_SAMPLE_EVERY", "25")))
+
+PIPELINE_STAGES = ("ingest", "score", "rate", "summarize", "settle")
+
+_configured = False
+_configure_lock = threading.Lock()
+_local = threading.local()
+_sample_counts = {}
+_sample_lock = threading.Lock()
+
+
+def _configure():
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        root = logging.getLogger("f1")
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+        _configured = True
+
+
+def get_logger(name):
+    """Return a logger under the shared "f1" namespace."""
+    _configure()
+    return logging.getLogger(f"f1.{name}")
+
+
+def log_sampled(logger, key, msg, *args, level=logging.DEBUG, every=None):
+    """Log a per-item message, keeping only the first and every Nth call per key."""
+    if not logger.isEnabledFor(level):
+        return
+    with _sample_lock:
+        count = _sample_counts.get(key, 0)
+        _sample_counts[key] = count + 1
+    if count % (every or SAMPLE_EVERY) == 0:
+        logger.log(level, msg, *args)
+
+
+class PipelineRun:
+    """Timing and counters for one pipeline invocation (e.g. a race update)."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.errors = 0
+
+    def add_span(self, stage, seconds, items=0):
+        entry = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0, "items": 0})
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        entry["items"] += items
+
+    def count(self, key, n=1):
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def summary(self, status):
+        ordered = {s: self.stages[s] for s in PIPELINE_STAGES if s in self.stages}
+        ordered.update({s: v for s, v in self.stages.items() if s not in ordered})
+        return {
+            "run": self.name,
+            "status": status,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "seconds": round(time.perf_counter() - self.started, 3),
+            "stages": {s: {**v, "seconds": round(v["seconds"], 3)} for s, v in ordered.items()},
+            "counters": self.counters,
+            "errors": self.errors,
+        }
+
+
+def current_run():
+    return getattr(_local, "run", None)
+
+
+@contextmanager
+def pipeline_run(name):
+    """Open a pipeline run, or join the one already active on this thread.
+
+    When the outermost run finishes, its summary is logged as one JSON line
+    and appended to pipeline_runs.jsonl in the cache directory.
+    """
+    outer = current_run()
+    if outer is not None:
+        yield outer
+        return
+
+    run = PipelineRun(name)
+    _local.run = run
+    status = "ok"
+    try:
+        yield run
+    except Exception:
+        status = "failed"
+        raise
+    finally:
+        _local.run = None
+        summary = json.dumps(run.summary(status))
+        get_logger("pipeline").info("%s", summary)
+        try:
+            with open(RUN_LOG_PATH, "a") as f:
+                f.write(summary + "\n")
+        except OSError:
+            pass
+
+
+class _Span:
+    __slots__ = ("run", "stage", "items", "started")
+
+    def __init__(self, run, stage, items):
+        self.run = run
+        self.stage = stage
+        self.items = items
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.run.errors += 1
+        self.run.add_span(self.stage, time.perf_counter() - self.started, self.items)
+        return False
+
+
+def stage(name, items=0):
+    """Time a pipeline stage; a no-op context when no run is active."""
+    run = current_run()
+    if run is None:
+        return nullcontext()
+    return _Span(run, name, items)
+
+
+def count(key, n=1):
+    run = current_run()
+    if run is not None:
+        run.count(key, n)
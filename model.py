@@ -1,9 +1,18 @@
 # model.py
+import time
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import inspect, text
 
 db = SQLAlchemy()
 
+# Pets decay lazily: stats are stored as of last_updated and brought forward
+# by whole ticks whenever they are read or written.
+PET_DECAY_INTERVAL = 60  # seconds per tick
+PET_STAT_DECAY = 1       # food/water/fun lost per tick
+PET_XP_PER_TICK = 1
+PET_XP_PER_LEVEL = 25
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True)
@@ -12,11 +21,14 @@ class User(UserMixin, db.Model):
     drivers = db.Column(db.String, default="")  # comma-separated
     boosts = db.Column(db.String, default="")   # Format: "VER:qualifying;HAM:race"
 
+    rostered_drivers = db.relationship("RosteredDrivers", lazy="select", order_by="RosteredDrivers.id")
+
 
 class UserRaceResult(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
     driver = db.Column(db.String)
+    driver_id = db.Column(db.Integer, index=True)  # driver registry id
     year = db.Column(db.Integer)
     race = db.Column(db.String)
     base_points = db.Column(db.Float)
@@ -29,6 +41,7 @@ class RosteredDrivers(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     driver = db.Column(db.String, nullable=False)
+    driver_id = db.Column(db.Integer, index=True)  # driver registry id
     hype_at_buy = db.Column(db.Float, nullable=False)
     value_at_buy = db.Column(db.Float, nullable=False)
     races_owned = db.Column(db.Integer, default=0)
@@ -36,6 +49,107 @@ class RosteredDrivers(db.Model):
     current_value = db.Column(db.Float, default=0)
 
 
+class Standing(db.Model):
+    """Materialized fantasy league table, updated by the settlement step."""
+    __tablename__ = 'standings'
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    season_points = db.Column(db.Float, default=0)
+    last_race = db.Column(db.String, default="")
+    last_race_points = db.Column(db.Float, default=0)
+    net_worth = db.Column(db.Float, default=0)
+    rank = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.UniqueConstraint('year', 'user_id', name='uq_standings_year_user'),
+        db.Index('ix_standings_year_rank', 'year', 'rank'),
+        db.Index('ix_standings_year_points', 'year', 'season_points', 'net_worth'),
+    )
+
+
+class RaceSettlement(db.Model):
+    """Idempotency marker and progress record: one row per race being or already settled.
+
+    status is "running" while users are settled chunk by chunk and "done"
+    once every user is (rows from before chunked settlement have no status
+    and count as done). A restart resumes a running race instead of
+    settling it again.
+    """
+    __tablename__ = 'race_settlements'
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    race = db.Column(db.String, nullable=False)
+    settled_at = db.Column(db.Float, nullable=False)
+    users = db.Column(db.Integer, default=0)
+    rated_at = db.Column(db.Float)
+    status = db.Column(db.String, default="done")
+    users_total = db.Column(db.Integer, default=0)
+    last_user_id = db.Column(db.Integer, default=0)  # keyset cursor of the last committed chunk
+    replay = db.Column(db.Boolean, default=False)     # forced re-settlement from recorded inputs
+
+    __table_args__ = (
+        db.UniqueConstraint('year', 'race', name='uq_race_settlements_year_race'),
+    )
+
+    @property
+    def done(self):
+        return self.status != "running"
+
+    def progress(self):
+        return {
+            "year": self.year,
+            "race": self.race,
+            "status": self.status or "done",
+            "users_done": self.users or 0,
+            "users_total": self.users_total or self.users or 0,
+            "started_at": self.settled_at,
+            "rated_at": self.rated_at,
+        }
+
+
+class UserSettlement(db.Model):
+    """Per-(race, user) checkpoint, committed with that user's results for the race.
+
+    drivers / boosts are the team and boosts the user was settled with, so a
+    forced re-settlement replays the same inputs. done is False while a
+    forced re-settlement has reversed this user's results but not yet
+    settled them again (NULL on older rows counts as done).
+    """
+    __tablename__ = 'user_settlements'
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    race = db.Column(db.String, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    points = db.Column(db.Float, default=0)
+    settled_at = db.Column(db.Float, nullable=False)
+    drivers = db.Column(db.String)
+    boosts = db.Column(db.String)
+    done = db.Column(db.Boolean, default=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('year', 'race', 'user_id', name='uq_user_settlements_race_user'),
+    )
+
+
+class Trade(db.Model):
+    """Append-only ledger: one row per buy or sell, written with the balance change."""
+    __tablename__ = 'trades'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    driver = db.Column(db.String, nullable=False)
+    driver_id = db.Column(db.Integer)
+    side = db.Column(db.String, nullable=False)  # "buy" or "sell"
+    price = db.Column(db.Float, nullable=False)
+    hype = db.Column(db.Float)
+    balance_after = db.Column(db.Float)
+    created_at = db.Column(db.Float, nullable=False, default=time.time)
+
+    __table_args__ = (
+        db.Index('ix_trades_user_created', 'user_id', 'created_at'),
+    )
+
+
 class Pet(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     food = db.Column(db.Float, default=100.0)
@@ -43,13 +157,100 @@ class Pet(db.Model):
     fun = db.Column(db.Float, default=100.0)
     xp = db.Column(db.Integer, default=0)
     level = db.Column(db.Integer, default=1)
+    last_updated = db.Column(db.Float, default=time.time)  # epoch seconds the stats are valid at
 
-    def to_dict(self):
+    def decay_ticks(self, now):
+        if self.last_updated is None:
+            return 0
+        return max(0, int((now - self.last_updated) // PET_DECAY_INTERVAL))
+
+    def decayed_stats(self, now=None):
+        """Return the stats as they stand at `now`, without touching the row."""
+        now = time.time() if now is None else now
+        ticks = self.decay_ticks(now)
+        xp = (self.xp or 0) + ticks * PET_XP_PER_TICK
         return {
-            "id": self.id,
-            "food": self.food,
-            "water": self.water,
-            "fun": self.fun,
-            "xp": self.xp,
-            "level": self.level,
+            "food": max((self.food or 0) - ticks * PET_STAT_DECAY, 0),
+            "water": max((self.water or 0) - ticks * PET_STAT_DECAY, 0),
+            "fun": max((self.fun or 0) - ticks * PET_STAT_DECAY, 0),
+            "xp": xp % PET_XP_PER_LEVEL,
+            "level": (self.level or 1) + xp // PET_XP_PER_LEVEL,
         }
+
+    def apply_decay(self, now=None):
+        """Materialize elapsed decay onto this row (caller commits)."""
+        now = time.time() if now is None else now
+        if self.last_updated is None:
+            self.last_updated = now
+            return self
+        ticks = self.decay_ticks(now)
+        if ticks:
+            for key, value in self.decayed_stats(now).items():
+                setattr(self, key, value)
+            # Keep the partial tick so reads and writes don't reset the clock.
+            self.last_updated += ticks * PET_DECAY_INTERVAL
+        return self
+
+    def to_dict(self, now=None):
+        return {"id": self.id, **self.decayed_stats(now)}
+
+
+def add_missing_columns():
+    """ALTER existing tables to add columns declared on the models.
+
+    db.create_all() only creates missing tables, so columns added to an
+    existing model would otherwise never reach a deployed SQLite file.
+    """
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}'))
+
+
+def backfill_driver_ids():
+    """Fill driver_id on roster and result rows written before the registry existed."""
+    from driver_registry import driver_ids
+    filled = 0
+    for model in (RosteredDrivers, UserRaceResult):
+        rows = db.session.query(model.id, model.driver).filter(model.driver_id.is_(None), model.driver.isnot(None)).all()
+        if not rows:
+            continue
+        ids = driver_ids([driver for _, driver in rows])
+        db.session.bulk_update_mappings(model, [
+            {"id": row_id, "driver_id": int(driver_id)} for (row_id, _), driver_id in zip(rows, ids) if driver_id >= 0
+        ])
+        filled += len(rows)
+    db.session.commit()
+    return filled
+
+
+def check_driver_ids():
+    """Re-point driver_id at the registry wherever it no longer names the row's driver.
+
+    Ids come from drivers.json; if that file was lost or rebuilt, ids stored
+    in the DB may resolve to another driver (or none). The driver code on
+    every row is authoritative, so mismatched ids are re-derived from it.
+    Returns the number of rows repaired.
+    """
+    from driver_registry import get_registry, driver_ids
+    registry = get_registry()
+    repaired = 0
+    for model in (RosteredDrivers, UserRaceResult, Trade):
+        pairs = db.session.query(model.driver, model.driver_id).filter(
+            model.driver_id.isnot(None), model.driver.isnot(None)).distinct().all()
+        stale = [(driver, driver_id) for driver, driver_id in pairs if registry.code(driver_id) != driver]
+        if not stale:
+            continue
+        ids = driver_ids([driver for driver, _ in stale])
+        for (driver, old_id), new_id in zip(stale, ids):
+            repaired += model.query.filter_by(driver=driver, driver_id=old_id).update(
+                {"driver_id": int(new_id)}, synchronize_session=False)
+    db.session.commit()
+    return repaired
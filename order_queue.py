@@ -0,0 +1,273 @@
+import os
+import time
+import itertools
+import threading
+from collections import OrderedDict, deque
+from sqlalchemy import select, update
+from model import db, User, RosteredDrivers
+from log_utils import get_logger, count
+from trade_utils import quote, team_of, read_user, check_buy, check_sell, trade_row, roster_row
+
+log = get_logger("orders")
+
+# F1_ORDER_QUEUE=1 routes buys and sells through the batched queue (e.g. for
+# trade deadlines); otherwise each trade commits on its own.
+ENABLED = os.environ.get("F1_ORDER_QUEUE", "0") == "1"
+BATCH_SIZE = int(os.environ.get("F1_ORDER_BATCH_SIZE", "200"))
+BATCH_INTERVAL = float(os.environ.get("F1_ORDER_INTERVAL", "0.5"))   # seconds between clears
+MAX_REQUEUES = 3       # batches an order may be retried in after a row conflict
+KEEP_RESULTS = 10000   # finished orders kept for status lookups
+
+
+class Order:
+    __slots__ = ("id", "user_id", "side", "driver", "status", "message", "price", "submitted_at",
+                 "cleared_at", "attempts", "done")
+
+    def __init__(self, id, user_id, side, driver):
+        self.id = id
+        self.user_id = user_id
+        self.side = side
+        self.driver = driver
+        self.status = "queued"
+        self.message = "⏳ Order queued."
+        self.price = None
+        self.submitted_at = time.time()
+        self.cleared_at = None
+        self.attempts = 0
+        self.done = threading.Event()
+
+    def finish(self, status, message, price=None):
+        self.status, self.message, self.price = status, message, price
+        self.cleared_at = time.time()
+        self.done.set()
+
+    def wait(self, timeout):
+        return self.done.wait(timeout)
+
+    @property
+    def ok(self):
+        return self.status == "filled"
+
+    def to_dict(self):
+        return {"id": self.id, "side": self.side, "driver": self.driver, "status": self.status,
+                "message": self.message, "price": self.price}
+
+
+class OrderQueue:
+    """Buy/sell orders validated on submit and cleared in batched transactions.
+
+    submit() checks an order against the user's row plus their still-queued
+    orders and queues it. A background thread clears up to BATCH_SIZE orders
+    every BATCH_INTERVAL seconds in ONE transaction: users' balances and
+    teams are updated with one conditional UPDATE each, roster and ledger
+    rows are inserted, and every order gets its own result. A user whose row
+    changed under the batch (another worker, an admin edit) has all their
+    orders in it retried in the next batch, including any the stale replay
+    rejected.
+    """
+
+    def __init__(self, app, batch_size=BATCH_SIZE, interval=BATCH_INTERVAL):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending = deque()
+        self._results = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -- submission --------------------------------------------------------
+
+    def _projected(self, user_id, balance, team):
+        """Balance and team after this user's orders that are still queued."""
+        team = list(team)
+        for order in self._pending:
+            if order.user_id != user_id:
+                continue
+            if order.side == "buy":
+                balance -= order.price or 0
+                team.append(order.driver)
+            elif order.driver in team:
+                team.remove(order.driver)
+        return balance, team
+
+    def submit(self, user_id, side, driver):
+        """Validate and queue an order; rejected orders come back already finished."""
+        driver = driver.upper()
+        row = read_user(user_id)
+        with self._lock:
+            order = Order(next(self._ids), user_id, side, driver)
+            self._results[order.id] = order
+            while len(self._results) > KEEP_RESULTS:
+                self._results.popitem(last=False)
+            if row is None:
+                order.finish("rejected", "❌ User not found.")
+                return order
+            balance, team = self._projected(user_id, row.balance, team_of(row.drivers))
+            if side == "buy":
+                order.price = quote(driver)[0]
+                error = check_buy(team, balance, driver, order.price)
+            else:
+                error = check_sell(team, driver)
+            if error:
+                count("orders.rejected")
+                order.finish("rejected", error, order.price)
+                return order
+            self._pending.append(order)
+            count("orders.queued")
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+        return order
+
+    def get(self, order_id):
+        with self._lock:
+            return self._results.get(order_id)
+
+    def __len__(self):
+        return len(self._pending)
+
+    # -- clearing ----------------------------------------------------------
+
+    def _take_batch(self):
+        with self._lock:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+        return batch
+
+    def _requeue(self, orders):
+        retry = []
+        for order in orders:
+            order.attempts += 1
+            if order.attempts > MAX_REQUEUES:
+                order.finish("rejected", "❌ Your team changed while trading, please retry.")
+            else:
+                retry.append(order)
+        with self._lock:
+            self._pending.extendleft(reversed(retry))
+        count("orders.requeued", len(retry))
+
+    def clear(self):
+        """Clear one batch now; returns the number of orders taken."""
+        batch = self._take_batch()
+        if not batch:
+            return 0
+        started = time.perf_counter()
+        with self.app.app_context():
+            try:
+                self._clear(batch)
+            except Exception as e:
+                db.session.rollback()
+                log.error("❌ Order batch of %d failed, retrying next batch: %s", len(batch), e)
+                self._requeue(batch)
+        count("orders.batches")
+        log.info("🧾 Cleared %d orders in %.0f ms", len(batch), (time.perf_counter() - started) * 1000)
+        return len(batch)
+
+    def _clear(self, batch):
+        user_ids = {o.user_id for o in batch}
+        users = {
+            row.id: row for row in
+            db.session.execute(select(User.id, User.balance, User.drivers).where(User.id.in_(user_ids)))
+        }
+        # Keyed by code, not driver_id: the code is authoritative, so a row with a
+        # NULL or stale id is still found (and deleted on a sale).
+        rosters = {
+            (r.user_id, r.driver): r
+            for r in RosteredDrivers.query.filter(RosteredDrivers.user_id.in_(user_ids))
+        }
+
+        # Replay each user's orders in arrival order against an in-memory copy.
+        state = {uid: {"balance": row.balance, "team": team_of(row.drivers), "delta": 0, "fills": [],
+                       "rejected": [], "orders": []}
+                 for uid, row in users.items()}
+        results = []
+        for order in batch:
+            st = state.get(order.user_id)
+            if st is None:
+                results.append((order, "rejected", "❌ User not found.", None))
+                continue
+            st["orders"].append(order)
+            record = None
+            if order.side == "buy":
+                price, hype = quote(order.driver)
+                error = check_buy(st["team"], st["balance"], order.driver, price)
+                if error:
+                    st["rejected"].append((order, "rejected", error, price))
+                    continue
+                st["team"].append(order.driver)
+                cash = -price
+            else:
+                error = check_sell(st["team"], order.driver)
+                if error:
+                    st["rejected"].append((order, "rejected", error, None))
+                    continue
+                record = rosters.pop((order.user_id, order.driver), None)
+                price, hype = (record.current_value, None) if record else quote(order.driver)
+                price = price or 0
+                st["team"].remove(order.driver)
+                cash = price
+            st["balance"] += cash
+            st["delta"] += cash
+            st["fills"].append((order, price, hype, st["balance"], record))
+
+        # One conditional UPDATE per user; users whose row moved are retried whole,
+        # since their rejections were decided against the same stale row.
+        conflicted = []
+        for uid, st in state.items():
+            if st["fills"]:
+                conditions = [User.id == uid, User.drivers == users[uid].drivers]
+                if st["delta"] < 0:
+                    conditions.append(User.balance + st["delta"] >= 0)
+                result = db.session.execute(
+                    update(User).where(*conditions)
+                    .values(balance=User.balance + st["delta"], drivers=",".join(st["team"]))
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount != 1:
+                    conflicted.extend(st["orders"])
+                    continue
+            results.extend(st["rejected"])
+            for order, price, hype, balance_after, record in st["fills"]:
+                if order.side == "buy":
+                    db.session.add(roster_row(uid, order.driver, price, hype))
+                elif record is not None:
+                    db.session.delete(record)
+                db.session.add(trade_row(uid, order.driver, order.side, price, hype, balance_after))
+                results.append((order, "filled", f"✅ {'Bought' if order.side == 'buy' else 'Sold'} "
+                                                 f"{order.driver} for ${round(price):,}", price))
+        db.session.commit()
+
+        for order, status, message, price in results:
+            order.finish(status, message, price)
+        count("orders.filled", sum(1 for r in results if r[1] == "filled"))
+        count("orders.rejected", sum(1 for r in results if r[1] == "rejected"))
+        if conflicted:
+            count("orders.conflicts", len(conflicted))
+            self._requeue(sorted(conflicted, key=lambda o: o.id))
+
+    # -- background thread -------------------------------------------------
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            while self._pending and not self._stop.is_set():
+                if self.clear() < self.batch_size:
+                    break
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="order-queue", daemon=True)
+            self._thread.start()
+            log.info("🧾 Order queue clearing every %.2fs (batch %d)", self.interval, self.batch_size)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        while self.clear():
+            pass
@@ -1,37 +1,124 @@
+import os
+import time
 from flask import Flask, request, jsonify
-from model import db, Pet
+from model import db, Pet, add_missing_columns
+from pet_buffer import PetWriteBuffer, clean_fields, replay, snapshot
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///pet.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# PET_WRITE_BEHIND=0 commits every PUT synchronously (the old behaviour).
+WRITE_BEHIND = os.environ.get("PET_WRITE_BEHIND", "1") != "0"
+FLUSH_INTERVAL = float(os.environ.get("PET_FLUSH_INTERVAL", "1.0"))
+FLUSH_MAX_PENDING = int(os.environ.get("PET_FLUSH_MAX_PENDING", "500"))
+MAX_BATCH = 500
+
 db.init_app(app)
 
-@app.before_first_request
-def create_tables():
+with app.app_context():
     db.create_all()
+    add_missing_columns()
+
+write_buffer = PetWriteBuffer(app, interval=FLUSH_INTERVAL, max_pending=FLUSH_MAX_PENDING)
+if WRITE_BEHIND:
+    write_buffer.start()
+    write_buffer.install_shutdown_hook()
+
+
+def _pet_fields(data):
+    """Checked writable fields; raises ValueError with a client-facing message."""
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    return clean_fields(data)
+
+
+def _wants_sync():
+    return not WRITE_BEHIND or request.args.get("sync") == "1"
+
+
+def _read_pets(pet_ids, now):
+    """Current state of each pet: stored row + buffered writes + lazy decay."""
+    stored = {p.id: p for p in Pet.query.filter(Pet.id.in_(pet_ids)).all()}
+    found, missing = {}, []
+    for pet_id in pet_ids:
+        ops = write_buffer.pending(pet_id)
+        pet = stored.get(pet_id)
+        if pet is None and not ops:
+            missing.append(pet_id)
+            continue
+        if ops:
+            pet = replay(snapshot(pet_id, pet, ops[0][0]), ops)
+        found[pet_id] = pet.to_dict(now)
+    return found, missing
+
+
+def _write_pets(updates, now):
+    """Apply {pet_id: fields} either through the buffer or in one transaction."""
+    for pet_id, fields in updates.items():
+        write_buffer.put(pet_id, fields, now)
+    if _wants_sync():
+        write_buffer.flush()
+
 
 @app.route('/api/pet/<int:pet_id>', methods=['GET', 'PUT'])
 def handle_pet(pet_id):
-    pet = Pet.query.get(pet_id)
+    now = time.time()
 
     if request.method == 'GET':
-        if pet:
-            return jsonify(pet.to_dict())
+        # Decay is computed from last_updated on read; nothing is written.
+        found, _ = _read_pets([pet_id], now)
+        if pet_id in found:
+            return jsonify(found[pet_id])
         return jsonify({'error': 'Pet not found'}), 404
 
-    data = request.get_json() or {}
-    if not pet:
-        pet = Pet(id=pet_id)
-        db.session.add(pet)
-
-    pet.food = data.get('food', pet.food)
-    pet.water = data.get('water', pet.water)
-    pet.fun = data.get('fun', pet.fun)
-    pet.xp = data.get('xp', pet.xp)
-    pet.level = data.get('level', pet.level)
-    db.session.commit()
-    return jsonify(pet.to_dict())
+    data = request.get_json(silent=True) or {}
+    try:
+        fields = _pet_fields(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    _write_pets({pet_id: fields}, now)
+    found, _ = _read_pets([pet_id], now)
+    return jsonify(found[pet_id])
+
+
+@app.route('/api/pets', methods=['GET', 'PUT'])
+def handle_pets():
+    """Batch read (?ids=1,2,3) or partial update ({"pets": [{"id": 1, "fun": 80}, ...]})."""
+    now = time.time()
+
+    if request.method == 'GET':
+        try:
+            pet_ids = [int(i) for i in request.args.get("ids", "").split(",") if i.strip()]
+        except ValueError:
+            return jsonify({'error': 'ids must be comma-separated integers'}), 400
+        if len(pet_ids) > MAX_BATCH:
+            return jsonify({'error': f'At most {MAX_BATCH} ids per request'}), 400
+        found, missing = _read_pets(pet_ids, now)
+        return jsonify({'pets': [found[i] for i in pet_ids if i in found], 'missing': missing})
+
+    data = request.get_json(silent=True) or {}
+    items = data.get("pets", []) if isinstance(data, dict) else None
+    if not isinstance(items, list) or len(items) > MAX_BATCH:
+        return jsonify({'error': f'"pets" must be a list of at most {MAX_BATCH} objects'}), 400
+
+    updates = {}
+    for item in items:
+        try:
+            pet_id = int(item["id"])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Every pet needs an integer "id"'}), 400
+        try:
+            fields = _pet_fields(item)
+        except ValueError as e:
+            return jsonify({'error': f'Pet {pet_id}: {e}'}), 400
+        # Later entries for the same pet win field by field.
+        updates.setdefault(pet_id, {}).update(fields)
+
+    _write_pets(updates, now)
+    found, _ = _read_pets(list(updates), now)
+    return jsonify({'pets': [found[i] for i in updates]})
+
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
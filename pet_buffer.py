@@ -0,0 +1,216 @@
+import time
+import atexit
+import signal
+import threading
+from model import db, Pet
+from log_utils import get_logger, count
+
+log = get_logger("pets")
+
+PET_FIELDS = ("food", "water", "fun", "xp", "level")
+# field -> (type, min, max); max None means unbounded.
+PET_LIMITS = {
+    "food": (float, 0, 100),
+    "water": (float, 0, 100),
+    "fun": (float, 0, 100),
+    "xp": (int, 0, None),
+    "level": (int, 1, None),
+}
+MAX_RETRIES = 3   # flushes a pet's writes may fail in before they are dropped
+
+
+def clean_fields(data):
+    """The writable pet fields in `data`, checked; raises ValueError on a bad value."""
+    fields = {}
+    for key in PET_FIELDS:
+        if key not in data:
+            continue
+        kind, low, high = PET_LIMITS[key]
+        value = data[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f'"{key}" must be a number')
+        if kind is int and value != int(value):
+            raise ValueError(f'"{key}" must be a whole number')
+        if value != value or value < low or (high is not None and value > high):
+            raise ValueError(f'"{key}" must be between {low} and {high}' if high is not None
+                             else f'"{key}" must be at least {low}')
+        fields[key] = kind(value)
+    return fields
+
+
+def replay(pet, ops):
+    """Apply buffered (timestamp, fields) writes to a pet in arrival order.
+
+    Each write first brings decay forward to the time it was received, so a
+    flushed pet ends up exactly where synchronous PUTs would have left it.
+    """
+    for at, fields in ops:
+        pet.apply_decay(at)
+        for key, value in fields.items():
+            setattr(pet, key, value)
+    return pet
+
+
+def new_pet(pet_id, at):
+    return Pet(id=pet_id, food=100.0, water=100.0, fun=100.0, xp=0, level=1, last_updated=at)
+
+
+def snapshot(pet_id, pet, at=None):
+    """Detached copy of a stored pet (or a fresh one) that replay() can mutate."""
+    if pet is None:
+        return new_pet(pet_id, at)
+    return Pet(id=pet.id, food=pet.food, water=pet.water, fun=pet.fun, xp=pet.xp,
+               level=pet.level, last_updated=pet.last_updated)
+
+
+class PetWriteBuffer:
+    """Write-behind buffer that coalesces pet updates and commits them in bulk.
+
+    Durability: a PUT answered from the buffer is held only in this process's
+    memory until the next flush, which happens every `interval` seconds or as
+    soon as `max_pending` writes are queued. A clean shutdown (atexit/SIGTERM)
+    flushes; a crash or SIGKILL loses at most the writes of that window.
+    Callers that need the write on disk before replying flush explicitly
+    (the API does this for `?sync=1`). Reads through pending() see buffered
+    writes, so a client always reads its own updates from the same process.
+    """
+
+    def __init__(self, app, interval=1.0, max_pending=500):
+        self.app = app
+        self.interval = interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._inflight = {}
+        self._size = 0
+        self._failures = {}
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def put(self, pet_id, fields, at=None):
+        """Queue a write; raises ValueError (and queues nothing) if a field is invalid."""
+        fields = clean_fields(fields)
+        at = time.time() if at is None else at
+        with self._lock:
+            self._pending.setdefault(pet_id, []).append((at, fields))
+            self._size += 1
+            full = self._size >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def pending(self, pet_id):
+        """Buffered writes for a pet that are not yet committed, oldest first."""
+        with self._lock:
+            return self._inflight.get(pet_id, []) + self._pending.get(pet_id, [])
+
+    def flush(self):
+        """Commit every buffered write; returns the number of pets written.
+
+        The batch commits in one transaction. If that fails, each pet is
+        retried in its own transaction so one bad pet can't block the rest;
+        a pet that keeps failing is requeued up to MAX_RETRIES flushes and
+        then dropped with an error.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._size = self._pending, {}, 0
+                self._inflight = batch
+            if not batch:
+                return 0
+            try:
+                with self.app.app_context():
+                    try:
+                        self._write(batch)
+                        db.session.commit()
+                        written = len(batch)
+                        with self._lock:
+                            for pet_id in batch:
+                                self._failures.pop(pet_id, None)
+                    except Exception as e:
+                        db.session.rollback()
+                        log.warning("⚠️ Pet batch of %d failed, retrying pets one by one: %s", len(batch), e)
+                        written = self._write_each(batch)
+            finally:
+                with self._lock:
+                    self._inflight = {}
+            return written
+
+    def _write(self, batch):
+        existing = {p.id: p for p in Pet.query.filter(Pet.id.in_(list(batch))).all()}
+        for pet_id, ops in batch.items():
+            pet = existing.get(pet_id)
+            if pet is None:
+                pet = new_pet(pet_id, ops[0][0])
+                db.session.add(pet)
+            replay(pet, ops)
+
+    def _write_each(self, batch):
+        written = 0
+        for pet_id, ops in batch.items():
+            try:
+                self._write({pet_id: ops})
+                db.session.commit()
+                written += 1
+                with self._lock:
+                    self._failures.pop(pet_id, None)
+            except Exception as e:
+                db.session.rollback()
+                self._requeue(pet_id, ops, e)
+        return written
+
+    def _requeue(self, pet_id, ops, error):
+        with self._lock:
+            failures = self._failures.get(pet_id, 0) + 1
+            if failures > MAX_RETRIES:
+                self._failures.pop(pet_id, None)
+                count("pets.dropped_writes", len(ops))
+                log.error("❌ Dropping %d writes for pet %s after %d failed flushes: %s",
+                          len(ops), pet_id, failures, error)
+                return
+            self._failures[pet_id] = failures
+            # Back in front of anything queued for this pet meanwhile.
+            self._pending[pet_id] = ops + self._pending.get(pet_id, [])
+            self._size += len(ops)
+        log.warning("⚠️ Pet %s write failed (attempt %d/%d), retrying next flush: %s",
+                    pet_id, failures, MAX_RETRIES, error)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                log.error("❌ Pet write-behind flush failed: %s", e)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="pet-write-behind", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+        self.flush()
+
+    def install_shutdown_hook(self):
+        """Flush on interpreter exit and on SIGTERM (when set from the main thread)."""
+        atexit.register(self.stop)
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def on_sigterm(signum, frame):
+            self.stop()
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, on_sigterm)
@@ -1,6 +1,11 @@
+import sys
 import time
 from flask import Flask
-from model import db, Pet
+from sqlalchemy import text
+from model import (
+    db, Pet, add_missing_columns,
+    PET_DECAY_INTERVAL, PET_STAT_DECAY, PET_XP_PER_TICK, PET_XP_PER_LEVEL,
+)
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///pet.db'
@@ -8,26 +13,70 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db.init_app(app)
 
+CHUNK_SIZE = 5000
 
-def decay_once():
+# Whole ticks elapsed since last_updated, evaluated per row by SQLite.
+_TICKS = "CAST((:now - last_updated) / :interval AS INTEGER)"
+
+# SET expressions all see the pre-update row, so xp/level can share _TICKS.
+_DECAY_SQL = text(f"""
+    UPDATE pet SET
+        food = MAX(food - {_TICKS} * :decay, 0),
+        water = MAX(water - {_TICKS} * :decay, 0),
+        fun = MAX(fun - {_TICKS} * :decay, 0),
+        level = level + (xp + {_TICKS} * :xp_tick) / :xp_per_level,
+        xp = (xp + {_TICKS} * :xp_tick) % :xp_per_level,
+        last_updated = last_updated + {_TICKS} * :interval
+    WHERE id > :lo AND id <= :hi
+      AND last_updated IS NOT NULL
+      AND last_updated <= :now - :interval
+""")
+
+
+def decay_once(now=None, chunk_size=CHUNK_SIZE):
+    """Materialize elapsed decay for every pet with set-based UPDATEs.
+
+    Reads already compute decay lazily (Pet.to_dict), so this is only needed
+    when something queries the raw columns, e.g. a leaderboard sorted by level.
+    Rows are updated in id-range chunks with one commit per chunk.
+    """
+    now = time.time() if now is None else now
     with app.app_context():
-        pets = Pet.query.all()
-        for p in pets:
-            p.food = max(p.food - 1, 0)
-            p.water = max(p.water - 1, 0)
-            p.fun = max(p.fun - 1, 0)
-            p.xp += 1
-            if p.xp >= 25:
-                p.level += p.xp // 25
-                p.xp %= 25
+        # Rows from before last_updated existed start decaying from now.
+        db.session.execute(text("UPDATE pet SET last_updated = :now WHERE last_updated IS NULL"), {"now": now})
         db.session.commit()
 
+        lo, hi = db.session.execute(text("SELECT MIN(id), MAX(id) FROM pet")).one()
+        if lo is None:
+            return 0
 
-def run_decay_loop():
+        updated = 0
+        params = {
+            "now": now,
+            "interval": float(PET_DECAY_INTERVAL),
+            "decay": PET_STAT_DECAY,
+            "xp_tick": PET_XP_PER_TICK,
+            "xp_per_level": PET_XP_PER_LEVEL,
+        }
+        for start in range(lo - 1, hi, chunk_size):
+            result = db.session.execute(_DECAY_SQL, {**params, "lo": start, "hi": start + chunk_size})
+            db.session.commit()
+            updated += result.rowcount
+        return updated
+
+
+def run_decay_loop(interval=PET_DECAY_INTERVAL):
+    """Optional: periodically materialize decay. The API does not need it."""
     while True:
         decay_once()
-        time.sleep(60)
+        time.sleep(interval)
 
 
 if __name__ == '__main__':
-    run_decay_loop()
+    with app.app_context():
+        db.create_all()
+        add_missing_columns()
+    if "--once" in sys.argv:
+        decay_once()
+    else:
+        run_decay_loop()
@@ -1,21 +1,27 @@
 import os
+import time
+import logging
 import pandas as pd
 from datetime import datetime
-from core_utils import get_cached_race, is_race_cached, get_all_cached_drivers
+from core_utils import get_cached_race, is_race_cached, get_all_cached_drivers, bump_data_version
+from log_utils import get_logger, log_sampled, pipeline_run, stage, count
 from model import User, UserRaceResult, RosteredDrivers
+from scoring import score_frame, boost_bonus
+from concurrency import SingleFlight
+from driver_registry import get_registry, driver_ids
+from driver_rating import DriverRating
+
+log = get_logger("points")
 CACHE_DIR = "/mnt/f1_cache"
 
-def calculate_points_from_df(df):
-    df['positions_gained'] = df['Quali'] - df['Race']
-    df['positions_gained'] = df['positions_gained'].apply(lambda x: max(0, x))
-    df['points_from_race'] = 21 - df['Race']
-    df['points_from_gain'] = df['positions_gained'] * 2
-    df['points_from_quali'] = (21 - df['Quali']) * 3
-    df['Total Points'] = df['points_from_race'] + df['points_from_gain'] + df['points_from_quali']
-    df['Q/R/+O'] = df.apply(
-        lambda row: f"{row['points_from_quali']}/{row['points_from_race']}/{row['points_from_gain']}", axis=1
-    )
-    return df[['Driver', 'Quali', 'Race', '+Pos', 'Q/R/+O', 'Total Points']]
+_rating_flight = SingleFlight()
+RATING_SEASON = 2025
+SETTLE_CHUNK_SIZE = int(os.environ.get("F1_SETTLE_CHUNK", "500"))   # users per settlement commit
+
+def calculate_points_from_df(df, rules=None):
+    df = score_frame(df, rules)
+    return df[['Driver', 'Quali', 'Race', '+Pos', 'points_from_quali', 'points_from_race', 'points_from_gain',
+               'Total Points']]
 
 def clean_gp_name(gp_name):
     if gp_name.endswith("Grand Prix Grand Prix"):
@@ -25,153 +31,365 @@ def clean_gp_name(gp_name):
     return gp_name
 
 
-def apply_boosts(df, race_name, year):
-    from app import db
-    from model import RosteredDrivers, UserRaceResult, User
-    from points_utils import generate_driver_rating
-    from sqlalchemy.orm.attributes import flag_modified
+def apply_boosts(df, race_name, year, force=False, chunk_size=None):
+    """Settle one race for every user. Returns True if this call finished it.
+
+    Users are settled in keyset-paginated chunks (by user id), one commit per
+    chunk. Each user's results, roster updates, standings points and a
+    UserSettlement checkpoint commit together, so a crash loses at most the
+    chunk in flight and a rerun resumes after the last committed user.
+
+    A race whose RaceSettlement is done is skipped unless force=True. Forcing
+    first reverses the race's recorded results (results deleted, standings
+    points, races_owned and boost bonuses taken back) and then settles the
+    same users again with the teams and boosts they were settled with, e.g.
+    after the race data was corrected. A forced run resumes like any other.
+    """
+    from model import db, User, RaceSettlement, UserSettlement
+
+    chunk_size = chunk_size or SETTLE_CHUNK_SIZE
+    marker = RaceSettlement.query.filter_by(year=year, race=race_name).first()
+    if marker and marker.done and not force:
+        log.info("⏭️ %s - %s already settled, skipping boosts.", year, race_name)
+        return False
+    if marker and not marker.done and force:
+        log.warning("⚠️ %s - %s is still being settled; rerun without force to finish it first.",
+                    year, race_name)
+        return False
+
+    if marker is None:
+        marker = RaceSettlement(year=year, race=race_name, status="running", settled_at=time.time(), users=0,
+                                last_user_id=0, replay=False,
+                                users_total=db.session.query(db.func.count(User.id)).scalar())
+        db.session.add(marker)
+        try:
+            db.session.commit()
+        except Exception as e:
+            # Another worker created the marker first; it owns this run.
+            db.session.rollback()
+            log.warning("⚠️ %s - %s settlement already started elsewhere: %s", year, race_name, e)
+            return False
+        log.info("🔧 Starting boost application for %s - %s (%d users)", year, race_name, marker.users_total)
+    elif force:
+        if not _unsettle_race(marker):
+            return False
+    else:
+        log.info("🔁 Resuming %s - %s after user %s (%d/%d done)", year, race_name, marker.last_user_id,
+                 marker.users, marker.users_total)
+
+    # One row per driver id, so each roster entry is an integer lookup.
+    rows_by_id = df.assign(DriverId=driver_ids(df["Driver"])).drop_duplicates("DriverId").set_index("DriverId")
+    marker_id, cursor, replay = marker.id, marker.last_user_id or 0, bool(marker.replay)
+    # Re-settling an older race must not make it everybody's "last race".
+    mark_last = not replay or _is_latest_race(year, race_name)
+
+    with stage("settle"):
+        while True:
+            if replay:
+                pending = (
+                    UserSettlement.query
+                    .filter_by(year=year, race=race_name, done=False)
+                    .filter(UserSettlement.user_id > cursor)
+                    .order_by(UserSettlement.user_id).limit(chunk_size).all()
+                )
+                inputs = {row.user_id: row for row in pending}
+                users = User.query.filter(User.id.in_(list(inputs))).order_by(User.id).all() if inputs else []
+                next_cursor = pending[-1].user_id if pending else cursor
+            else:
+                inputs = None
+                users = User.query.filter(User.id > cursor).order_by(User.id).limit(chunk_size).all()
+                next_cursor = users[-1].id if users else cursor
+            if not users and (not replay or not inputs):
+                break
+            cursor = next_cursor
+            try:
+                settled = _settle_chunk(rows_by_id, users, race_name, year, inputs, mark_last)
+                marker = db.session.get(RaceSettlement, marker_id)
+                marker.users = (marker.users or 0) + settled
+                marker.last_user_id = cursor
+                db.session.commit()
+                done, total = marker.users, marker.users_total
+            except Exception as e:
+                log.error("❌ Settlement chunk up to user %s failed, rerun to resume: %s", cursor, e)
+                db.session.rollback()
+                return False
+            # Keep memory flat: nothing from a committed chunk stays in the session.
+            db.session.expunge_all()
+            count("settle.chunks")
+            log.info("📦 %s - %s: %d/%d users settled", year, race_name, done, total)
+
+        try:
+            from standings_utils import finish_race_standings
+            finish_race_standings(year, race_name, mark_last=mark_last)
+            marker = db.session.get(RaceSettlement, marker_id)
+            marker.status = "done"
+            marker.replay = False
+            marker.settled_at = time.time()
+            db.session.commit()
+        except Exception as e:
+            log.error("❌ Finishing %s - %s failed, rerun to resume: %s", year, race_name, e)
+            db.session.rollback()
+            return False
 
-    print("\n\n🔧 Starting boost application...")
+    log.info("🏁 Finished applying boosts.")
+    return True
 
-    users = User.query.all()
-    print(f"👥 Loaded {len(users)} users.")
 
-    for user in users:
-        print(f"\n📄 Processing user: {user.username} (ID: {user.id})")
+def _is_latest_race(year, race_name):
+    from model import Standing
+    latest = Standing.query.filter_by(year=year).filter(Standing.last_race.isnot(None), Standing.last_race != "")
+    return latest.first() is None or latest.filter_by(last_race=race_name).first() is not None
 
-        user_drivers = user.drivers.split(",") if user.drivers else []
-        print(f"  🚗 Rostered drivers: {user_drivers}")
 
-        user_boosts = {
-            b.split(":")[0]: b.split(":")[1]
-            for b in user.boosts.split(";") if ":" in b
+def _unsettle_race(marker):
+    """Reverse a settled race's recorded results and mark its users for replay (commits).
+
+    Deletes the race's UserRaceResult rows, takes their points out of the
+    standings, undoes races_owned / boost_points on rosters that still hold
+    the driver, and leaves one pending UserSettlement per settled user with
+    the team and boosts to settle again. Returns False if it failed.
+    """
+    from model import db, RosteredDrivers, UserRaceResult, UserSettlement
+    from standings_utils import remove_race_points
+
+    year, race_name = marker.year, marker.race
+    try:
+        results = UserRaceResult.query.filter_by(year=year, race=race_name).all()
+        checkpoints = {row.user_id: row for row in UserSettlement.query.filter_by(year=year, race=race_name)}
+
+        race_points, recorded = {}, {}
+        rosters = {
+            (r.user_id, r.driver_id): r for r in
+            RosteredDrivers.query.filter(RosteredDrivers.user_id.in_({r.user_id for r in results}))
         }
-        print(f"  🚀 Active boosts: {user_boosts}")
+        for result in results:
+            race_points[result.user_id] = race_points.get(result.user_id, 0) + (result.total_points or 0)
+            drivers, boosts = recorded.setdefault(result.user_id, ([], []))
+            drivers.append(result.driver)
+            if result.category:
+                boosts.append(f"{result.driver}:{result.category}")
+            roster = rosters.get((result.user_id, result.driver_id))
+            if roster is not None:
+                roster.races_owned = max((roster.races_owned or 0) - 1, 0)
+                roster.boost_points = (roster.boost_points or 0) - ((result.total_points or 0) - (result.base_points or 0))
+        # Users settled with a team but no scoring driver still had a (zero) race in the standings.
+        for user_id, row in checkpoints.items():
+            if row.drivers and user_id not in race_points:
+                race_points[user_id] = 0
+
+        remove_race_points(year, race_name, race_points)
+        UserRaceResult.query.filter_by(year=year, race=race_name).delete(synchronize_session=False)
+
+        now = time.time()
+        for user_id in set(checkpoints) | set(recorded):
+            row = checkpoints.get(user_id)
+            if row is None:
+                # Races settled before checkpoints existed: inputs come from the results.
+                row = UserSettlement(year=year, race=race_name, user_id=user_id, settled_at=now)
+                db.session.add(row)
+            if row.drivers is None and user_id in recorded:
+                drivers, boosts = recorded[user_id]
+                row.drivers, row.boosts = ",".join(drivers), ";".join(boosts)
+            row.done = False
+            row.points = 0
+
+        marker.status = "running"
+        marker.replay = True
+        marker.settled_at = now
+        marker.users = 0
+        marker.users_total = len(set(checkpoints) | set(recorded))
+        marker.last_user_id = 0
+        marker.rated_at = None
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.error("❌ Could not reverse %s - %s for re-settlement: %s", year, race_name, e)
+        return False
+    log.info("↩️ Reversed %d results of %s - %s; re-settling %d users", len(results), year, race_name,
+             marker.users_total)
+    return True
+
+
+def _parse_boosts(boosts):
+    return {b.split(":")[0]: b.split(":")[1] for b in boosts.split(";") if ":" in b} if boosts else {}
 
+
+def _settle_chunk(rows_by_id, users, race_name, year, inputs=None, mark_last=True):
+    """Settle one chunk of users (caller commits). Returns how many were settled.
+
+    inputs maps user id -> pending UserSettlement when replaying a forced
+    re-settlement: its recorded team and boosts are used instead of the
+    user's current ones, and the user's current boosts are left alone.
+    """
+    from model import db, RosteredDrivers, UserRaceResult, UserSettlement
+    from sqlalchemy.orm.attributes import flag_modified
+    from standings_utils import add_race_points
+
+    from core_utils import store_rules_version
+
+    debug = log.isEnabledFor(logging.DEBUG)
+    registry = get_registry()
+    rules = store_rules_version()
+    user_ids = [u.id for u in users]
+    done = {
+        user_id for (user_id,) in
+        db.session.query(UserSettlement.user_id)
+        .filter_by(year=year, race=race_name)
+        .filter(UserSettlement.user_id.in_(user_ids), UserSettlement.done.isnot(False))
+    }
+    rosters = {}
+    for entry in RosteredDrivers.query.filter(RosteredDrivers.user_id.in_(user_ids)):
+        rosters.setdefault(entry.user_id, {})[entry.driver_id] = entry
+
+    race_points = {}
+    settled = 0
+    now = time.time()
+    for user in users:
+        if user.id in done:
+            count("settle.skipped_users")
+            continue
+        checkpoint = inputs.get(user.id) if inputs is not None else None
+        team, boosts = (checkpoint.drivers, checkpoint.boosts) if checkpoint else (user.drivers, user.boosts)
+        user_drivers = team.split(",") if team else []
+        user_boosts = _parse_boosts(boosts)
+        if debug:
+            log_sampled(log, "settle.user", "📄 Processing user %s (ID: %s): drivers=%s boosts=%s",
+                        user.username, user.id, user_drivers, user_boosts)
+
+        points = 0
         for driver in user_drivers:
-            print(f"    🏁 Checking driver: {driver}")
-            row = df[df["Driver"] == driver]
-            if row.empty:
-                print(f"    ⚠️ No row found for driver {driver} in this race.")
+            driver_id = registry.id(driver)
+            if driver_id not in rows_by_id.index:
+                count("settle.missing_race_row")
+                log_sampled(log, "settle.no_row", "⚠️ No row found for driver %s in this race.", driver,
+                            level=logging.WARNING)
                 continue
 
-            user_driver = RosteredDrivers.query.filter_by(user_id=user.id, driver=driver).first()
-            if not user_driver:
-                print(f"    ⚠️ RosteredDrivers entry not found for {driver}")
+            row = rows_by_id.loc[[driver_id]]
+            user_driver = rosters.get(user.id, {}).get(driver_id)
+            if not user_driver and checkpoint is None:
+                count("settle.missing_roster")
+                log.warning("⚠️ RosteredDrivers entry not found for %s (user %s)", driver, user.id)
                 continue
 
             try:
                 base_points = float(row["Total Points"].iloc[0])
             except Exception as e:
-                print(f"    ❌ Failed to extract base points: {e}")
+                log.error("❌ Failed to extract base points for %s: %s", driver, e)
                 continue
 
-            print(f"    🎯 Base points for {driver}: {base_points}")
-
             boost_type = user_boosts.get(driver)
-            print(f"    💡 Boost type: {boost_type}")
             bonus = 0
 
             try:
-                if boost_type == "qualifying":
-                    bonus = (21 - int(row["Quali"].iloc[0])) * 3
-                elif boost_type == "race":
-                    bonus = (21 - int(row["Race"].iloc[0]))
-                elif boost_type == "pass":
-                    bonus = int(row["+Pos"].iloc[0]) * 2
+                bonus = float(boost_bonus(boost_type, row["Quali"].iloc[0], row["Race"].iloc[0], rules))
             except Exception as e:
-                print(f"    ❌ Failed to calculate bonus: {e}")
+                log.error("❌ Failed to calculate bonus for %s: %s", driver, e)
 
-            print(f"    ➕ Bonus points: {bonus}")
             total = base_points + bonus
-            boosted = bool(boost_type)
+            points += total
 
-            result = UserRaceResult(
+            db.session.add(UserRaceResult(
                 user_id=user.id,
                 driver=driver,
+                driver_id=driver_id,
                 year=year,
                 race=race_name,
                 base_points=base_points,
                 category=boost_type or "",
-                boosted=boosted,
+                boosted=bool(boost_type),
                 total_points=total,
-            )
-            print(f"    📄 Adding UserRaceResult row...")
-            db.session.add(result)
+            ))
+            count("settle.results")
 
-            print(f"    🛠️ Updating RosteredDrivers record...")
+            # A replayed user may have sold the driver since; their points still count.
+            if not user_driver:
+                continue
             user_driver.races_owned += 1
-            print(f"    📈 Races Owned now: {user_driver.races_owned}")
             user_driver.boost_points += bonus
-            print(f"    📊 Boost Points now: {user_driver.boost_points}")
-
             try:
-                _, _, current_value, _ = generate_driver_rating(driver)
-                user_driver.current_value = current_value
-                print(f"    💸 Updated current value: {current_value}")
+                user_driver.current_value = generate_driver_rating(driver).fantasy_value
             except Exception as e:
-                print(f"    ⚠️ Failed to update value for {driver}: {e}")
-
+                log.warning("⚠️ Failed to update value for %s: %s", driver, e)
             flag_modified(user_driver, "boost_points")
-            db.session.add(user_driver)
-            db.session.flush()
-            print(f"    📤 Flushed boost points to DB: {user_driver.boost_points} for {user.username} - {driver}")
+            if debug:
+                log_sampled(log, "settle.driver",
+                            "🏁 %s - %s: base=%s bonus=%s (%s) races_owned=%s boost_points=%s value=%s",
+                            user.username, driver, base_points, bonus, boost_type, user_driver.races_owned,
+                            user_driver.boost_points, user_driver.current_value)
+
+        if user_drivers:
+            race_points[user.id] = points
+        if checkpoint is None:
+            user.boosts = ""
+            db.session.add(UserSettlement(year=year, race=race_name, user_id=user.id, points=points,
+                                          settled_at=now, drivers=team or "", boosts=boosts or "", done=True))
+        else:
+            checkpoint.points, checkpoint.settled_at, checkpoint.done = points, now, True
+        settled += 1
+
+    add_race_points(year, race_name, race_points, mark_last=mark_last)
+    count("settle.users", settled)
+    return settled
 
-            # Post-commit test will go below
 
-        user.boosts = ""
-        db.session.add(user)
+def process_latest_race_and_apply_boosts():
+    with pipeline_run("update_latest_race"):
+        return _process_latest_race_and_apply_boosts()
 
-    try:
-        print("\n💾 Committing to database...")
-        db.session.commit()
-        print("✅ Commit successful.")
-
-        # Check all users for latest boost points
-        for user in users:
-            for driver in user.drivers.split(",") if user.drivers else []:
-                check_driver = RosteredDrivers.query.filter_by(user_id=user.id, driver=driver).first()
-                if check_driver:
-                    print(f"🔁 Post-commit DB check: {check_driver.driver} for {user.username} - boost points: {check_driver.boost_points}")
-    except Exception as e:
-        print(f"❌ Commit failed: {e}")
-        db.session.rollback()
 
-    print("🏁 Finished applying boosts.")
-    return "✅ Boosts applied and driver stats updated"
+def _process_latest_race_and_apply_boosts():
+    from core_utils import get_most_recent_race_by_event_date
 
+    log.info("📞 Processing latest race and applying boosts")
 
+    with stage("ingest"):
+        last_race_info = get_most_recent_race_by_event_date()
+        if not last_race_info:
+            log.warning("⚠️ No races with EventDate found in cache.")
+            return False, "⚠️ No races with EventDate found in cache."
 
+        year = int(last_race_info["year"])
+        gp_name = clean_gp_name(last_race_info["gp_name"])
 
+        if not is_race_cached(year, gp_name):
+            log.warning("❌ Race not cached: %s - %s", year, gp_name)
+            return False, f"❌ Race not cached: {year} - {gp_name}"
 
-def process_latest_race_and_apply_boosts():
-    print("📞 ENTERED process_latest_race_and_apply_boosts()")
-    from core_utils import get_most_recent_race_by_event_date
-    from fastf1 import get_event_schedule
+        df = get_cached_race(year, gp_name)
+        if df.empty:
+            log.warning("❌ Empty data for %s", gp_name)
+            return False, f"❌ Empty data for {gp_name}"
 
-    print("starting process latest")
+    return _settle_race(df, year, gp_name)
 
-    last_race_info = get_most_recent_race_by_event_date()
-    if not last_race_info:
-        print("Failed on:  if not last_race_info" )
-        return False, "⚠️ No races with EventDate found in cache."
 
-    year = int(last_race_info["year"])
-    gp_name = clean_gp_name(last_race_info["gp_name"])
+def settle_race(year, gp_name, force=False):
+    """Settle boosts for one cached race, then regenerate ratings, once per race."""
+    with pipeline_run("settle_race"):
+        df = get_cached_race(year, gp_name)
+        if df.empty:
+            return False, f"❌ Race not cached: {year} - {gp_name}"
+        return _settle_race(df, year, gp_name, force)
 
-    if not is_race_cached(year, gp_name):
-        print("Failed on:  if not if not is_race_cached" )
-        return False, f"❌ Race not cached: {year} - {gp_name}"
 
-    df = get_cached_race(year, gp_name)
-    if df.empty:
-        print("Failed on: if df.empty" )
-        return False, f"❌ Empty data for {gp_name}"
+def _settle_race(df, year, gp_name, force=False):
+    from model import db, RaceSettlement
 
-    apply_boosts(df, gp_name, year)
+    apply_boosts(df, gp_name, year, force=force)
+    marker = RaceSettlement.query.filter_by(year=year, race=gp_name).first()
+    if marker is None:
+        return False, f"❌ Settlement failed for {gp_name}"
+    if not marker.done:
+        return False, (f"⚠️ Settlement of {gp_name} incomplete ({marker.users or 0}/{marker.users_total or 0} users), "
+                       f"rerun to resume")
+    if marker.rated_at is not None:
+        return True, f"⏭️ {gp_name} was already settled"
 
     # Regenerate driver ratings and leaderboard to reflect boosts and race impact
     generate_all_driver_ratings()
+    marker.rated_at = time.time()
+    db.session.commit()
 
     return True, f"✅ Boosts applied and stats updated for {gp_name}"
 
@@ -184,7 +402,7 @@ def process_single_race_and_apply_boosts(driver_code, year, gp_name):
     points = df[df["Driver"] == driver_code]["Total Points"].values[0]
 
     # Apply boosts
-    rostered = RosteredDrivers.query.filter_by(driver=driver_code).all()
+    rostered = RosteredDrivers.query.filter_by(driver_id=get_registry().id(driver_code)).all()
     for r in rostered:
         user = User.query.get(r.user_id)
         if user and user.boosts:
@@ -198,228 +416,241 @@ def process_single_race_and_apply_boosts(driver_code, year, gp_name):
     return points
 
 
+# (career, seasonal, last 3) weights on Total Points averages; backtest.py evaluates alternatives.
+VALUE_WEIGHTS = (0.05, 0.85, 0.1)
+HYPE_WEIGHTS = (0.1, 0.7, 0.2)
+VALUE_SCALE = 250000   # $ per weighted point
+
+
 def calculate_fantasy_value(career_avg, season_avg, last3_avg):
     if career_avg is None or season_avg is None or last3_avg is None:
         return None
-    return round((career_avg * 0.05 + season_avg * 0.85 + last3_avg * 0.1) * 250000)
-
-def generate_driver_rating(driver):
-    print(f"\n🔍 Generating driver rating for: {driver}")
-    all_dfs = []
-    for year in range(2021, 2026):
-        from fastf1 import get_event_schedule
-        try:
-            schedule = get_event_schedule(year)
-            schedule = schedule[schedule["EventDate"] < pd.Timestamp.now()]
-            for _, row in schedule.iterrows():
-                gp_name = clean_gp_name(row["EventName"])
-                if is_race_cached(year, gp_name):
-                    df = get_cached_race(year, gp_name)
-                    if not df.empty and driver in df["Driver"].values:
-                        row_df = df[df["Driver"] == driver].copy()
-                        row_df["Year"] = year
-                        row_df["Grand Prix"] = gp_name
-                        row_df["EventDate"] = row["EventDate"]
-                        all_dfs.append(row_df)
-        except Exception as e:
-            print(f"❌ Failed {year}: {e}")
-    if not all_dfs:
-        print("⚠️ No race data found.")
-        return pd.DataFrame(), None, None, None
-    full_df = pd.concat(all_dfs).sort_values("EventDate", ascending=True)
-    full_df["Scope"] = None
-
-    df_2025 = full_df[(full_df["Year"] == 2025) & (full_df["Scope"].isna())]
-    df_2025 = df_2025.sort_values("EventDate", ascending=True)
-    last_3 = df_2025.tail(3)
-    prev_3 = df_2025.iloc[-4:-1] if len(df_2025) >= 4 else last_3
-
-    seasonal_avg = df_2025["Total Points"].mean()
-    career_avg = full_df["Total Points"].mean()
-    last_3_avg = last_3["Total Points"].mean()
-    prev_3_avg = prev_3["Total Points"].mean()
-
-    weighted_total = round(career_avg * 0.1 + seasonal_avg * 0.7 + last_3_avg * 0.2, 2)
-    previous_weighted = round(career_avg * 0.1 + seasonal_avg * 0.7 + prev_3_avg * 0.2, 2)
-    fantasy_value = calculate_fantasy_value(career_avg,seasonal_avg,last_3_avg)
-
-    scope_rows = []
-    if not last_3.empty:
-        row = last_3.mean(numeric_only=True)
-        row["Scope"] = "Last 3 Races Avg"
-        row["Driver"] = driver
-        scope_rows.append(row)
-    if not prev_3.empty:
-        row = prev_3.mean(numeric_only=True)
-        row["Scope"] = "Prev 3 Races Avg"
-        row["Driver"] = driver
-        scope_rows.append(row)
-    if not df_2025.empty:
-        row = df_2025.mean(numeric_only=True)
-        row["Scope"] = "Seasonal Average"
-        row["Driver"] = driver
-        scope_rows.append(row)
-
-    if scope_rows:
-        full_df = pd.concat([full_df, pd.DataFrame(scope_rows)], ignore_index=True)
-    return full_df, weighted_total, fantasy_value, previous_weighted
-
+    wc, ws, wl = VALUE_WEIGHTS
+    return round((career_avg * wc + season_avg * ws + last3_avg * wl) * VALUE_SCALE)
 
-def generate_all_driver_ratings():
-    drivers = get_all_cached_drivers()
-    all_driver_dfs = []
-    rating_summary = []
-
-    for driver in drivers:
-        try:
-            df, weighted_total, fantasy_value, previous_weighted = generate_driver_rating(driver)
-            if df.empty:
-                print(f"⚠️ Skipping {driver}: empty data.")
-                continue
-
-            df = df.copy()
-
-            if "Year" not in df.columns or "EventDate" not in df.columns:
-                print(f"❌ Skipping {driver}: 'Year' or 'EventDate' column missing.")
-                continue
-
-            # Ensure 'Scope' column exists to avoid KeyError
-            if "Scope" not in df.columns:
-                df["Scope"] = None
-
-            # Only use real races (exclude scoped rows)
-            df_2025 = df[(df["Year"] == 2025) & (df["Scope"].isna())]
-            df_2025 = df_2025.sort_values("EventDate", ascending=True)
-            print(f"{driver}: {len(df_2025)} races in 2025")
-
-            if df_2025.empty:
-                continue
 
-            # Add scope rows
-            scope_rows = []
+def rating_values(career, seasonal, last_3, prev_3):
+    """(weighted total, fantasy value, previous weighted) from Total Points averages."""
+    if None in (career, seasonal, last_3):
+        return None, None, None
+    wc, ws, wl = HYPE_WEIGHTS
+    weighted_total = round(career * wc + seasonal * ws + last_3 * wl, 2)
+    previous_weighted = round(career * wc + seasonal * ws + prev_3 * wl, 2) if prev_3 is not None else None
+    return weighted_total, calculate_fantasy_value(career, seasonal, last_3), previous_weighted
 
-            df_2025_real = df[(df["Year"] == 2025) & (df["Scope"].isna())].sort_values("EventDate", ascending=True)
 
-            last_3 = df_2025_real.tail(3)
-            prev_3 = df_2025_real.iloc[-4:-1]
+_ratings = {"version": None, "by_driver": {}}
 
 
-            if not last_3.empty:
-                row = last_3.mean(numeric_only=True)
-                row["Scope"] = "Last 3 Races Avg"
-                row["Driver"] = driver
-                row["Year"] = 2025
-                scope_rows.append(row)
-
-            if not prev_3.empty:
-                row = prev_3.mean(numeric_only=True)
-                row["Scope"] = "Prev 3 Races Avg"
-                row["Driver"] = driver
-                row["Year"] = 2025
-                scope_rows.append(row)
+def generate_driver_rating(driver):
+    """DriverRating for one driver (races, Scope aggregates, weighted total, value).
+
+    Memoized per data version; concurrent misses for the same driver share one
+    computation. The returned record is shared, so callers must not modify it.
+    """
+    from core_utils import get_data_version
+    version = get_data_version()
+    if _ratings["version"] != version:
+        _ratings.update(version=version, by_driver={})
+    rating = _ratings["by_driver"].get(driver)
+    if rating is None:
+        rating = _rating_flight.do((driver, version), lambda: _generate_driver_rating(driver))
+        _ratings["by_driver"][driver] = rating
+    return rating
+
+
+def _generate_driver_rating(driver):
+    log_sampled(log, "rate.driver", "🔍 Generating driver rating for: %s", driver)
+    # Read from the shared score cube rather than walking FastF1 schedules,
+    # so ratings can be rebuilt offline (e.g. after a rescore).
+    from score_cube import get_cube
+
+    races = get_cube().driver_rows(driver)
+    if not races.empty:
+        races = races[races["Year"].between(2021, RATING_SEASON) & (races["EventDate"] < pd.Timestamp.now())]
+    if races.empty:
+        log.warning("⚠️ No race data found for %s.", driver)
+        return DriverRating.empty_for(driver, RATING_SEASON)
+    rating = DriverRating.from_races(driver, RATING_SEASON, races.sort_values("EventDate"))
+    rating.weighted_total, rating.fantasy_value, rating.previous_weighted = rating_values(
+        rating.points("career"), rating.points("seasonal"), rating.points("last_3"), rating.points("prev_3"))
+    return rating
 
-            real_races = df[df["Scope"].isna()].sort_values("EventDate", ascending=True)
-            career_avg = real_races["Total Points"].mean() if not real_races.empty else None
 
-            if career_avg is not None:
-                row = real_races.mean(numeric_only=True)
-                row["Scope"] = "Career Average"
-                row["Driver"] = driver
-                row["Year"] = real_races["Year"].max()  # or use row["Year"] = real_races["Year"].max() if needed
-                scope_rows.append(row)
+def generate_all_driver_ratings():
+    with pipeline_run("ratings"):
+        drivers = get_all_cached_drivers()
+        with stage("rate", items=len(drivers)):
+            rating_summary, season_races = _rate_drivers(drivers)
+        with stage("summarize"):
+            _save_rating_summaries(rating_summary, season_races)
 
 
-            season_row = df_2025.mean(numeric_only=True)
-            season_row["Scope"] = "Seasonal Average"
-            season_row["Driver"] = driver
-            season_row["Year"] = 2025
-            scope_rows.append(season_row)
+def _rate_drivers(drivers):
+    season_races = []
+    rating_summary = []
 
-            if scope_rows:
-                df = pd.concat([df, pd.DataFrame(scope_rows)], ignore_index=True)
+    for driver in drivers:
+        try:
+            rating = generate_driver_rating(driver)
+            if rating.empty:
+                log.warning("⚠️ Skipping %s: empty data.", driver)
+                continue
+            log.debug("%s: %d races in %s", driver, rating.season_races(), RATING_SEASON)
+            if not rating.season_races():
+                continue
 
-            # Save enriched CSV for this driver
+            # Save enriched CSV for this driver (legacy race + Scope row format)
+            df = rating.to_frame()
             df.to_csv(os.path.join(CACHE_DIR, f"Driver Rating - {driver}.csv"), index=False)
 
             # Build summary row if valid
-            if all(pd.notna([weighted_total, fantasy_value, previous_weighted])):
+            if all(pd.notna([rating.weighted_total, rating.fantasy_value, rating.previous_weighted])):
                 rating_summary.append({
                     "Driver": driver,
-                    "Weighted Total": weighted_total,
-                    "Fantasy Value": fantasy_value,
-                    "Previous Weighted": previous_weighted
+                    "Weighted Total": rating.weighted_total,
+                    "Fantasy Value": rating.fantasy_value,
+                    "Previous Weighted": rating.previous_weighted
                 })
             else:
-                print(f"⚠️ Skipping summary for {driver}: NaN in stats.")
+                log.warning("⚠️ Skipping summary for %s: NaN in stats.", driver)
 
-            # For leaderboard CSV (includes scoped rows)
-            all_driver_dfs.append(df[df["Year"] == 2025].copy())
+            season_races.append(df[df["Scope"].isna() & (df["Year"] == RATING_SEASON)])
 
-            print(f"✅ Generated: {driver}")
+            count("ratings.generated")
+            log.debug("✅ Generated: %s", driver)
 
         except Exception as e:
-            print(f"❌ Failed: {driver}: {e}")
+            count("ratings.failed")
+            log.error("❌ Failed: %s: %s", driver, e)
+
+    log.info("✅ Generated ratings for %d/%d drivers.", len(rating_summary), len(drivers))
+    return rating_summary, season_races
 
+
+def _save_rating_summaries(rating_summary, season_races):
     # Save quick lookup table for homepage driver stats
     summary_path = os.path.join(CACHE_DIR, "driver_rating_summary.csv")
     if rating_summary:
         summary_df = pd.DataFrame(rating_summary)
         summary_df = summary_df.sort_values("Weighted Total", ascending=False)
         summary_df.to_csv(summary_path, index=False)
-        print(f"📊 Saved driver_rating_summary.csv with {len(summary_df)} entries.")
+        log.info("📊 Saved driver_rating_summary.csv with %d entries.", len(summary_df))
     else:
-        print("❌ No summary entries generated. Check why df_2025 or values were empty.")
+        log.error("❌ No summary entries generated. Check why df_2025 or values were empty.")
 
-    # Save per-driver 2025 average stats
-    if all_driver_dfs:
-        combined = pd.concat(all_driver_dfs)
+    # Save per-driver season average stats
+    if season_races:
+        combined = pd.concat(season_races)
         combined = combined.drop_duplicates(subset=["Driver", "Grand Prix"])
         avg_df = combined.groupby("Driver")[["Quali", "Race", "+Pos", "Total Points"]].mean().round(2).reset_index()
         avg_df = avg_df.sort_values("Total Points", ascending=False)
-        avg_df.to_csv(os.path.join(CACHE_DIR, "averages_2025.csv"), index=False)
-        print("📊 Saved averages_2025.csv")
-
-
+        avg_df.to_csv(os.path.join(CACHE_DIR, f"averages_{RATING_SEASON}.csv"), index=False)
+        log.info("📊 Saved averages_%s.csv", RATING_SEASON)
 
+    bump_data_version()
 
 
 def regenerate_driver_rating_summary():
-    files = [f for f in os.listdir(CACHE_DIR) if f.startswith("Driver Rating - ")]
     rows = []
-    for file in files:
-        path = os.path.join(CACHE_DIR, file)
-        try:
-            df = pd.read_csv(path)
-            driver = df["Driver"].dropna().iloc[0]
-            df["Scope"] = df.get("Scope", None)
-            real_races = df[df["Scope"].isna()].sort_values("EventDate", ascending=True)
-            if real_races.empty:
-                continue
-            seasonal_row = df[df["Scope"] == "Seasonal Average"]
-            last3_row = df[df["Scope"] == "Last 3 Races Avg"]
-            prev3_row = df[df["Scope"] == "Prev 3 Races Avg"]
-
-            avg = seasonal_row["Total Points"].values[0] if not seasonal_row.empty else real_races["Total Points"].mean()
-            career = real_races["Total Points"].mean()
-            last3 = last3_row["Total Points"].values[0] if not last3_row.empty else avg
-            prev3 = prev3_row["Total Points"].values[0] if not prev3_row.empty else last3
-
-            weighted_total = round(career * 0.1 + avg * 0.7 + last3 * 0.2, 2)
-            previous_weighted = round(career * 0.1 + avg * 0.7 + prev3 * 0.2, 2)
-            fantasy_value = calculate_fantasy_value(career_avg,seasonal_avg,last_3_avg)
-
-            rows.append({
-                "Driver": driver,
-                "Weighted Total": weighted_total,
-                "Fantasy Value": fantasy_value,
-                "Previous Weighted": previous_weighted
-            })
-        except Exception as e:
-            print(f"❌ Failed to parse {file}: {e}")
+    for driver, rating in load_driver_ratings().items():
+        if rating.empty:
+            continue
+        seasonal = rating.points("seasonal")
+        seasonal = rating.points("career") if seasonal is None else seasonal
+        last_3 = rating.points("last_3")
+        last_3 = seasonal if last_3 is None else last_3
+        prev_3 = rating.points("prev_3")
+        prev_3 = last_3 if prev_3 is None else prev_3
+        weighted_total, fantasy_value, previous_weighted = rating_values(rating.points("career"), seasonal, last_3, prev_3)
+        rows.append({
+            "Driver": driver,
+            "Weighted Total": weighted_total,
+            "Fantasy Value": fantasy_value,
+            "Previous Weighted": previous_weighted
+        })
     if rows:
         summary_df = pd.DataFrame(rows)
         summary_df = summary_df.sort_values("Weighted Total", ascending=False)
         summary_df.to_csv(os.path.join(CACHE_DIR, "driver_rating_summary.csv"), index=False)
-        print("✅ Rebuilt driver_rating_summary.csv")
+        bump_data_version()
+        log.info("✅ Rebuilt driver_rating_summary.csv")
     else:
-        print("⚠️ No rows to write.")
+        log.warning("⚠️ No rows to write.")
+
+
+_saved_ratings = {"version": None, "by_driver": None}
+
+
+def load_driver_ratings():
+    """{driver: DriverRating} from the saved "Driver Rating - X.csv" files.
+
+    Memoized per data version; these are the precomputed ratings the home
+    page and top-driver widgets read. Career is the mean of the stored races
+    when a file has no Career Average row.
+    """
+    from core_utils import get_data_version
+
+    version = get_data_version()
+    if _saved_ratings["version"] == version and _saved_ratings["by_driver"] is not None:
+        return _saved_ratings["by_driver"]
+
+    by_driver = {}
+    for file in os.listdir(CACHE_DIR):
+        if not (file.startswith("Driver Rating - ") and file.endswith(".csv")):
+            continue
+        try:
+            rating = DriverRating.from_frame(pd.read_csv(os.path.join(CACHE_DIR, file)), RATING_SEASON)
+        except Exception as e:
+            log.error("❌ Failed to parse %s: %s", file, e)
+            continue
+        if rating.driver:
+            by_driver[rating.driver] = rating
+    _saved_ratings.update(version=version, by_driver=by_driver)
+    return by_driver
+
+
+def last_3_points():
+    """{driver: last-3-race average} for the drivers in the latest cached race."""
+    ratings = load_driver_ratings()
+    points = {}
+    for driver in get_all_cached_drivers():
+        rating = ratings.get(driver)
+        value = rating.points("last_3") if rating else None
+        if value is not None and pd.notna(value):
+            points[driver] = value
+    return points
+
+
+def top_driver():
+    """(driver, last-3 average) of the current form leader, or (None, None)."""
+    points = last_3_points()
+    if not points:
+        return None, None
+    driver = max(points, key=points.get)
+    return driver, points[driver]
+
+
+_price_table = {"version": None, "df": None}
+
+
+def get_price_table():
+    """driver_rating_summary.csv indexed by driver, memoized per data version.
+
+    This is the cached source for prices (Fantasy Value) and hype (Weighted
+    Total); it is rewritten by generate_all_driver_ratings after each race.
+    """
+    from core_utils import get_data_version
+
+    version = get_data_version()
+    if _price_table["version"] == version and _price_table["df"] is not None:
+        return _price_table["df"]
+
+    path = os.path.join(CACHE_DIR, "driver_rating_summary.csv")
+    try:
+        df = pd.read_csv(path).set_index("Driver")
+    except Exception as e:
+        log.warning("⚠️ No price table available: %s", e)
+        df = pd.DataFrame(columns=["Weighted Total", "Fantasy Value", "Previous Weighted"])
+    _price_table.update(version=version, df=df)
+    return df
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+from core_utils import get_all_cached_drivers, get_data_version
+from log_utils import get_logger, stage
+from scoring import compile_kernel, BOOST_COMPONENTS
+
+log = get_logger("projection")
+
+N_SIMULATIONS = 20000
+HISTORY_WINDOW = 24      # most recent races per driver that feed the distribution
+RECENCY_HALF_LIFE = 8    # races; a result this many races back counts half as much
+PERCENTILES = (10, 25, 50, 75, 90)
+BOOST_CATEGORIES = tuple(BOOST_COMPONENTS)
+
+_cache = {"version": None, "df": None}
+
+
+def _history_matrix(cube, drivers):
+    """Each driver's last HISTORY_WINDOW (quali, race) pairs as D x W arrays, read from the cube.
+
+    Column 0 is the most recent race. Missing slots are NaN with zero weight.
+    """
+    recent, counts = cube.recent(drivers, HISTORY_WINDOW, ("quali", "race"))
+    return recent["quali"], recent["race"], counts
+
+
+def simulate(cube, drivers, n_sims=N_SIMULATIONS, seed=None):
+    """Sample next-race results for every driver at once.
+
+    Each simulation draws one historical race per driver (recency-weighted),
+    keeping quali and race positions paired, and scores it. Returns arrays of
+    shape (drivers, n_sims) for total points and each boost component.
+    """
+    quali, race, counts = _history_matrix(cube, drivers)
+
+    ages = np.arange(HISTORY_WINDOW)
+    weights = np.where(ages[None, :] < counts[:, None], 0.5 ** (ages / RECENCY_HALF_LIFE), 0.0)
+    totals = weights.sum(axis=1, keepdims=True)
+    cum = np.cumsum(np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0), axis=1)
+
+    rng = np.random.default_rng(seed)
+    u = rng.random((len(drivers), n_sims))
+    # Inverse-CDF sampling for all drivers and simulations in one comparison.
+    idx = (u[:, :, None] >= cum[:, None, :]).sum(axis=2)
+    idx = np.minimum(idx, np.maximum(counts - 1, 0)[:, None])
+
+    q = np.take_along_axis(quali, idx, axis=1)
+    r = np.take_along_axis(race, idx, axis=1)
+    scores = compile_kernel()(q, r)
+    return {
+        "total": scores["Total Points"],
+        **{category: scores[column] for category, column in BOOST_COMPONENTS.items()},
+        "counts": counts,
+    }
+
+
+def build_projections(n_sims=N_SIMULATIONS, seed=None):
+    """Expected points, percentiles and boost EV for every current driver."""
+    from score_cube import get_cube
+
+    cube = get_cube()
+    drivers = get_all_cached_drivers()
+    if not cube.mask.any() or not drivers:
+        return pd.DataFrame()
+
+    with stage("score", items=len(drivers)):
+        sims = simulate(cube, list(drivers), n_sims=n_sims, seed=seed)
+
+    total = sims["total"]
+    valid = sims["counts"] > 0
+    pct = np.percentile(total, PERCENTILES, axis=1)
+    df = pd.DataFrame({
+        "Driver": drivers,
+        "Races Sampled": sims["counts"],
+        "Expected Points": total.mean(axis=1),
+        "Std Dev": total.std(axis=1),
+        **{f"P{p}": pct[i] for i, p in enumerate(PERCENTILES)},
+        **{f"EV {c.title()} Boost": sims[c].mean(axis=1) for c in BOOST_CATEGORIES},
+    })
+    ev = np.stack([sims[c].mean(axis=1) for c in BOOST_CATEGORIES], axis=1)
+    df["Best Boost"] = [BOOST_CATEGORIES[i] for i in ev.argmax(axis=1)]
+    df = df[valid].round(2).sort_values("Expected Points", ascending=False, ignore_index=True)
+    return df
+
+
+def get_projections():
+    """Projections for the current data version, recomputed when data changes."""
+    version = get_data_version()
+    if _cache["version"] != version or _cache["df"] is None:
+        # Seeded by version so a page reload shows the same numbers.
+        _cache.update(version=version, df=build_projections(seed=version % (2 ** 32)))
+        log.info("🎲 Rebuilt projections for %d drivers (version %s)", len(_cache["df"]), version)
+    return _cache["df"]
+
+
+def get_driver_projection(driver):
+    df = get_projections()
+    if df.empty:
+        return None
+    row = df[df["Driver"] == driver]
+    return row.iloc[0].to_dict() if not row.empty else None
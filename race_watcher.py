@@ -0,0 +1,173 @@
+import os
+import shutil
+import threading
+import pandas as pd
+from core_utils import race_calendar, utc_now, fetch_and_cache_race, is_race_cached
+from archive_utils import RACE_SESSIONS, archive_path
+from log_utils import get_logger
+
+log = get_logger("watcher")
+
+POLL_DELAY = pd.Timedelta(hours=2)        # race length plus margin before the first poll
+GIVE_UP_AFTER = pd.Timedelta(days=3)      # stop polling a race this long after its start
+INITIAL_BACKOFF = 5 * 60                  # seconds; doubles after every unpublished poll
+MAX_BACKOFF = 60 * 60
+IDLE_SLEEP = 15 * 60                      # longest the loop sleeps between calendar checks
+
+
+class FastF1Source:
+    """Production results source: loads sessions from FastF1 (and archives them)."""
+
+    name = "fastf1"
+
+    def fetch(self, year, gp_name):
+        return fetch_and_cache_race(year, gp_name, refresh=True)
+
+
+class LocalSource:
+    """Stand-in source that publishes results from a local directory.
+
+    The directory is laid out like the results archive
+    (<year>/<event>/<session>.csv.gz); a race counts as published once its
+    qualifying and race files are there.
+    """
+
+    name = "local"
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, year, gp_name):
+        files = [os.path.join(self.directory, str(year), gp_name, f"{s}.csv.gz") for s in RACE_SESSIONS]
+        if not all(os.path.exists(f) for f in files):
+            return False
+        for session_name, path in zip(RACE_SESSIONS, files):
+            target = archive_path(year, gp_name, session_name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(path, target)
+        return fetch_and_cache_race(year, gp_name)
+
+
+def get_results_source(spec=None):
+    """"fastf1" (default) or "local:<directory>", from F1_RESULTS_SOURCE."""
+    spec = spec or os.environ.get("F1_RESULTS_SOURCE", "fastf1")
+    if spec == "fastf1":
+        return FastF1Source()
+    if spec.startswith("local:"):
+        return LocalSource(spec[len("local:"):])
+    raise ValueError(f"Unknown results source '{spec}'")
+
+
+class RaceWatcher:
+    """Polls for each race's results after it runs, then ingests and settles it.
+
+    The calendar comes from the cached FastF1 schedule. Polling for a race
+    starts POLL_DELAY after its start and backs off exponentially until the
+    results are published or GIVE_UP_AFTER passes. Settlement is idempotent
+    (RaceSettlement markers), so restarts and extra workers are safe.
+    """
+
+    def __init__(self, app, source=None, clock=utc_now):
+        self.app = app
+        self.source = source or get_results_source()
+        self.clock = clock
+        self._attempts = {}  # (year, gp_name) -> (next poll time, backoff seconds)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def open_races(self, now):
+        """[(year, gp_name, start)] inside their polling window, calendar order."""
+        races = []
+        for year in sorted({(now - GIVE_UP_AFTER).year, now.year}):
+            try:
+                calendar = race_calendar(year)
+            except Exception as e:
+                log.warning("⚠️ No calendar for %s: %s", year, e)
+                continue
+            races += [
+                (year, gp_name, start) for gp_name, start in calendar
+                if start + POLL_DELAY <= now <= start + GIVE_UP_AFTER
+            ]
+        return races
+
+    def _finished(self, races):
+        from model import RaceSettlement
+        if not races:
+            return set()
+        rows = RaceSettlement.query.filter(
+            RaceSettlement.year.in_({year for year, _, _ in races}),
+            RaceSettlement.rated_at.isnot(None),
+        ).with_entities(RaceSettlement.year, RaceSettlement.race)
+        return {(year, race) for year, race in rows}
+
+    def process(self, year, gp_name):
+        """Ingest (if needed) and settle one race. False means not published yet."""
+        from points_utils import settle_race
+
+        if not is_race_cached(year, gp_name):
+            if not self.source.fetch(year, gp_name):
+                return False
+            log.info("📥 Results published for %s - %s", year, gp_name)
+        success, message = settle_race(year, gp_name)
+        log.info("%s", message)
+        return success
+
+    def tick(self, now=None):
+        """Poll every due race once; returns the races processed this tick."""
+        now = now or self.clock()
+        processed = []
+        with self.app.app_context():
+            races = self.open_races(now)
+            finished = self._finished(races)
+            for year, gp_name, start in races:
+                key = (year, gp_name)
+                if key in finished:
+                    self._attempts.pop(key, None)
+                    continue
+                next_poll, backoff = self._attempts.get(key, (start + POLL_DELAY, INITIAL_BACKOFF))
+                if now < next_poll:
+                    continue
+                try:
+                    done = self.process(year, gp_name)
+                except Exception as e:
+                    log.error("❌ Processing %s - %s failed: %s", year, gp_name, e)
+                    done = False
+                if done:
+                    self._attempts.pop(key, None)
+                    processed.append(key)
+                else:
+                    self._attempts[key] = (now + pd.Timedelta(seconds=backoff), min(backoff * 2, MAX_BACKOFF))
+                    log.info("⏳ %s - %s not ready, next poll in %ds", year, gp_name, backoff)
+        return processed
+
+    def seconds_until_next(self, now=None):
+        now = now or self.clock()
+        wakeups = [next_poll for next_poll, _ in self._attempts.values()]
+        try:
+            wakeups += [start + POLL_DELAY for _, start in race_calendar(now.year) if start + POLL_DELAY > now]
+        except Exception:
+            pass
+        if not wakeups:
+            return IDLE_SLEEP
+        return max(1.0, min(IDLE_SLEEP, (min(wakeups) - now).total_seconds()))
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                log.error("❌ Race watcher tick failed: %s", e)
+            self._stopped.wait(self.seconds_until_next())
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="race-watcher", daemon=True)
+            self._thread.start()
+            log.info("👀 Race watcher started (source: %s)", self.source.name)
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
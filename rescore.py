@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from core_utils import (
+    CACHE_DIR,
+    STORE_DIR,
+    race_dir,
+    list_race_files,
+    current_generation,
+    publish_generation,
+    clean_gp_name,
+)
+from archive_utils import has_race, archived_races, load_race_positions
+from log_utils import get_logger, pipeline_run, stage, count
+from scoring import get_rules, score_frame, BOOST_COMPONENTS, POINT_COLUMNS
+
+log = get_logger("rescore")
+
+# Only the raw inputs survive a rescore; every point column is rebuilt.
+RAW_COLUMNS = ["Driver", "Quali", "Race", "EventDate"]
+REPORT_FILE = "rescore_report.csv"
+
+
+def _next_generation_name():
+    os.makedirs(STORE_DIR, exist_ok=True)
+    numbers = [
+        int(name[4:]) for name in os.listdir(STORE_DIR)
+        if name.startswith("gen-") and name[4:].isdigit()
+    ]
+    return f"gen-{max(numbers, default=0) + 1:04d}"
+
+
+def load_raw_positions():
+    """Raw (Driver, Quali, Race, EventDate) rows of every stored race, tagged by file.
+
+    Positions come from the results archive where the event is archived and
+    from the race CSV itself for races cached before the archive existed.
+    """
+    directory = race_dir()
+    races = {tuple(file[:-4].split(" - ", 1)) for file in list_race_files()}
+    races = {(int(year), gp_name) for year, gp_name in races} | set(archived_races())
+
+    frames = []
+    for year, gp_name in sorted(races):
+        file = f"{year} - {gp_name}.csv"
+        if has_race(year, gp_name):
+            df = load_race_positions(year, gp_name)
+        else:
+            try:
+                df = pd.read_csv(os.path.join(directory, file))
+            except Exception as e:
+                log.warning("⚠️ Skipping unreadable %s: %s", file, e)
+                continue
+        if df.empty or not {"Driver", "Quali", "Race"}.issubset(df.columns):
+            log.warning("⚠️ Skipping %s: no raw positions", file)
+            continue
+        df = df[[c for c in RAW_COLUMNS if c in df.columns]].copy()
+        df["File"] = file
+        df["Year"] = year
+        df["Grand Prix"] = gp_name
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def write_generation(scored, version, rules):
+    """Write every race of `scored` into a new generation directory and publish it."""
+    name = _next_generation_name()
+    path = os.path.join(STORE_DIR, name)
+    tmp = path + ".tmp"
+    os.makedirs(tmp)
+
+    columns = [c for c in RAW_COLUMNS + POINT_COLUMNS if c in scored.columns]
+    for file, race in scored.groupby("File", sort=False):
+        race[columns].to_csv(os.path.join(tmp, file), index=False)
+
+    manifest = {
+        "generation": name,
+        "source": current_generation() or "legacy",
+        "rules_version": version,
+        "rules": rules,
+        "races": int(scored["File"].nunique()),
+        "rows": int(len(scored)),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Complete the directory before anyone can point at it, then swap the pointer.
+    os.rename(tmp, path)
+    publish_generation(name)
+    log.info("📦 Published store %s (%d races, rules v%s)", name, manifest["races"], version)
+    return name, path
+
+
+def drop_derived_caches():
+    """Remove per-season averages caches built from the old points."""
+    for file in os.listdir(CACHE_DIR):
+        if file.startswith("averages_") and file.endswith(".csv") or file == "Weighted Driver Averages.csv":
+            os.remove(os.path.join(CACHE_DIR, file))
+            log.info("🗑️ Dropped stale %s", file)
+
+
+def recompute_user_results(scored, version):
+    """Re-derive base/total points of every UserRaceResult from the rescored races.
+
+    One read, one vectorized join against the scored frame and one bulk UPDATE;
+    standings of every touched season are rebuilt from the new totals.
+    """
+    from model import db, UserRaceResult
+    from standings_utils import rebuild_standings
+
+    rows = db.session.query(
+        UserRaceResult.id, UserRaceResult.driver, UserRaceResult.year,
+        UserRaceResult.race, UserRaceResult.category,
+    ).all()
+    if not rows:
+        return 0
+
+    results = pd.DataFrame(rows, columns=["id", "driver", "year", "race", "category"])
+    races = scored.assign(race=scored["Grand Prix"].map(clean_gp_name))
+    races = races.drop_duplicates(["Year", "race", "Driver"], keep="last")
+    merged = results.merge(
+        races[["Year", "race", "Driver", *POINT_COLUMNS]],
+        left_on=["year", "race", "driver"], right_on=["Year", "race", "Driver"], how="inner",
+    )
+    if merged.empty:
+        return 0
+
+    category = merged["category"].fillna("").to_numpy()
+    bonus = np.zeros(len(merged))
+    for name, column in BOOST_COMPONENTS.items():
+        bonus = np.where(category == name, merged[column].to_numpy(dtype=float), bonus)
+    base = merged["Total Points"].to_numpy(dtype=float)
+
+    updates = [
+        {"id": int(i), "base_points": float(b), "total_points": float(b + x)}
+        for i, b, x in zip(merged["id"], base, bonus)
+    ]
+    db.session.bulk_update_mappings(UserRaceResult, updates)
+    db.session.commit()
+    count("rescore.user_results", len(updates))
+    log.info("🧮 Recomputed %d user race results under rules v%s", len(updates), version)
+
+    for year in sorted(merged["year"].dropna().unique()):
+        rebuild_standings(int(year))
+    return len(updates)
+
+
+def value_diff(before, after):
+    """Per-driver Weighted Total / Fantasy Value before and after, largest moves first."""
+    columns = ["Weighted Total", "Fantasy Value"]
+    before = before.reindex(columns=columns)
+    after = after.reindex(columns=columns)
+    diff = before.join(after, how="outer", lsuffix=" Before", rsuffix=" After")
+    for column in columns:
+        diff[f"{column} Delta"] = diff[f"{column} After"] - diff[f"{column} Before"]
+    diff = diff.reset_index().rename(columns={"index": "Driver"})
+    order = diff["Fantasy Value Delta"].abs().fillna(np.inf).sort_values(ascending=False).index
+    return diff.loc[order].reset_index(drop=True).round(2)
+
+
+def rescore_all(version=None, regenerate=True, recompute_results=False):
+    """Re-apply a scoring rule set to every stored race without touching the network.
+
+    Reads the stored raw positions, scores them in one kernel pass, writes a
+    new store generation, swaps it in, and (optionally) rebuilds ratings and
+    user results. Returns a summary dict; the per-driver value diff is saved
+    as rescore_report.csv inside the new generation.
+    """
+    from points_utils import generate_all_driver_ratings, get_price_table
+
+    version, rules = get_rules(version)
+    with pipeline_run("rescore"):
+        before = get_price_table().copy()
+
+        with stage("ingest"):
+            raw = load_raw_positions()
+        if raw.empty:
+            log.warning("⚠️ No stored races to rescore.")
+            return {"generation": None, "races": 0, "rows": 0}
+
+        with stage("score", items=len(raw)):
+            scored = score_frame(raw, version)
+        name, path = write_generation(scored, version, rules)
+        drop_derived_caches()
+
+        if regenerate:
+            generate_all_driver_ratings()
+
+        updated = 0
+        if recompute_results:
+            with stage("settle"):
+                updated = recompute_user_results(scored, version)
+
+        report = value_diff(before, get_price_table())
+        report.to_csv(os.path.join(path, REPORT_FILE), index=False)
+        changed = report[report["Fantasy Value Delta"].fillna(1) != 0]
+
+    log.info("✅ Rescore complete: %s, %d drivers changed value", name, len(changed))
+    return {
+        "generation": name,
+        "rules_version": version,
+        "races": int(scored["File"].nunique()),
+        "rows": int(len(scored)),
+        "user_results": updated,
+        "drivers_changed": int(len(changed)),
+        "report": report,
+    }
@@ -0,0 +1,138 @@
+import os
+import zlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response
+from flask_login import current_user
+from core_utils import get_data_version
+from log_utils import get_logger, count
+from concurrency import SingleFlight
+
+log = get_logger("response_cache")
+
+MAX_ENTRIES = int(os.environ.get("F1_RESPONSE_CACHE_SIZE", "256"))
+ENABLED = os.environ.get("F1_RESPONSE_CACHE", "1") != "0"
+
+
+class ResponseCache:
+    """LRU of rendered responses keyed by (route, args, segment, data version).
+
+    Entries from older data versions are dropped as soon as a newer version
+    is seen, so ingest and rating regeneration invalidate everything at once.
+    A render that started before the bump and finishes after it is neither
+    served nor stored, so it cannot wipe the newer entries.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        """True if `version` is the newest seen; a newer one drops every entry."""
+        if self._version is None or version > self._version:
+            if self._entries:
+                log.info("♻️ Data version changed, dropping %d cached responses", len(self._entries))
+            self._entries.clear()
+            self._version = version
+        return version == self._version
+
+    def get(self, key, version):
+        with self._lock:
+            if not self._check_version(version):
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, version, entry):
+        with self._lock:
+            if not self._check_version(version):
+                count("response_cache.stale_puts")
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = ResponseCache()
+_render_flight = SingleFlight()
+
+
+def user_segment():
+    """Cache segment for the current visitor.
+
+    Anonymous visitors share one segment. A logged-in user's segment changes
+    whenever their roster, boosts or balance change, so per-user fragments
+    never outlive the state they were rendered from.
+    """
+    if not current_user.is_authenticated:
+        return "anon"
+    state = f"{current_user.drivers}|{current_user.boosts}|{current_user.balance}"
+    return f"user:{current_user.id}:{zlib.crc32(state.encode()):08x}"
+
+
+def cached_view(per_user=False, vary=None):
+    """Serve a read-only view from the response cache.
+
+    per_user: logged-in users get their own segment (for pages that render
+    user-specific fragments); otherwise every visitor shares the entry.
+    vary: optional callable whose result is added to the key (e.g. the date).
+    Only successful, non-streamed responses are stored.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return view(*args, **kwargs)
+
+            key = (
+                request.endpoint,
+                request.method,
+                tuple(sorted(request.args.items(multi=True))),
+                tuple(sorted(request.form.items(multi=True))) if request.method == "POST" else (),
+                user_segment() if per_user else "all",
+                vary() if vary else None,
+            )
+            version = get_data_version()
+            entry = response_cache.get(key, version)
+            if entry is not None:
+                count("response_cache.hits")
+                body, status, mimetype = entry
+                response = make_response(body, status)
+                response.mimetype = mimetype
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            count("response_cache.misses")
+
+            def render():
+                # Identical concurrent misses render once; the others reuse the body.
+                rendered = make_response(view(*args, **kwargs))
+                if rendered.is_streamed:
+                    return rendered, None
+                entry = (rendered.get_data(), rendered.status_code, rendered.mimetype)
+                if rendered.status_code == 200:
+                    response_cache.put(key, version, entry)
+                return rendered, entry
+
+            response, entry = _render_flight.do((key, version), render)
+            if entry is not None:
+                body, status, mimetype = entry
+                response = make_response(body, status)
+                response.mimetype = mimetype
+            response.headers["X-Cache"] = "MISS"
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,315 @@
+import os
+import numpy as np
+import pandas as pd
+from core_utils import read_race_history, get_data_version
+from log_utils import get_logger
+from shared_dataset import load_or_build, RATING_COLUMNS
+from driver_registry import get_registry, driver_ids
+
+log = get_logger("cube")
+
+# F1_SHARED_DATASET=0 keeps the cube private to each process.
+SHARED = os.environ.get("F1_SHARED_DATASET", "1") != "0"
+
+# cube metric -> race store column
+METRICS = {
+    "quali": "Quali",
+    "race": "Race",
+    "gained": "+Pos",
+    "points_from_quali": "points_from_quali",
+    "points_from_race": "points_from_race",
+    "points_from_gain": "points_from_gain",
+    "points": "Total Points",
+}
+
+_cache = {"version": None, "cube": None}
+
+
+class ScoreCube:
+    """Dense season x round x driver arrays of every stored result.
+
+    values[metric] has shape (S, R, D) with NaN where a driver did not take
+    part; mask marks participation and race_mask marks rounds that exist.
+    Rounds are numbered by EventDate within each season, and the driver axis
+    is indexed by driver registry id (drivers[id] is the code).
+    """
+
+    def __init__(self, seasons, races, dates, drivers, values, mask, ratings=None):
+        self.seasons = seasons          # (S,) years
+        self.races = races              # (S, R) Grand Prix names ("" where no round)
+        self.dates = dates              # (S, R) datetime64
+        self.drivers = drivers          # (D,) driver codes
+        self.values = values            # {metric: (S, R, D) float}
+        self.mask = mask                # (S, R, D) bool
+        self.race_mask = races != ""    # (S, R) bool
+        self.ratings = ratings or {}    # {rating summary column: (D,) float}
+        self._season_index = {int(y): i for i, y in enumerate(seasons)}
+        self._driver_index = {d: i for i, d in enumerate(drivers)}
+
+    @classmethod
+    def from_history(cls, history):
+        history = history.dropna(subset=["Driver", "Year", "Grand Prix"])
+        if history.empty:
+            empty = np.zeros((0, 0, 0))
+            return cls(np.array([], dtype=int), np.zeros((0, 0), dtype=object),
+                       np.zeros((0, 0), dtype="datetime64[ns]"), np.array([], dtype=object),
+                       {m: empty for m in METRICS}, empty.astype(bool))
+
+        races = history.drop_duplicates(["Year", "Grand Prix"])[["Year", "Grand Prix", "EventDate"]]
+        races = races.sort_values(["Year", "EventDate", "Grand Prix"], ignore_index=True)
+        races["Round"] = races.groupby("Year").cumcount()
+        seasons = np.sort(races["Year"].unique()).astype(int)
+        season_idx = np.searchsorted(seasons, races["Year"].to_numpy())
+        n_rounds = int(races["Round"].max()) + 1
+
+        race_names = np.full((len(seasons), n_rounds), "", dtype=object)
+        dates = np.full((len(seasons), n_rounds), np.datetime64("NaT"), dtype="datetime64[ns]")
+        race_names[season_idx, races["Round"]] = races["Grand Prix"].to_numpy()
+        dates[season_idx, races["Round"]] = pd.to_datetime(races["EventDate"]).to_numpy()
+
+        rows = history.merge(races[["Year", "Grand Prix", "Round"]], on=["Year", "Grand Prix"])
+        rows = rows.drop_duplicates(["Year", "Round", "Driver"], keep="last")
+        driver_idx = rows["DriverId"].to_numpy() if "DriverId" in rows.columns else driver_ids(rows["Driver"])
+        driver_codes = get_registry().codes[:int(driver_idx.max()) + 1]
+        s = np.searchsorted(seasons, rows["Year"].to_numpy())
+        r = rows["Round"].to_numpy()
+
+        shape = (len(seasons), n_rounds, len(driver_codes))
+        mask = np.zeros(shape, dtype=bool)
+        mask[s, r, driver_idx] = True
+        values = {}
+        for metric, column in METRICS.items():
+            arr = np.full(shape, np.nan)
+            if column in rows.columns:
+                arr[s, r, driver_idx] = pd.to_numeric(rows[column], errors="coerce").to_numpy(dtype=float)
+            values[metric] = arr
+        return cls(seasons, race_names, dates, driver_codes.copy(), values, mask)
+
+    def to_arrays(self):
+        """(arrays, meta) for shared_dataset.publish; names go in the manifest."""
+        arrays = {f"values_{m}": v for m, v in self.values.items()}
+        arrays.update(mask=self.mask, dates=self.dates.astype("datetime64[ns]").view("int64"),
+                      seasons=self.seasons.astype(np.int64))
+        arrays.update({f"rating_{i}": self.ratings[c] for i, c in enumerate(RATING_COLUMNS) if c in self.ratings})
+        meta = {"drivers": [str(d) for d in self.drivers], "races": self.races.tolist()}
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, manifest, arrays):
+        """Rebuild a cube over memory-mapped arrays (no copy of the big arrays)."""
+        races = np.array(manifest["races"], dtype=object).reshape(arrays["mask"].shape[:2])
+        ratings = {c: arrays[f"rating_{i}"] for i, c in enumerate(RATING_COLUMNS) if f"rating_{i}" in arrays}
+        return cls(
+            np.asarray(arrays["seasons"]),
+            races,
+            np.asarray(arrays["dates"]).view("datetime64[ns]"),
+            np.array(manifest["drivers"], dtype=object),
+            {m: arrays[f"values_{m}"] for m in METRICS},
+            arrays["mask"],
+            ratings,
+        )
+
+    def rows(self, seasons=None):
+        """One row per stored result (store columns) for the selected seasons, oldest first.
+
+        Whole-number metrics come back as ints, as they are read from the
+        race files; the Q/R/+O text is formatted at render time anyway.
+        """
+        mask = self.mask
+        if seasons is not None:
+            mask = mask & np.isin(self.seasons, [int(y) for y in seasons])[:, None, None]
+        s, r, d = np.nonzero(mask)
+        df = pd.DataFrame({"Driver": self.drivers[d], "EventDate": self.dates[s, r]})
+        for metric, column in METRICS.items():
+            values = np.asarray(self.values[metric][s, r, d])
+            whole = not np.isnan(values).any() and np.array_equal(values, np.round(values))
+            df[column] = values.astype(np.int64) if whole else values
+        df["Year"] = self.seasons[s].astype(np.int64)
+        df["Grand Prix"] = self.races[s, r]
+        # Ids from the registry now, in case it changed since the cube was built.
+        df["DriverId"] = driver_ids(self.drivers)[d] if len(d) else d
+        return df.sort_values(["EventDate", "Driver"], ignore_index=True)
+
+    def to_history(self):
+        """Every stored result as one DataFrame. A full private copy: for admin and CLI use only."""
+        return self.rows()
+
+    # -- lookups -----------------------------------------------------------
+
+    def latest_race(self):
+        """(season, round) index of the round with the latest EventDate, or None."""
+        dated = self.race_mask & ~np.isnat(self.dates)
+        if not dated.any():
+            return None
+        keyed = np.where(dated, self.dates.view("int64"), np.iinfo(np.int64).min)
+        return np.unravel_index(int(keyed.argmax()), keyed.shape)
+
+    def driver_id(self, driver):
+        return self._driver_index.get(driver)
+
+    def season_id(self, year):
+        return self._season_index.get(int(year))
+
+    def _select(self, metric, seasons=None):
+        values = self.values[metric]
+        mask = self.mask
+        if seasons is not None:
+            idx = [self._season_index[y] for y in seasons if y in self._season_index]
+            values, mask = values[idx], mask[idx]
+        return values, mask
+
+    def _chronological(self, metric, seasons=None):
+        """(races, D) views in calendar order for per-driver sequence queries."""
+        values, mask = self._select(metric, seasons)
+        return values.reshape(-1, values.shape[-1]), mask.reshape(-1, mask.shape[-1])
+
+    # -- reductions --------------------------------------------------------
+
+    def race_counts(self, seasons=None):
+        return self._select("points", seasons)[1].sum(axis=(0, 1))
+
+    def averages(self, metric="points", seasons=None, last_n=None):
+        """(D,) mean of a metric over the selected seasons (or each driver's last n races)."""
+        values, mask = self._chronological(metric, seasons)
+        mask = mask & ~np.isnan(values)
+        if last_n is not None:
+            # Races counted from the end per driver; keep only each driver's last n.
+            from_end = np.cumsum(mask[::-1], axis=0)[::-1]
+            mask = mask & (from_end <= last_n)
+        total = np.where(mask, np.nan_to_num(values), 0).sum(axis=0)
+        n = mask.sum(axis=0)
+        return np.divide(total, n, out=np.full(total.shape, np.nan), where=n > 0)
+
+    def season_table(self, year, min_races=0, metrics=("quali", "race", "gained", "points")):
+        """Per-driver season averages as a DataFrame (store column names)."""
+        seasons = [int(year)]
+        counts = self.race_counts(seasons)
+        keep = counts >= max(min_races, 1)
+        df = pd.DataFrame({"Driver": self.drivers[keep]})
+        for metric in metrics:
+            df[METRICS[metric]] = self.averages(metric, seasons)[keep]
+        return df.round(2)
+
+    def rank(self, metric="points", seasons=None, last_n=None, ascending=False, min_races=1):
+        """[(driver, value)] best first by average metric."""
+        avg = self.averages(metric, seasons, last_n)
+        valid = (self.race_counts(seasons) >= min_races) & ~np.isnan(avg)
+        order = np.argsort(avg[valid] if ascending else -avg[valid], kind="stable")
+        return list(zip(self.drivers[valid][order], avg[valid][order]))
+
+    def race_ranks(self, metric="points", ascending=False):
+        """(S, R, D) finishing rank of every driver by a metric within each race (1 = best)."""
+        values = self.values[metric]
+        keyed = np.where(self.mask, values if ascending else -values, np.inf)
+        ranks = keyed.argsort(axis=-1, kind="stable").argsort(axis=-1) + 1
+        return np.where(self.mask, ranks, 0)
+
+    def streaks(self, metric="points", threshold=0.0, above=True, seasons=None):
+        """Per driver (current, longest) run of raced rounds meeting a threshold.
+
+        Rounds a driver missed are skipped rather than breaking the run.
+        """
+        values, mask = self._chronological(metric, seasons)
+        hit = (values >= threshold) if above else (values <= threshold)
+        current = np.zeros(len(self.drivers), dtype=int)
+        longest = np.zeros(len(self.drivers), dtype=int)
+        for d in range(len(self.drivers)):
+            seq = hit[mask[:, d], d].astype(int)
+            if not seq.size:
+                continue
+            # Run lengths via the positions of the misses.
+            breaks = np.flatnonzero(np.concatenate(([0], seq, [0])) == 0)
+            runs = np.diff(breaks) - 1
+            longest[d] = runs.max()
+            current[d] = runs[-1]
+        return current, longest
+
+    def head_to_head(self, a, b, metric="points", seasons=None, higher_is_better=True):
+        """Compare two drivers over the rounds both took part in."""
+        ia, ib = self.driver_id(a), self.driver_id(b)
+        if ia is None or ib is None:
+            return None
+        values, mask = self._chronological(metric, seasons)
+        both = mask[:, ia] & mask[:, ib]
+        va, vb = values[both, ia], values[both, ib]
+        diff = (va - vb) if higher_is_better else (vb - va)
+        return {
+            "races": int(both.sum()),
+            a: int((diff > 0).sum()),
+            b: int((diff < 0).sum()),
+            "ties": int((diff == 0).sum()),
+            "avg_margin": float(np.nanmean(diff)) if both.any() else None,
+        }
+
+    def recent(self, drivers, width, metrics=("quali", "race")):
+        """Each driver's last `width` results that have every metric, newest first.
+
+        Returns ({metric: (len(drivers), width) array, NaN-padded}, counts)
+        with counts[i] the number of filled slots for drivers[i].
+        """
+        out = {m: np.full((len(drivers), width), np.nan) for m in metrics}
+        counts = np.zeros(len(drivers), dtype=int)
+        cols = np.array([self._driver_index.get(d, -1) for d in drivers], dtype=int)
+        if not self.mask.size or not (cols >= 0).any():
+            return out, counts
+        series = {m: self._chronological(m)[0] for m in metrics}
+        valid = self._chronological(metrics[0])[1].copy()
+        for values in series.values():
+            valid &= ~np.isnan(values)
+        age = np.cumsum(valid[::-1], axis=0)[::-1] - 1          # 0 = the driver's newest result
+        slot = np.full(len(self.drivers), -1)
+        slot[cols[cols >= 0]] = np.flatnonzero(cols >= 0)
+        t, d = np.nonzero(valid & (age < width) & (slot >= 0)[None, :])
+        for m, values in series.items():
+            out[m][slot[d], age[t, d]] = values[t, d]
+        counts[cols >= 0] = np.minimum(valid.sum(axis=0), width)[cols[cols >= 0]]
+        return out, counts
+
+    def driver_rows(self, driver, metrics=tuple(METRICS)):
+        """Every stored race for one driver, newest first, as a DataFrame."""
+        d = self.driver_id(driver)
+        if d is None:
+            return pd.DataFrame()
+        s, r = np.nonzero(self.mask[:, :, d])
+        df = pd.DataFrame({
+            "Year": self.seasons[s],
+            "Grand Prix": self.races[s, r],
+            "EventDate": self.dates[s, r],
+            **{METRICS[m]: self.values[m][s, r, d] for m in metrics},
+        })
+        return df.sort_values("EventDate", ascending=False, ignore_index=True)
+
+
+def _rating_arrays(drivers):
+    from points_utils import get_price_table
+    prices = get_price_table().reindex(list(drivers))
+    return {c: prices[c].to_numpy(dtype=float) for c in RATING_COLUMNS if c in prices.columns}
+
+
+def build_cube():
+    cube = ScoreCube.from_history(read_race_history())
+    cube.ratings = _rating_arrays(cube.drivers)
+    return cube
+
+
+def get_cube():
+    """The ScoreCube for the current data version, rebuilt when data changes.
+
+    With SHARED on, the arrays are memory-mapped from the shared dataset so
+    every worker reads the same pages; the first worker to see a new data
+    version builds and publishes it.
+    """
+    version = get_data_version()
+    if _cache["version"] != version or _cache["cube"] is None:
+        cube = None
+        if SHARED:
+            try:
+                found = load_or_build(version, lambda: build_cube().to_arrays())
+                cube = ScoreCube.from_arrays(*found) if found else None
+            except OSError as e:
+                log.warning("⚠️ Shared dataset unavailable, building privately: %s", e)
+        if cube is None:
+            cube = build_cube()
+        _cache.update(version=version, cube=cube)
+        log.info("🧊 Loaded score cube %s (version %s)", cube.mask.shape, version)
+    return _cache["cube"]
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+# Scoring rules are data. Add a new version instead of editing an old one so
+# stored results can always be re-scored under the rules they were built with.
+RULE_SETS = {
+    1: {
+        "quali_base": 21, "quali_mult": 3,   # (21 - quali position) * 3
+        "race_base": 21, "race_mult": 1,     # (21 - race position) * 1
+        "gain_mult": 2, "gain_floor": 0,     # max(0, quali - race) * 2
+    },
+}
+CURRENT_RULES = 1
+
+# Which component a boost category doubles up on.
+BOOST_COMPONENTS = {
+    "qualifying": "points_from_quali",
+    "race": "points_from_race",
+    "pass": "points_from_gain",
+}
+
+POINT_COLUMNS = ["+Pos", "points_from_quali", "points_from_race", "points_from_gain", "Total Points"]
+
+_kernels = {}
+
+
+def get_rules(version=None):
+    version = CURRENT_RULES if version is None else int(version)
+    if version not in RULE_SETS:
+        raise ValueError(f"Unknown scoring rules version {version}")
+    return version, RULE_SETS[version]
+
+
+def compile_kernel(version=None):
+    """Return a function (quali, race) -> dict of point arrays for a rule set.
+
+    The kernel is pure NumPy broadcasting, so one call scores any number of
+    rows (a race, a season, every cached race, or a simulation matrix).
+    """
+    version, rules = get_rules(version)
+    if version in _kernels:
+        return _kernels[version]
+
+    qb, qm = rules["quali_base"], rules["quali_mult"]
+    rb, rm = rules["race_base"], rules["race_mult"]
+    gm, gf = rules["gain_mult"], rules["gain_floor"]
+
+    def kernel(quali, race):
+        quali = np.asarray(quali, dtype=float)
+        race = np.asarray(race, dtype=float)
+        gained = np.maximum(quali - race, gf)
+        points_quali = (qb - quali) * qm
+        points_race = (rb - race) * rm
+        points_gain = gained * gm
+        return {
+            "+Pos": gained,
+            "points_from_quali": points_quali,
+            "points_from_race": points_race,
+            "points_from_gain": points_gain,
+            "Total Points": points_quali + points_race + points_gain,
+        }
+
+    _kernels[version] = kernel
+    return kernel
+
+
+def score_frame(df, version=None, quali_col="Quali", race_col="Race"):
+    """Add +Pos, the three point components and Total Points to a results frame.
+
+    Works on a single race or on many races concatenated together; integer
+    positions produce integer point columns, matching the cached CSVs.
+    """
+    scores = compile_kernel(version)(df[quali_col].to_numpy(), df[race_col].to_numpy())
+    out = df.copy()
+    for column, values in scores.items():
+        integral = np.isfinite(values).all() and np.array_equal(values, np.round(values))
+        out[column] = values.astype(np.int64) if integral else values
+    return out
+
+
+def score_races(frames, version=None):
+    """Score several race frames in one kernel pass; returns one concatenated frame."""
+    if not frames:
+        return pd.DataFrame()
+    return score_frame(pd.concat(frames, ignore_index=True), version)
+
+
+def boost_bonus(category, quali, race, version=None):
+    """Extra points a boost adds: the boosted component scored once more."""
+    column = BOOST_COMPONENTS.get(category)
+    if column is None:
+        return 0
+    return compile_kernel(version)(quali, race)[column]
+
+
+def boost_bonuses(categories, quali, race, version=None):
+    """Vectorized boost_bonus: one kernel pass over parallel arrays; 0 for no/unknown category."""
+    scores = compile_kernel(version)(quali, race)
+    categories = np.asarray(categories, dtype=object)
+    bonus = np.zeros(len(categories))
+    for category, column in BOOST_COMPONENTS.items():
+        hit = categories == category
+        bonus[hit] = scores[column][hit]
+    return bonus
+
+
+def _as_text(series):
+    values = series.to_numpy(dtype=float)
+    if np.isfinite(values).all() and np.array_equal(values, np.round(values)):
+        return series.astype(np.int64).astype(str)
+    return series.astype(str)
+
+
+def with_breakdown(df):
+    """Replace the component columns with a "Q/R/+O" string column for display."""
+    parts = [_as_text(df[c]) for c in ("points_from_quali", "points_from_race", "points_from_gain")]
+    out = df.drop(columns=["points_from_quali", "points_from_race", "points_from_gain"])
+    out.insert(out.columns.get_loc("Total Points"), "Q/R/+O", parts[0] + "/" + parts[1] + "/" + parts[2])
+    return out
+
+
+def format_breakdown(row):
+    """"Q/R/+O" string for one result row, built only when it is rendered."""
+    try:
+        parts = [row["points_from_quali"], row["points_from_race"], row["points_from_gain"]]
+    except (KeyError, TypeError):
+        legacy = row.get("Q/R/+O") if hasattr(row, "get") else None
+        if legacy is not None:
+            return legacy
+        scores = compile_kernel()(row["Quali"], row["Race"])
+        parts = [scores["points_from_quali"], scores["points_from_race"], scores["points_from_gain"]]
+    return "/".join(str(int(p)) if p == p and float(p).is_integer() else str(p) for p in parts)
@@ -0,0 +1,207 @@
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from model import db, User, RosteredDrivers, Standing, RaceSettlement, UserSettlement
+from driver_registry import driver_ids
+from scoring import boost_bonuses, BOOST_COMPONENTS
+from log_utils import get_logger, count
+
+log = get_logger("preview")
+
+TOP_N = 10
+# Driver value changes larger than this fraction of the old value are flagged.
+VALUE_JUMP = 0.5
+
+
+def _frame(query, columns):
+    return pd.DataFrame(db.session.execute(query).all(), columns=columns)
+
+
+def _competition_ranks(points, worth, user_ids):
+    """Ranks as rerank() assigns them (1, 2, 2, 4), for aligned arrays."""
+    order = np.lexsort((user_ids, -worth, -points))
+    p, w = points[order], worth[order]
+    new_key = np.ones(len(order), dtype=bool)
+    new_key[1:] = (p[1:] != p[:-1]) | (w[1:] != w[:-1])
+    positions = np.arange(1, len(order) + 1)
+    ranks_sorted = np.maximum.accumulate(np.where(new_key, positions, 0))
+    ranks = np.empty(len(order), dtype=int)
+    ranks[order] = ranks_sorted
+    return ranks
+
+
+def _records(df, columns, n=TOP_N):
+    out = df[list(columns)]
+    out = out if n is None else out.head(n)
+    return out.astype(object).where(out.notna(), None).to_dict("records")
+
+
+def preview_settlement(df, race_name, year, top=TOP_N):
+    """What apply_boosts would do for this race, computed in memory without writing anything.
+
+    Loads users, rosters and standings with one query each, then scores every
+    (user, driver) pair in a single vectorized pass. Returns a summary dict
+    (totals, top scorers, rank movers, driver value changes, anomalies) plus
+    the per-pair "results" and per-user "users_frame" frames for callers that
+    want the full diff. Users already checkpointed for this race are left out, as
+    a resumed settlement would skip them.
+    """
+    from points_utils import generate_driver_rating
+    from core_utils import store_rules_version
+
+    started = time.perf_counter()
+    marker = RaceSettlement.query.filter_by(year=year, race=race_name).first()
+    users = _frame(select(User.id, User.username, User.drivers, User.boosts, User.balance),
+                   ["user_id", "username", "drivers", "boosts", "balance"])
+    rosters = _frame(
+        select(RosteredDrivers.id, RosteredDrivers.user_id, RosteredDrivers.driver_id, RosteredDrivers.races_owned,
+               RosteredDrivers.boost_points, RosteredDrivers.current_value),
+        ["roster_id", "user_id", "DriverId", "races_owned", "boost_points", "current_value"],
+    )
+    settled = {uid for (uid,) in db.session.execute(
+        select(UserSettlement.user_id).where(UserSettlement.year == year, UserSettlement.race == race_name,
+                                            UserSettlement.done.isnot(False)))}
+    pending = users[~users["user_id"].isin(settled)]
+
+    # (user, driver) pairs from the comma-separated teams.
+    pairs = (
+        pending.assign(Driver=pending["drivers"].fillna("").str.split(","))[["user_id", "username", "Driver"]]
+        .explode("Driver")
+    )
+    pairs = pairs[pairs["Driver"].fillna("") != ""].reset_index(drop=True)
+    pairs["DriverId"] = driver_ids(pairs["Driver"]) if len(pairs) else np.array([], dtype=int)
+
+    # "VER:race;NOR:pass" -> (user, driver, category); a repeated driver keeps the last entry.
+    boosts = pending[["user_id", "boosts"]].assign(boost=pending["boosts"].fillna("").str.split(";")).explode("boost")
+    boosts = boosts[boosts["boost"].fillna("").str.contains(":")]
+    boosts = pd.DataFrame({
+        "user_id": boosts["user_id"].to_numpy(),
+        "Driver": boosts["boost"].str.split(":").str[0].to_numpy(),
+        "category": boosts["boost"].str.split(":").str[1].to_numpy(),
+    }).drop_duplicates(["user_id", "Driver"], keep="last")
+
+    race = df.assign(DriverId=driver_ids(df["Driver"])).drop_duplicates("DriverId")
+    race = race[["DriverId", "Quali", "Race", "Total Points"]].rename(columns={"Total Points": "base_points"})
+
+    results = (
+        pairs.merge(race, on="DriverId", how="left", indicator="in_race")
+        .merge(rosters, on=["user_id", "DriverId"], how="left")
+        .merge(boosts, on=["user_id", "Driver"], how="left")
+    )
+    results["in_race"] = results["in_race"] == "both"
+    results["rostered"] = results["roster_id"].notna()
+    results["category"] = results["category"].fillna("")
+    scored = results["in_race"] & results["rostered"]
+
+    results["bonus"] = np.where(
+        scored,
+        boost_bonuses(results["category"], results["Quali"].to_numpy(dtype=float), results["Race"].to_numpy(dtype=float),
+                      store_rules_version()),
+        0.0,
+    )
+    results["base_points"] = pd.to_numeric(results["base_points"], errors="coerce")
+    results["total_points"] = np.where(scored, results["base_points"] + results["bonus"], 0.0)
+
+    # Values come from the ratings as they stand before this race is rated, as in settlement.
+    values = {code: generate_driver_rating(code).fantasy_value for code in results.loc[scored, "Driver"].unique()}
+    results["new_current_value"] = np.where(scored, results["Driver"].map(values).astype(float), results["current_value"])
+    results["new_races_owned"] = np.where(scored, results["races_owned"].fillna(0) + 1, results["races_owned"])
+    results["new_boost_points"] = np.where(scored, results["boost_points"].fillna(0) + results["bonus"], results["boost_points"])
+    results["value_change"] = results["new_current_value"] - results["current_value"]
+
+    # Per-user race points and projected standings.
+    race_points = results[scored].groupby("user_id")["total_points"].sum()
+    standings = _frame(select(Standing.user_id, Standing.season_points, Standing.rank).where(Standing.year == year),
+                       ["user_id", "season_points", "rank"])
+    per_user = users[["user_id", "username", "balance"]].merge(standings, on="user_id", how="left")
+    for column in ("balance", "season_points", "rank"):
+        per_user[column] = pd.to_numeric(per_user[column], errors="coerce")
+    per_user["race_points"] = per_user["user_id"].map(race_points).fillna(0.0)
+    per_user["new_season_points"] = per_user["season_points"].fillna(0) + per_user["race_points"]
+
+    holdings = rosters.set_index("roster_id")["current_value"].copy()
+    changed = results[scored]
+    holdings.loc[changed["roster_id"].to_numpy()] = changed["new_current_value"].to_numpy()
+    worth = holdings.groupby(rosters.set_index("roster_id")["user_id"]).sum()
+    per_user["new_net_worth"] = per_user["balance"].fillna(0) + per_user["user_id"].map(worth).fillna(0)
+    per_user["new_rank"] = _competition_ranks(per_user["new_season_points"].to_numpy(dtype=float),
+                                              per_user["new_net_worth"].to_numpy(dtype=float),
+                                              per_user["user_id"].to_numpy()) if len(per_user) else []
+    per_user["rank_change"] = per_user["rank"] - per_user["new_rank"]
+
+    drivers = (
+        results[scored].groupby("Driver")
+        .agg(owners=("user_id", "nunique"), base_points=("base_points", "first"),
+             old_value=("current_value", "mean"), new_value=("new_current_value", "first"))
+        .reset_index()
+    )
+    drivers["value_change"] = drivers["new_value"] - drivers["old_value"]
+
+    old_values = results["current_value"].abs()
+    anomalies = {
+        "not_in_race": _records(results[~results["in_race"]], ["username", "Driver"], None),
+        "missing_roster": _records(results[results["in_race"] & ~results["rostered"]], ["username", "Driver"], None),
+        "unknown_boost": _records(results[(results["category"] != "") & ~results["category"].isin(
+            list(BOOST_COMPONENTS))], ["username", "Driver", "category"], None),
+        "boost_not_on_team": _records(
+            boosts.merge(pairs[["user_id", "Driver"]], on=["user_id", "Driver"], how="left", indicator=True)
+            .query("_merge == 'left_only'").merge(users[["user_id", "username"]], on="user_id"),
+            ["username", "Driver", "category"], None),
+        "nan_points": _records(results[scored & results["total_points"].isna()], ["username", "Driver"], None),
+        "missing_value": sorted(code for code, value in values.items() if value is None or pd.isna(value)),
+        "value_jumps": _records(
+            results[scored & (results["value_change"].abs() > VALUE_JUMP * old_values.where(old_values > 0))]
+            .drop_duplicates("Driver"), ["Driver", "current_value", "new_current_value"], None),
+    }
+
+    scored_results = results[scored]
+    summary = {
+        "year": year,
+        "race": race_name,
+        "status": None if marker is None else (marker.status or "done"),
+        "would_settle": marker is None or not marker.done,
+        "users": len(pending),
+        "already_settled_users": len(settled),
+        "totals": {
+            "results": int(scored.sum()),
+            "boosted": int((scored_results["category"] != "").sum()),
+            "base_points": float(scored_results["base_points"].sum()),
+            "bonus_points": float(scored_results["bonus"].sum()),
+            "total_points": float(scored_results["total_points"].sum()),
+            "value_change": float(scored_results["value_change"].sum()),
+            "users_scoring": int(len(race_points)),
+        },
+        "top_scorers": _records(per_user.sort_values("race_points", ascending=False),
+                                ["username", "race_points", "new_season_points", "rank", "new_rank"], top),
+        "top_movers": _records(per_user[per_user["rank_change"].notna()].sort_values("rank_change", ascending=False),
+                               ["username", "rank", "new_rank", "rank_change", "race_points"], top),
+        "drivers": _records(drivers.sort_values("value_change", key=abs, ascending=False),
+                            ["Driver", "owners", "base_points", "old_value", "new_value", "value_change"], None),
+        "anomalies": anomalies,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "results": results,
+        "users_frame": per_user,
+    }
+    count("preview.runs")
+    log.info("🔍 Previewed %s - %s: %d users, %d results in %.1f ms", year, race_name, len(pending),
+             summary["totals"]["results"], summary["elapsed_ms"])
+    return summary
+
+
+def preview_latest_race():
+    """(success, summary or message) for the race /update_latest_race would settle."""
+    from core_utils import get_most_recent_race_by_event_date, is_race_cached, get_cached_race
+    from points_utils import clean_gp_name
+
+    last_race_info = get_most_recent_race_by_event_date()
+    if not last_race_info:
+        return False, "⚠️ No races with EventDate found in cache."
+    year = int(last_race_info["year"])
+    gp_name = clean_gp_name(last_race_info["gp_name"])
+    if not is_race_cached(year, gp_name):
+        return False, f"❌ Race not cached: {year} - {gp_name}"
+    df = get_cached_race(year, gp_name)
+    if df.empty:
+        return False, f"❌ Empty data for {gp_name}"
+    return True, preview_settlement(df, gp_name, year)
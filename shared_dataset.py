@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import numpy as np
+from log_utils import get_logger
+
+log = get_logger("shared")
+
+CACHE_DIR = "/mnt/f1_cache"
+# Derived arrays shared by every worker process through the page cache:
+#   shared/gen-<data version>/<array>.npy + manifest.json
+#   shared/CURRENT -> name of the generation in use (swapped with os.replace)
+SHARED_DIR = os.path.join(CACHE_DIR, "shared")
+POINTER = os.path.join(SHARED_DIR, "CURRENT")
+LOCK_PATH = os.path.join(SHARED_DIR, ".lock")
+KEEP_GENERATIONS = 2
+RATING_COLUMNS = ("Weighted Total", "Fantasy Value", "Previous Weighted")
+
+
+def _read_manifest(name):
+    try:
+        with open(os.path.join(SHARED_DIR, name, "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def current_generation():
+    try:
+        with open(POINTER) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def load(version):
+    """Memory-map the published generation for `version`, or None if there is none.
+
+    Returns (manifest, {array name: read-only memmap}).
+    """
+    name = current_generation()
+    manifest = _read_manifest(name) if name else None
+    if not manifest or manifest.get("data_version") != version:
+        return None
+    path = os.path.join(SHARED_DIR, name)
+    try:
+        arrays = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r") for key in manifest["arrays"]}
+    except (OSError, ValueError) as e:
+        log.warning("⚠️ Could not map shared dataset %s: %s", name, e)
+        return None
+    return manifest, arrays
+
+
+def publish(version, arrays, meta):
+    """Write a new generation and point readers at it atomically."""
+    os.makedirs(SHARED_DIR, exist_ok=True)
+    name = f"gen-{version}"
+    path = os.path.join(SHARED_DIR, name)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for key, array in arrays.items():
+        np.save(os.path.join(tmp, f"{key}.npy"), np.ascontiguousarray(array))
+    manifest = dict(meta, data_version=version, arrays=sorted(arrays), created_at=time.time())
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp, path)
+    pointer_tmp = f"{POINTER}.tmp-{os.getpid()}"
+    with open(pointer_tmp, "w") as f:
+        f.write(name)
+    os.replace(pointer_tmp, POINTER)
+    _prune(keep=name)
+    log.info("🗺️ Published shared dataset %s (%d arrays)", name, len(arrays))
+
+
+def _prune(keep):
+    # Mapped files stay readable after unlink, so old generations can go
+    # even while another worker still holds them.
+    generations = sorted(
+        (d for d in os.listdir(SHARED_DIR) if d.startswith("gen-") and ".tmp" not in d and d != keep),
+        key=lambda d: os.path.getmtime(os.path.join(SHARED_DIR, d)),
+    )
+    for name in generations[:max(0, len(generations) - (KEEP_GENERATIONS - 1))]:
+        shutil.rmtree(os.path.join(SHARED_DIR, name), ignore_errors=True)
+
+
+def load_or_build(version, build):
+    """Map the generation for `version`; if missing, one process builds and publishes it.
+
+    build() returns (arrays, meta). Other processes wait on the lock and then
+    map what the builder published instead of building their own copy.
+    """
+    found = load(version)
+    if found:
+        return found
+    os.makedirs(SHARED_DIR, exist_ok=True)
+    with open(LOCK_PATH, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            found = load(version)
+            if found:
+                return found
+            arrays, meta = build()
+            publish(version, arrays, meta)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return load(version)
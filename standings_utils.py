@@ -0,0 +1,194 @@
+from sqlalchemy import func
+from model import db, User, UserRaceResult, RosteredDrivers, Standing
+from log_utils import get_logger
+
+log = get_logger("standings")
+
+STARTING_BALANCE = 15_000_000
+
+
+def _net_worths():
+    """{user_id: balance + current value of rostered drivers} for every user."""
+    holdings = dict(
+        db.session.query(RosteredDrivers.user_id, func.coalesce(func.sum(RosteredDrivers.current_value), 0))
+        .group_by(RosteredDrivers.user_id)
+        .all()
+    )
+    return {
+        user_id: (balance or 0) + holdings.get(user_id, 0)
+        for user_id, balance in db.session.query(User.id, User.balance).all()
+    }
+
+
+def _ensure_rows(year, user_ids):
+    existing = {
+        user_id for (user_id,) in
+        db.session.query(Standing.user_id).filter(Standing.year == year).all()
+    }
+    missing = [
+        {"year": year, "user_id": uid, "season_points": 0, "last_race": "", "last_race_points": 0, "net_worth": 0}
+        for uid in user_ids if uid not in existing
+    ]
+    if missing:
+        db.session.bulk_insert_mappings(Standing, missing)
+
+
+def rerank(year):
+    """Assign competition ranks (1, 2, 2, 4) by season points, then net worth."""
+    rows = (
+        db.session.query(Standing.id, Standing.season_points, Standing.net_worth)
+        .filter(Standing.year == year)
+        .order_by(Standing.season_points.desc(), Standing.net_worth.desc(), Standing.user_id)
+        .all()
+    )
+    updates = []
+    rank, previous = 0, None
+    for position, (standing_id, points, worth) in enumerate(rows, start=1):
+        key = (points, worth)
+        if key != previous:
+            rank, previous = position, key
+        updates.append({"id": standing_id, "rank": rank})
+    db.session.bulk_update_mappings(Standing, updates)
+
+
+def update_standings_for_race(year, race_name, race_points):
+    """Fold one settled race into the standings (caller commits).
+
+    race_points maps user_id -> fantasy points scored in this race. Season
+    totals are incremented, net worth is refreshed for everybody from one
+    aggregate query, and ranks are recomputed once.
+    """
+    add_race_points(year, race_name, race_points)
+    finish_race_standings(year, race_name)
+    log.info("🏆 Standings updated for %s - %s (%d users scored)", year, race_name, len(race_points))
+
+
+def add_race_points(year, race_name, race_points, mark_last=True):
+    """Add one chunk of users' race points to their season totals (caller commits).
+
+    Only touches the given users, so settlement can fold points in chunk by
+    chunk inside the same transaction as the results. With mark_last False
+    (re-settling an older race) last_race is left alone and last_race_points
+    only change for users whose last race is this one.
+    """
+    if not race_points:
+        return
+    _ensure_rows(year, race_points)
+    rows = (
+        db.session.query(Standing.id, Standing.user_id, Standing.season_points, Standing.last_race,
+                         Standing.last_race_points)
+        .filter(Standing.year == year, Standing.user_id.in_(list(race_points)))
+        .all()
+    )
+    updates = []
+    for standing_id, user_id, season_points, last_race, last_race_points in rows:
+        update = {"id": standing_id, "season_points": (season_points or 0) + race_points[user_id]}
+        if mark_last or last_race == race_name:
+            update.update(last_race=race_name, last_race_points=race_points[user_id])
+        updates.append(update)
+    db.session.bulk_update_mappings(Standing, updates)
+
+
+def remove_race_points(year, race_name, race_points):
+    """Take a race's points back out of season totals before it is settled again (caller commits)."""
+    if not race_points:
+        return
+    rows = (
+        db.session.query(Standing.id, Standing.user_id, Standing.season_points, Standing.last_race)
+        .filter(Standing.year == year, Standing.user_id.in_(list(race_points)))
+        .all()
+    )
+    updates = []
+    for standing_id, user_id, season_points, last_race in rows:
+        update = {"id": standing_id, "season_points": (season_points or 0) - race_points[user_id]}
+        if last_race == race_name:
+            update["last_race_points"] = 0
+        updates.append(update)
+    db.session.bulk_update_mappings(Standing, updates)
+
+
+def finish_race_standings(year, race_name, mark_last=True):
+    """After a race's points are in: zero last-race points for non-scorers, refresh net worth, rerank."""
+    worths = _net_worths()
+    _ensure_rows(year, worths)
+    if mark_last:
+        (
+            Standing.query
+            .filter(Standing.year == year, Standing.last_race != race_name)
+            .update({"last_race": race_name, "last_race_points": 0}, synchronize_session=False)
+        )
+    db.session.bulk_update_mappings(Standing, [
+        {"id": standing_id, "net_worth": worths.get(user_id, net_worth or 0)}
+        for standing_id, user_id, net_worth in
+        db.session.query(Standing.id, Standing.user_id, Standing.net_worth).filter(Standing.year == year)
+    ])
+    rerank(year)
+
+
+def rebuild_standings(year):
+    """Recompute a season's standings from UserRaceResult (bootstrap or repair)."""
+    totals = dict(
+        db.session.query(UserRaceResult.user_id, func.sum(UserRaceResult.total_points))
+        .filter(UserRaceResult.year == year)
+        .group_by(UserRaceResult.user_id)
+        .all()
+    )
+    last = (
+        db.session.query(UserRaceResult.race)
+        .filter(UserRaceResult.year == year)
+        .order_by(UserRaceResult.id.desc())
+        .first()
+    )
+    last_race = last[0] if last else ""
+    last_points = dict(
+        db.session.query(UserRaceResult.user_id, func.sum(UserRaceResult.total_points))
+        .filter(UserRaceResult.year == year, UserRaceResult.race == last_race)
+        .group_by(UserRaceResult.user_id)
+        .all()
+    ) if last_race else {}
+
+    worths = _net_worths()
+    _ensure_rows(year, worths)
+    updates = [
+        {
+            "id": standing_id,
+            "season_points": totals.get(user_id, 0),
+            "last_race": last_race,
+            "last_race_points": last_points.get(user_id, 0),
+            "net_worth": worths.get(user_id, 0),
+        }
+        for standing_id, user_id in db.session.query(Standing.id, Standing.user_id).filter(Standing.year == year)
+    ]
+    db.session.bulk_update_mappings(Standing, updates)
+    rerank(year)
+    db.session.commit()
+    log.info("🏆 Rebuilt %s standings for %d users", year, len(updates))
+
+
+def latest_standings_year():
+    return db.session.query(func.max(Standing.year)).scalar()
+
+
+def leaderboard_page(year, page=1, per_page=50):
+    """One page of the league table, served from the (year, rank) index."""
+    return (
+        Standing.query
+        .join(User, User.id == Standing.user_id)
+        .add_columns(User.username)
+        .filter(Standing.year == year)
+        .order_by(Standing.rank, Standing.user_id)
+        .paginate(page=page, per_page=per_page, error_out=False)
+    )
+
+
+def standing_to_dict(standing, username):
+    return {
+        "rank": standing.rank,
+        "user_id": standing.user_id,
+        "username": username,
+        "season_points": round(standing.season_points or 0, 2),
+        "last_race": standing.last_race,
+        "last_race_points": round(standing.last_race_points or 0, 2),
+        "net_worth": round(standing.net_worth or 0),
+        "net_worth_delta": round((standing.net_worth or 0) - STARTING_BALANCE),
+    }
@@ -0,0 +1,161 @@
+import heapq
+import math
+from points_utils import get_price_table
+from projection_utils import get_projections
+
+MAX_TEAM_SIZE = 5
+STARTING_BALANCE = 15_000_000
+
+# metric name -> (source, column)
+METRICS = {
+    "weighted": ("prices", "Weighted Total"),
+    "value": ("prices", "Fantasy Value"),
+    "projected": ("projections", "Expected Points"),
+    "floor": ("projections", "P10"),
+    "ceiling": ("projections", "P90"),
+}
+
+
+def load_candidates(metric):
+    """[(driver, price, score)] for every driver with a price and a metric value."""
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}'. Choose from: {', '.join(METRICS)}")
+    prices = get_price_table()
+    source, column = METRICS[metric]
+    if source == "prices":
+        scores = prices[column] if column in prices.columns else {}
+    else:
+        projections = get_projections()
+        scores = projections.set_index("Driver")[column] if not projections.empty else {}
+
+    candidates = []
+    for driver, price in prices["Fantasy Value"].items():
+        if driver in scores and price == price and scores[driver] == scores[driver]:
+            candidates.append((driver, int(round(price)), float(scores[driver])))
+    return candidates
+
+
+def solve(candidates, budget, k=5, team_size=MAX_TEAM_SIZE, include=(), held=None, max_changes=None):
+    """Top-k rosters by total score with total cost <= budget (exact branch and bound).
+
+    candidates: [(driver, cost, score)]. Drivers in `include` are forced in.
+    held: {driver: refund} for drivers already owned. A held driver costs its
+    refund (keeping it forgoes the refund) and `budget` should already include
+    every refund; choosing a non-held driver counts as one change, bounded by
+    max_changes. Costs are compared in exact dollars, so a roster that fits
+    the budget to the dollar is kept. Returns [(score, cost, [drivers])] best first.
+    """
+    held = held or {}
+    items = []
+    for driver, cost, score in candidates:
+        cost = held.get(driver, cost)
+        items.append((driver, cost, score, driver not in held))
+    by_driver = {item[0]: item for item in items}
+
+    forced = [by_driver[d] for d in include if d in by_driver]
+    if len(forced) != len(set(include)):
+        missing = sorted(set(include) - set(by_driver))
+        raise ValueError(f"No price/metric for: {', '.join(missing)}")
+    base_cost = sum(i[1] for i in forced)
+    base_score = sum(i[2] for i in forced)
+    base_changes = sum(1 for i in forced if i[3])
+    if base_cost > budget or len(forced) > team_size:
+        return []
+    if max_changes is not None and base_changes > max_changes:
+        return []
+
+    forced_names = {i[0] for i in forced}
+    pool = sorted((i for i in items if i[0] not in forced_names), key=lambda i: (-i[2], i[1]))
+    n = len(pool)
+    suffix_min_cost = [0] * (n + 1)
+    suffix_min_cost[n] = math.inf
+    for idx in range(n - 1, -1, -1):
+        suffix_min_cost[idx] = min(pool[idx][1], suffix_min_cost[idx + 1])
+
+    best = []  # min-heap of (score, -cost, roster)
+    chosen = [i[0] for i in forced]
+
+    def record(score, cost):
+        entry = (round(score, 6), -cost, tuple(sorted(chosen)))
+        if len(best) < k:
+            heapq.heappush(best, entry)
+        elif entry > best[0]:
+            heapq.heapreplace(best, entry)
+
+    def bound(start, slots, budget_left, changes_left):
+        # Pool is sorted by score, so the next affordable items are the best case.
+        extra, taken = 0.0, 0
+        for driver, cost, score, is_change in pool[start:]:
+            if taken == slots or score <= 0:
+                break
+            if cost <= budget_left and (not is_change or changes_left > 0):
+                extra += score
+                taken += 1
+        return extra
+
+    def search(start, slots, budget_left, score, cost, changes_left):
+        if chosen:
+            record(score, cost)
+        if slots == 0 or start >= n or budget_left < suffix_min_cost[start]:
+            return
+        if len(best) == k and score + bound(start, slots, budget_left, changes_left) <= best[0][0]:
+            return
+        for idx in range(start, n):
+            driver, item_cost, item_score, is_change = pool[idx]
+            if item_cost > budget_left or (is_change and changes_left == 0):
+                continue
+            chosen.append(driver)
+            search(idx + 1, slots - 1, budget_left - item_cost, score + item_score, cost + item_cost,
+                   changes_left - is_change)
+            chosen.pop()
+
+    changes_left = math.inf if max_changes is None else max_changes - base_changes
+    search(0, team_size - len(forced), budget - base_cost, base_score, base_cost, changes_left)
+    return [(score, -neg_cost, list(roster)) for score, neg_cost, roster in sorted(best, reverse=True)]
+
+
+def best_rosters(metric="projected", budget=STARTING_BALANCE, k=5, include=(), exclude=()):
+    candidates = [c for c in load_candidates(metric) if c[0] not in set(exclude)]
+    prices = {driver: price for driver, price, _ in candidates}
+    return [
+        {
+            "drivers": roster,
+            "score": round(score, 2),
+            "cost": sum(prices[d] for d in roster),
+            "remaining": round(budget - sum(prices[d] for d in roster)),
+        }
+        for score, _, roster in solve(candidates, budget, k=k, include=include)
+    ]
+
+
+def best_swaps(balance, holdings, metric="projected", k=5, max_swaps=None, exclude=()):
+    """Best rosters reachable from the current one by selling/buying drivers.
+
+    holdings: {driver: refund} where refund is what selling pays out
+    (RosteredDrivers.current_value, as remove_driver refunds).
+    """
+    candidates = [c for c in load_candidates(metric) if c[0] not in set(exclude) or c[0] in holdings]
+    scores = {driver: score for driver, _, score in candidates}
+    # Drivers we own but cannot price can still be kept at no score.
+    for driver in holdings:
+        if driver not in scores:
+            candidates.append((driver, holdings[driver], 0.0))
+            scores[driver] = 0.0
+    prices = {driver: price for driver, price, _ in candidates}
+    budget = balance + sum(holdings.values())
+    current_score = sum(scores.get(d, 0) for d in holdings)
+
+    results = []
+    for score, _, roster in solve(candidates, budget, k=k, held=holdings, max_changes=max_swaps):
+        sells = sorted(set(holdings) - set(roster))
+        buys = sorted(set(roster) - set(holdings))
+        balance_after = balance + sum(holdings[d] for d in sells) - sum(prices[d] for d in buys)
+        results.append({
+            "drivers": roster,
+            "sell": sells,
+            "buy": buys,
+            "score": round(score, 2),
+            "gain": round(score - current_score, 2),
+            "balance_after": round(balance_after),
+        })
+    return results
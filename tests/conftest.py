@@ -0,0 +1,81 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model import db, User, RosteredDrivers, UserRaceResult, Standing  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    """A bare app on an in-memory database with every table created."""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def registry_file(tmp_path, monkeypatch):
+    """Keep the driver registry out of the real cache directory."""
+    import driver_registry
+    monkeypatch.setattr(driver_registry, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(driver_registry, "REGISTRY_PATH", str(tmp_path / "drivers.json"))
+    monkeypatch.setattr(driver_registry, "LOCK_PATH", str(tmp_path / "drivers.json.lock"))
+    driver_registry._registry.update(mtime=None, registry=None)
+    yield tmp_path
+    driver_registry._registry.update(mtime=None, registry=None)
+
+
+# Settlement fixtures shared by the settlement and preview tests.
+YEAR, RACE = 2031, "Test Grand Prix"
+
+
+class _Rating:
+    fantasy_value = 1_000_000
+
+
+@pytest.fixture
+def league(app, registry_file, monkeypatch):
+    """Nine users: boosted VER/NOR teams, plain LEC teams, one empty team, one driver not in the race."""
+    import points_utils
+    from driver_registry import get_registry
+
+    monkeypatch.setattr(points_utils, "generate_driver_rating", lambda driver: _Rating())
+    registry = get_registry()
+    teams = [("VER,NOR", "VER:race;NOR:qualifying"), ("LEC", ""), ("VER,HAM", "HAM:race"), ("", "")]
+    with app.app_context():
+        for i in range(9):
+            drivers, boosts = teams[i % len(teams)]
+            user = User(username=f"u{i}", password="x", balance=1000, drivers=drivers, boosts=boosts)
+            db.session.add(user)
+            db.session.flush()
+            for driver in filter(None, drivers.split(",")):
+                db.session.add(RosteredDrivers(user_id=user.id, driver=driver, driver_id=registry.id(driver),
+                                               hype_at_buy=1, value_at_buy=1, current_value=1,
+                                               boost_points=0, races_owned=0))
+        db.session.commit()
+    return app
+
+
+def race(points=(30.0, 28.0, 20.0)):
+    return pd.DataFrame({"Driver": ["VER", "NOR", "LEC"], "Quali": [1, 2, 3], "Race": [2, 1, 3],
+                         "Total Points": list(points)})
+
+
+def totals():
+    return {
+        "season_points": {s.user_id: s.season_points for s in Standing.query.filter_by(year=YEAR)},
+        "rosters": {(r.user_id, r.driver): (r.races_owned, r.boost_points) for r in RosteredDrivers.query},
+        "results": sorted((r.user_id, r.driver, r.category, r.total_points)
+                          for r in UserRaceResult.query.filter_by(year=YEAR, race=RACE)),
+    }
@@ -0,0 +1,39 @@
+import json
+
+import driver_registry
+from driver_registry import get_registry, intern, UNKNOWN_ID
+from model import db, RosteredDrivers, check_driver_ids
+
+
+def test_unknown_codes_share_one_sentinel(registry_file):
+    registry = get_registry()
+    assert registry.id("XXX") == UNKNOWN_ID
+    assert list(registry.ids(["VER", "XXX"])) == [0, UNKNOWN_ID]
+
+
+def test_ids_are_stored_with_each_driver(registry_file):
+    intern(["NEW"])
+    rows = json.loads((registry_file / "drivers.json").read_text())
+    assert [row["id"] for row in rows] == list(range(len(rows)))
+
+    # Reordering the file keeps every driver's id.
+    (registry_file / "drivers.json").write_text(json.dumps(rows[::-1]))
+    driver_registry._registry.update(mtime=None, registry=None)
+    assert get_registry().id("NEW") == rows[-1]["id"]
+    assert get_registry().id("VER") == 0
+
+
+def test_startup_check_remaps_ids_from_a_rebuilt_registry(app, registry_file):
+    with app.app_context():
+        db.session.add_all([
+            RosteredDrivers(user_id=1, driver="VER", driver_id=0, hype_at_buy=0, value_at_buy=1),
+            RosteredDrivers(user_id=1, driver="NOR", driver_id=0, hype_at_buy=0, value_at_buy=1),
+            RosteredDrivers(user_id=2, driver="NEW", driver_id=999, hype_at_buy=0, value_at_buy=1),
+        ])
+        db.session.commit()
+
+        assert check_driver_ids() == 2
+        registry = get_registry()
+        assert {r.driver: r.driver_id for r in RosteredDrivers.query} == {
+            "VER": 0, "NOR": registry.id("NOR"), "NEW": registry.id("NEW")}
+        assert check_driver_ids() == 0
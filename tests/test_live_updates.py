@@ -0,0 +1,60 @@
+import threading
+
+import live_updates
+from live_updates import Broadcaster
+
+
+def broadcaster(app, monkeypatch, **kwargs):
+    monkeypatch.setattr(live_updates, "get_data_version", lambda: live.next_version)
+    live = Broadcaster(app, build=lambda: {"leaderboard": []}, **kwargs)
+    live.next_version = 7
+    live.refresh()
+    return live
+
+
+def test_streams_over_the_cap_are_refused(app, monkeypatch):
+    live = broadcaster(app, monkeypatch, max_subscribers=1)
+    client = live.subscribe()
+    assert client is not None
+    assert live.subscribe() is None
+    live.unsubscribe(client)
+    assert live.subscribe() is not None
+
+
+def test_stream_sends_unseen_snapshot_then_closes(app, monkeypatch):
+    live = broadcaster(app, monkeypatch, lifetime=0.05)
+    frames = list(live.stream(live.subscribe()))
+    assert frames[0].startswith(b"retry:")
+    assert frames[1].startswith(b"id: 7\nevent: update\n")
+    assert all(frame == b": ping\n\n" for frame in frames[2:])
+
+    assert b"event: update" not in b"".join(live.stream(live.subscribe(), last_event_id=7))
+
+
+def test_one_publish_fans_out_to_every_mailbox(app, monkeypatch):
+    live = broadcaster(app, monkeypatch, lifetime=5)
+    streams = [live.stream(live.subscribe(), last_event_id=7) for _ in range(3)]
+    for stream in streams:
+        next(stream)   # retry hint; the stream is now waiting on its mailbox
+
+    received = []
+    readers = [threading.Thread(target=lambda s=s: received.append(next(s))) for s in streams]
+    for reader in readers:
+        reader.start()
+    live.next_version = 8
+    live.refresh()
+    for reader in readers:
+        reader.join(2)
+    assert len(received) == 3 and all(frame.startswith(b"id: 8\n") for frame in received)
+
+
+def test_slow_client_only_gets_the_newest_frame(app, monkeypatch):
+    live = broadcaster(app, monkeypatch, lifetime=5)
+    stream = live.stream(live.subscribe(), last_event_id=7)
+    next(stream)
+    for version in (8, 9, 10):
+        live.next_version = version
+        live.refresh()
+    assert next(stream).startswith(b"id: 10\n")
+    live.stop()
+    assert list(stream) == []
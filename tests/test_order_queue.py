@@ -0,0 +1,149 @@
+import pytest
+from sqlalchemy import update
+
+import order_queue
+from model import db, User, Trade, RosteredDrivers
+from order_queue import OrderQueue, MAX_REQUEUES
+
+PRICE = 100
+
+
+@pytest.fixture
+def queue(app, registry_file, monkeypatch):
+    monkeypatch.setattr(order_queue, "quote", lambda driver: (PRICE, 1.0))
+    with app.app_context():
+        db.session.add_all([User(username="a", password="x", balance=1000, drivers=""),
+                            User(username="b", password="x", balance=1000, drivers="")])
+        db.session.commit()
+    return OrderQueue(app)
+
+
+def interfere(monkeypatch, user_id, times):
+    """Change the user's team mid-batch (after the read, before the conditional UPDATE)."""
+    left = [times]
+
+    def quote(driver):
+        if left[0] > 0:
+            left[0] -= 1
+            current = db.session.get(User, user_id).drivers
+            db.session.execute(update(User).where(User.id == user_id)
+                               .values(drivers="" if current else "HAM")
+                               .execution_options(synchronize_session=False))
+        return PRICE, 1.0
+
+    monkeypatch.setattr(order_queue, "quote", quote)
+
+
+def submit(app, queue, *args):
+    with app.app_context():
+        return queue.submit(*args)
+
+
+def test_batch_fills_orders_for_many_users(app, queue):
+    orders = [submit(app, queue, 1, "buy", "VER"), submit(app, queue, 2, "buy", "NOR"),
+              submit(app, queue, 1, "buy", "LEC")]
+    assert queue.clear() == 3
+    assert [o.status for o in orders] == ["filled"] * 3
+    with app.app_context():
+        assert db.session.get(User, 1).balance == 1000 - 2 * PRICE
+        assert db.session.get(User, 1).drivers == "VER,LEC"
+        assert Trade.query.count() == 3 and RosteredDrivers.query.count() == 3
+
+
+def test_submit_checks_pending_orders(app, queue):
+    with app.app_context():
+        db.session.get(User, 1).balance = 150
+        db.session.commit()
+    first = submit(app, queue, 1, "buy", "VER")
+    second = submit(app, queue, 1, "buy", "NOR")
+    assert first.status == "queued"
+    assert second.status == "rejected" and "Not enough balance" in second.message
+
+
+def test_conflict_is_requeued_and_then_fills_once(app, queue, monkeypatch):
+    order = submit(app, queue, 1, "buy", "VER")
+    other = submit(app, queue, 2, "buy", "NOR")
+    interfere(monkeypatch, 1, times=1)
+
+    queue.clear()
+    assert order.status == "queued" and order.attempts == 1 and len(queue) == 1
+    assert other.status == "filled"
+
+    queue.clear()
+    assert order.status == "filled"
+    with app.app_context():
+        assert db.session.get(User, 1).balance == 1000 - PRICE
+        assert Trade.query.filter_by(user_id=1).count() == 1
+
+
+def test_conflicts_are_capped(app, queue, monkeypatch):
+    order = submit(app, queue, 1, "buy", "VER")
+    interfere(monkeypatch, 1, times=MAX_REQUEUES + 1)
+
+    for _ in range(MAX_REQUEUES + 1):
+        queue.clear()
+    assert order.status == "rejected" and "changed" in order.message
+    assert len(queue) == 0 and queue.clear() == 0
+    with app.app_context():
+        assert db.session.get(User, 1).balance == 1000
+        assert Trade.query.count() == 0 and RosteredDrivers.query.count() == 0
+
+
+def test_sell_finds_a_roster_row_with_a_stale_driver_id(app, queue):
+    with app.app_context():
+        db.session.get(User, 1).drivers = "HAM"
+        db.session.add(RosteredDrivers(user_id=1, driver="HAM", driver_id=None, hype_at_buy=0,
+                                       value_at_buy=300, current_value=250))
+        db.session.commit()
+    order = submit(app, queue, 1, "sell", "HAM")
+    queue.clear()
+    assert order.status == "filled" and order.price == 250
+    with app.app_context():
+        assert db.session.get(User, 1).balance == 1000 + 250
+        assert RosteredDrivers.query.count() == 0
+
+
+def test_conflict_retries_orders_the_stale_replay_rejected(app, queue, monkeypatch):
+    with app.app_context():
+        db.session.get(User, 1).drivers = "HAM"
+        db.session.add(RosteredDrivers(user_id=1, driver="HAM", driver_id=3, hype_at_buy=0,
+                                       value_at_buy=10, current_value=10))
+        db.session.commit()
+    buy = submit(app, queue, 1, "buy", "VER")
+    sell = submit(app, queue, 1, "sell", "HAM")
+    with app.app_context():
+        db.session.get(User, 1).balance = 50
+        db.session.commit()
+
+    # While the batch replays (buy rejected for balance, sell filled), another
+    # worker tops the user up and changes their team.
+    left = [1]
+
+    def quote(driver):
+        if left[0]:
+            left[0] -= 1
+            db.session.execute(update(User).where(User.id == 1).values(balance=1000, drivers="HAM,ALO")
+                               .execution_options(synchronize_session=False))
+        return PRICE, 1.0
+
+    monkeypatch.setattr(order_queue, "quote", quote)
+    queue.clear()
+    assert buy.status == sell.status == "queued" and len(queue) == 2
+
+    queue.clear()
+    assert buy.status == sell.status == "filled"
+    with app.app_context():
+        user = db.session.get(User, 1)
+        assert user.balance == 1000 - PRICE + 10
+        assert user.drivers == "ALO,VER"
+
+
+def test_direct_sell_finds_a_roster_row_with_a_stale_driver_id(app, queue):
+    from trade_utils import sell_driver
+    with app.app_context():
+        db.session.get(User, 1).drivers = "HAM"
+        db.session.add(RosteredDrivers(user_id=1, driver="HAM", driver_id=999, hype_at_buy=0,
+                                       value_at_buy=300, current_value=250))
+        db.session.commit()
+        assert sell_driver(1, "HAM") == (True, "✅ Sold HAM for $250")
+        assert RosteredDrivers.query.count() == 0
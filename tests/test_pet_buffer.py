@@ -0,0 +1,47 @@
+import pytest
+
+from model import db, Pet
+from pet_buffer import PetWriteBuffer, MAX_RETRIES, clean_fields
+
+
+@pytest.mark.parametrize("data", [{"food": "abc"}, {"food": 101}, {"water": -1}, {"xp": 1.5},
+                                  {"level": 0}, {"fun": True}, {"fun": float("nan")}])
+def test_clean_fields_rejects_bad_values(data):
+    with pytest.raises(ValueError):
+        clean_fields(data)
+
+
+def test_clean_fields_keeps_known_fields():
+    assert clean_fields({"food": 50, "xp": 3.0, "name": "x"}) == {"food": 50.0, "xp": 3}
+
+
+def test_put_rejects_bad_write_without_queueing(app):
+    buffer = PetWriteBuffer(app)
+    with pytest.raises(ValueError):
+        buffer.put(1, {"food": "abc"}, at=0)
+    assert buffer.pending(1) == []
+    assert buffer.flush() == 0
+
+
+def test_failing_pet_does_not_block_other_writes(app):
+    buffer = PetWriteBuffer(app)
+    buffer.put(1, {"food": 40}, at=0)
+    buffer.put(2, {"fun": 10}, at=0)
+    # A write that slipped past validation fails at commit time.
+    buffer._pending[3] = [(0, {"food": "abc"})]
+
+    assert buffer.flush() == 2
+    with app.app_context():
+        assert db.session.get(Pet, 1).food == 40
+        assert db.session.get(Pet, 2).fun == 10
+        assert db.session.get(Pet, 3) is None
+    assert buffer.pending(3)
+
+    # Later writes keep flushing while the bad pet is retried, then it is dropped.
+    for attempt in range(MAX_RETRIES):
+        buffer.put(1, {"food": 30 - attempt}, at=0)
+        assert buffer.flush() == 1
+    assert buffer.pending(3) == []
+    assert buffer.flush() == 0
+    with app.app_context():
+        assert db.session.get(Pet, 1).food == 30 - (MAX_RETRIES - 1)
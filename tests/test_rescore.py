@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+import core_utils
+import log_utils
+import points_utils
+import rescore
+import scoring
+
+RAW = pd.DataFrame({"Driver": ["VER", "NOR"], "Quali": [1, 2], "Race": [2, 1], "EventDate": ["2031-03-01"] * 2})
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch, registry_file):
+    """A race store in tmp_path with one race and a second scoring rule set."""
+    for module in (core_utils, rescore, points_utils):
+        monkeypatch.setattr(module, "CACHE_DIR", str(tmp_path))
+    for module in (core_utils, rescore):
+        monkeypatch.setattr(module, "STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(core_utils, "STORE_POINTER", str(tmp_path / "store" / "CURRENT"))
+    monkeypatch.setattr(core_utils, "DATA_VERSION_PATH", str(tmp_path / "data_version"))
+    monkeypatch.setattr(core_utils, "DATA_VERSION_LOCK", str(tmp_path / "data_version.lock"))
+    monkeypatch.setattr(log_utils, "RUN_LOG_PATH", str(tmp_path / "pipeline_runs.jsonl"))
+    monkeypatch.setattr(rescore, "archived_races", lambda: [])
+    monkeypatch.setitem(scoring.RULE_SETS, 2, dict(scoring.RULE_SETS[1], quali_mult=10))
+    monkeypatch.setattr(scoring, "_kernels", {})
+    scoring.score_frame(RAW).to_csv(tmp_path / "2031 - A Grand Prix.csv", index=False)
+
+    monkeypatch.setattr(core_utils, "has_race", lambda year, gp: True)
+    monkeypatch.setattr(core_utils, "load_race_positions", lambda year, gp: RAW.copy())
+    return tmp_path
+
+
+def test_races_fetched_after_a_rescore_use_its_rules(store):
+    summary = rescore.rescore_all(2, regenerate=False)
+    assert core_utils.store_rules_version() == 2
+
+    assert core_utils.fetch_and_cache_race(2031, "B Grand Prix")
+    rescored = pd.read_csv(core_utils.race_path(2031, "A Grand Prix"))
+    fetched = pd.read_csv(core_utils.race_path(2031, "B Grand Prix"))
+    assert summary["rules_version"] == 2
+    assert fetched["points_from_quali"].tolist() == rescored["points_from_quali"].tolist() == [200, 190]
+
+
+def test_rebuild_from_archive_keeps_the_store_rules(store, monkeypatch):
+    rescore.rescore_all(2, regenerate=False)
+    monkeypatch.setattr(core_utils, "archived_races", lambda: [(2031, "A Grand Prix")])
+    monkeypatch.setattr(core_utils, "load_session_results", lambda *args: None)
+
+    assert core_utils.rebuild_races_from_archive() == 1
+    assert pd.read_csv(core_utils.race_path(2031, "A Grand Prix"))["points_from_quali"].tolist() == [200, 190]
@@ -0,0 +1,51 @@
+import core_utils
+from response_cache import ResponseCache
+
+
+def test_data_version_is_a_counter(tmp_path, monkeypatch):
+    monkeypatch.setattr(core_utils, "DATA_VERSION_PATH", str(tmp_path / "data_version"))
+    monkeypatch.setattr(core_utils, "DATA_VERSION_LOCK", str(tmp_path / "data_version.lock"))
+    assert core_utils.get_data_version() == 0
+
+    first = core_utils.bump_data_version()
+    assert first > 0 and core_utils.get_data_version() == first
+    assert core_utils.bump_data_version() > first
+    assert core_utils.bump_data_version() == core_utils.get_data_version()
+
+
+def test_lost_counter_still_moves_forward(tmp_path, monkeypatch):
+    path = tmp_path / "data_version"
+    monkeypatch.setattr(core_utils, "DATA_VERSION_PATH", str(path))
+    monkeypatch.setattr(core_utils, "DATA_VERSION_LOCK", str(tmp_path / "data_version.lock"))
+    seen = core_utils.bump_data_version()
+
+    path.unlink()
+    assert core_utils.bump_data_version() > seen
+    path.write_text("garbage")
+    assert core_utils.bump_data_version() > seen
+
+
+def test_counter_ahead_of_the_clock_keeps_counting(tmp_path, monkeypatch):
+    path = tmp_path / "data_version"
+    monkeypatch.setattr(core_utils, "DATA_VERSION_PATH", str(path))
+    monkeypatch.setattr(core_utils, "DATA_VERSION_LOCK", str(tmp_path / "data_version.lock"))
+    path.write_text(str(2 ** 62))
+    assert core_utils.bump_data_version() == 2 ** 62 + 1
+
+
+def test_stale_put_does_not_reset_newer_entries():
+    cache = ResponseCache()
+    cache.put("page", 2, "new")
+    cache.put("other", 1, "rendered before the bump")
+    assert cache.get("page", 2) == "new"
+    assert cache.get("other", 2) is None
+    assert cache.get("page", 1) is None
+    assert len(cache) == 1
+
+
+def test_newer_version_drops_everything():
+    cache = ResponseCache()
+    cache.put("page", 1, "old")
+    assert cache.get("page", 2) is None
+    cache.put("page", 2, "new")
+    assert cache.get("page", 2) == "new" and len(cache) == 1
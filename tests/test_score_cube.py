@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from score_cube import ScoreCube
+
+
+def cube():
+    rows = [
+        (2030, "A Grand Prix", "2030-03-01", "VER", 1, 1),
+        (2030, "A Grand Prix", "2030-03-01", "NOR", 2, 3),
+        (2030, "B Grand Prix", "2030-04-01", "VER", 3, np.nan),
+        (2031, "A Grand Prix", "2031-03-01", "VER", 2, 2),
+        (2031, "A Grand Prix", "2031-03-01", "NOR", 1, 1),
+    ]
+    history = pd.DataFrame(rows, columns=["Year", "Grand Prix", "EventDate", "Driver", "Quali", "Race"])
+    history["EventDate"] = pd.to_datetime(history["EventDate"])
+    return ScoreCube.from_history(history)
+
+
+def test_recent_results_newest_first_skipping_incomplete_rows(registry_file):
+    recent, counts = cube().recent(["VER", "NOR", "XXX"], width=2)
+    assert list(counts) == [2, 2, 0]
+    np.testing.assert_array_equal(recent["quali"][0], [2, 1])
+    np.testing.assert_array_equal(recent["race"][1], [1, 3])
+    assert np.isnan(recent["quali"][2]).all()
+
+
+def test_rows_for_one_season(registry_file):
+    rows = cube().rows([2030])
+    assert list(rows["Driver"]) == ["NOR", "VER", "VER"]
+    assert set(rows["Year"]) == {2030}
+    assert len(cube().to_history()) == 5
@@ -0,0 +1,99 @@
+import points_utils
+import standings_utils
+from model import db, User, Standing, RaceSettlement, UserSettlement
+from settlement_preview import preview_settlement
+from conftest import YEAR, RACE, race, totals
+
+
+def test_settles_once(league):
+    with league.app_context():
+        assert points_utils.apply_boosts(race(), RACE, YEAR, chunk_size=4)
+        first = totals()
+        assert not points_utils.apply_boosts(race(), RACE, YEAR)
+        assert totals() == first
+        # VER 30 + race boost, NOR 28 + qualifying boost
+        assert first["season_points"][1] == 30 + 19 + 28 + 57
+        assert db.session.get(User, 1).boosts == ""
+
+
+def test_resume_after_crash_matches_clean_run(league, monkeypatch):
+    with league.app_context():
+        expected = preview_settlement(race(), RACE, YEAR)["users_frame"].set_index("user_id")["new_season_points"]
+
+        real_add, calls = standings_utils.add_race_points, []
+
+        def crash_on_second_chunk(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("worker died")
+            return real_add(*args, **kwargs)
+
+        monkeypatch.setattr(standings_utils, "add_race_points", crash_on_second_chunk)
+        assert not points_utils.apply_boosts(race(), RACE, YEAR, chunk_size=3)
+        marker = RaceSettlement.query.filter_by(year=YEAR, race=RACE).one()
+        assert marker.status == "running" and marker.users == 3
+        assert UserSettlement.query.count() == 3
+
+        monkeypatch.setattr(standings_utils, "add_race_points", real_add)
+        assert points_utils.apply_boosts(race(), RACE, YEAR, chunk_size=3)
+        after = totals()
+        assert after["season_points"] == expected.to_dict()
+        assert len(after["results"]) == len(set(after["results"])) == 10
+        assert all(owned == 1 for (_, driver), (owned, _) in after["rosters"].items() if driver != "HAM")
+
+
+def test_force_resettles_without_double_counting(league):
+    with league.app_context():
+        assert points_utils.apply_boosts(race(), RACE, YEAR, chunk_size=4)
+        before = totals()
+
+        assert points_utils.apply_boosts(race(), RACE, YEAR, force=True, chunk_size=4)
+        assert totals() == before
+        assert RaceSettlement.query.filter_by(year=YEAR, race=RACE).one().done
+
+
+def test_force_with_corrected_data_replaces_the_race(league):
+    with league.app_context():
+        assert points_utils.apply_boosts(race(), RACE, YEAR)
+        # Users set boosts for the next race before the correction is re-settled.
+        db.session.get(User, 1).boosts = "NOR:pass"
+        db.session.commit()
+
+        assert points_utils.apply_boosts(race((10.0, 28.0, 20.0)), RACE, YEAR, force=True)
+        after = totals()
+        assert after["season_points"][1] == 10 + 19 + 28 + 57
+        assert after["season_points"][2] == 20
+        assert after["rosters"][(1, "VER")] == (1, 19)
+        assert db.session.get(User, 1).boosts == "NOR:pass"
+
+
+def test_force_refuses_a_running_settlement(league, monkeypatch):
+    with league.app_context():
+        monkeypatch.setattr(standings_utils, "add_race_points", lambda *a, **k: 1 / 0)
+        assert not points_utils.apply_boosts(race(), RACE, YEAR)
+        assert not points_utils.apply_boosts(race(), RACE, YEAR, force=True)
+        assert UserSettlement.query.count() == 0
+
+
+def test_force_on_an_older_race_keeps_the_latest_race(league):
+    with league.app_context():
+        assert points_utils.apply_boosts(race(), RACE, YEAR)
+        assert points_utils.apply_boosts(race(), "Next Grand Prix", YEAR)
+        before = totals()
+
+        assert points_utils.apply_boosts(race((10.0, 28.0, 20.0)), RACE, YEAR, force=True)
+        standing = Standing.query.filter_by(year=YEAR, user_id=1).one()
+        assert standing.last_race == "Next Grand Prix"
+        assert standing.last_race_points == 30 + 28
+        assert standing.season_points == before["season_points"][1] - 20
+
+
+def test_force_on_a_race_settled_before_checkpoints(league):
+    with league.app_context():
+        assert points_utils.apply_boosts(race(), RACE, YEAR)
+        before = totals()
+        UserSettlement.query.delete()
+        db.session.commit()
+
+        assert points_utils.apply_boosts(race(), RACE, YEAR, force=True)
+        assert totals() == before
@@ -0,0 +1,22 @@
+import points_utils
+from model import Standing, UserRaceResult, RaceSettlement
+from settlement_preview import preview_settlement
+from conftest import YEAR, RACE, race, totals
+
+
+def test_preview_matches_settlement_and_writes_nothing(league):
+    with league.app_context():
+        preview = preview_settlement(race(), RACE, YEAR)
+        assert UserRaceResult.query.count() == 0 and RaceSettlement.query.count() == 0
+
+        assert points_utils.apply_boosts(race(), RACE, YEAR)
+        after = totals()
+        frame = preview["users_frame"].set_index("user_id")
+        assert frame["new_season_points"].to_dict() == after["season_points"]
+        assert frame["new_rank"].to_dict() == {s.user_id: s.rank for s in Standing.query.filter_by(year=YEAR)}
+        assert preview["totals"]["results"] == len(after["results"])
+        assert preview["totals"]["total_points"] == sum(r[3] for r in after["results"])
+        results = preview["results"][preview["results"]["rostered"] & preview["results"]["in_race"]]
+        assert {(r.user_id, r.Driver): (r.new_races_owned, r.new_boost_points) for r in results.itertuples()} == {
+            key: value for key, value in after["rosters"].items() if key[1] != "HAM"}
+        assert [a["Driver"] for a in preview["anomalies"]["not_in_race"]] == ["HAM", "HAM"]
@@ -0,0 +1,13 @@
+from team_solver import solve
+
+CANDIDATES = [("VER", 3_000_500, 10.0), ("NOR", 3_000_500, 9.0), ("LEC", 2_000_000, 1.0)]
+
+
+def test_roster_that_fits_to_the_dollar_is_kept():
+    best = solve(CANDIDATES, 6_001_000, k=1, team_size=2)
+    assert best == [(19.0, 6_001_000, ["NOR", "VER"])]
+
+
+def test_roster_a_dollar_over_budget_is_rejected():
+    best = solve(CANDIDATES, 6_000_999, k=1, team_size=2)
+    assert best[0][2] == ["LEC", "VER"]
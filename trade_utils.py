@@ -0,0 +1,161 @@
+import time
+import pandas as pd
+from sqlalchemy import select, update
+from model import db, User, RosteredDrivers, Trade
+from driver_registry import intern
+from log_utils import get_logger, count
+
+log = get_logger("trades")
+
+MAX_TEAM_SIZE = 5
+# Attempts before giving up when another request changed the same user's
+# team or balance between our read and our conditional UPDATE.
+MAX_ATTEMPTS = 5
+
+
+def quote(driver):
+    """(price, hype) for a driver from the cached price table.
+
+    Drivers missing from the table fall back to their (memoized) rating.
+    Price is 0 when no value is known.
+    """
+    from points_utils import get_price_table, generate_driver_rating
+
+    prices = get_price_table()
+    if driver in prices.index:
+        value, hype = prices.at[driver, "Fantasy Value"], prices.at[driver, "Weighted Total"]
+    else:
+        rating = generate_driver_rating(driver)
+        value, hype = rating.fantasy_value, rating.weighted_total
+    price = round(value) if value is not None and pd.notna(value) else 0
+    return price, (float(hype) if hype is not None and pd.notna(hype) else None)
+
+
+def team_of(drivers):
+    return drivers.split(",") if drivers else []
+
+
+def check_buy(team, balance, driver, price):
+    """Error message if `driver` can't be bought at `price`, else None."""
+    if not price:
+        return f"❌ No price available for {driver}."
+    if driver in team:
+        return "❌ Already on your team."
+    if len(team) >= MAX_TEAM_SIZE:
+        return "❌ Team full."
+    if balance < price:
+        return f"❌ Not enough balance. {driver} costs ${price:,}"
+    return None
+
+
+def check_sell(team, driver):
+    return None if driver in team else "❌ Driver not on your team."
+
+
+def read_user(user_id):
+    return db.session.execute(select(User.balance, User.drivers).where(User.id == user_id)).one_or_none()
+
+
+def _apply(user_id, old_drivers, new_team, delta, min_balance=None):
+    """Conditional UPDATE of one user's balance and team.
+
+    Matches only if the team is still `old_drivers` (and, for buys, the
+    balance still covers the price), so concurrent trades on the same user
+    can't both apply. Returns the new balance, or None if the row changed.
+    """
+    conditions = [User.id == user_id, User.drivers == old_drivers]
+    if min_balance is not None:
+        conditions.append(User.balance >= min_balance)
+    result = db.session.execute(
+        update(User).where(*conditions)
+        .values(balance=User.balance + delta, drivers=",".join(new_team))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        count("trades.conflicts")
+        return None
+    return db.session.execute(select(User.balance).where(User.id == user_id)).scalar_one()
+
+
+def trade_row(user_id, driver, side, price, hype, balance_after):
+    return Trade(
+        user_id=user_id, driver=driver, driver_id=intern([driver]).id(driver), side=side,
+        price=price, hype=hype, balance_after=balance_after, created_at=time.time(),
+    )
+
+
+def roster_row(user_id, driver, price, hype):
+    return RosteredDrivers(
+        user_id=user_id,
+        driver=driver,
+        driver_id=intern([driver]).id(driver),
+        hype_at_buy=hype or 0,
+        value_at_buy=price,
+        current_value=price,
+    )
+
+
+def buy_driver(user_id, driver):
+    """Buy a driver at the quoted price. Returns (success, message)."""
+    driver = driver.upper()
+    price, hype = quote(driver)
+
+    for _ in range(MAX_ATTEMPTS):
+        row = read_user(user_id)
+        if row is None:
+            return False, "❌ User not found."
+        team = team_of(row.drivers)
+        error = check_buy(team, row.balance, driver, price)
+        if error:
+            return False, error
+
+        balance = _apply(user_id, row.drivers, team + [driver], -price, min_balance=price)
+        if balance is None:
+            continue
+        db.session.add(roster_row(user_id, driver, price, hype))
+        db.session.add(trade_row(user_id, driver, "buy", price, hype, balance))
+        db.session.commit()
+        count("trades.buys")
+        log.info("🛒 User %s bought %s for $%s", user_id, driver, f"{price:,}")
+        return True, f"✅ Bought {driver} for ${price:,}"
+
+    log.warning("⚠️ Buy of %s by user %s kept conflicting, giving up", driver, user_id)
+    return False, "❌ Your team changed while buying, please retry."
+
+
+def sell_driver(user_id, driver):
+    """Sell a driver at its current value. Returns (success, message)."""
+    driver = driver.upper()
+
+    for _ in range(MAX_ATTEMPTS):
+        row = read_user(user_id)
+        if row is None:
+            return False, "❌ User not found."
+        team = team_of(row.drivers)
+        error = check_sell(team, driver)
+        if error:
+            return False, error
+
+        # By code: a row whose driver_id is NULL or stale must still be found and deleted.
+        record = RosteredDrivers.query.filter_by(user_id=user_id, driver=driver).first()
+        refund, hype = (record.current_value, None) if record else quote(driver)
+        refund = refund or 0
+
+        balance = _apply(user_id, row.drivers, [d for d in team if d != driver], refund)
+        if balance is None:
+            continue
+        if record:
+            db.session.delete(record)
+        db.session.add(trade_row(user_id, driver, "sell", refund, hype, balance))
+        db.session.commit()
+        count("trades.sells")
+        log.info("💸 User %s sold %s for $%s", user_id, driver, f"{round(refund):,}")
+        return True, f"✅ Sold {driver} for ${round(refund):,}"
+
+    log.warning("⚠️ Sale of %s by user %s kept conflicting, giving up", driver, user_id)
+    return False, "❌ Your team changed while selling, please retry."
+
+
+def recent_trades(user_id, limit=50):
+    return Trade.query.filter_by(user_id=user_id).order_by(Trade.id.desc()).limit(limit).all()
@@ -0,0 +1,78 @@
+import time
+import threading
+from log_utils import get_logger
+
+log = get_logger("warmup")
+
+_state = {"started_at": None, "finished_at": None, "steps": {}, "errors": {}}
+_lock = threading.Lock()
+_thread = None
+
+
+def _steps():
+    from core_utils import get_all_cached_drivers, get_last_processed_race, get_schedule, utc_now
+    from points_utils import generate_driver_rating, get_price_table, load_driver_ratings
+    from projection_utils import get_projections
+    from score_cube import get_cube
+    # Ratings, the price table and projections are per-worker memos keyed on the
+    # data version; they are built here so the first /generate_driver_rating,
+    # /profile and /api/solver requests after a deploy hit a warm cache.
+    return [
+        ("score_cube", get_cube),
+        ("drivers", get_all_cached_drivers),
+        ("latest_race", get_last_processed_race),
+        ("driver_ratings", lambda: [generate_driver_rating(d) for d in get_all_cached_drivers()]),
+        ("saved_ratings", load_driver_ratings),
+        ("rating_summaries", get_price_table),
+        ("projections", get_projections),
+        ("schedule", lambda: get_schedule(utc_now().year)),
+    ]
+
+
+def run_warmup():
+    """Build the in-memory indexes the cold request paths would otherwise build.
+
+    A failing step is recorded and skipped; the worker still becomes ready,
+    since every step is also built lazily on first use.
+    """
+    with _lock:
+        _state.update(started_at=time.time(), finished_at=None, steps={}, errors={})
+    for name, step in _steps():
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            log.warning("⚠️ Warm-up step %s failed: %s", name, e)
+            with _lock:
+                _state["errors"][name] = str(e)
+        with _lock:
+            _state["steps"][name] = round(time.perf_counter() - started, 3)
+    with _lock:
+        _state["finished_at"] = time.time()
+    log.info("🔥 Warm-up finished in %.2fs: %s", _state["finished_at"] - _state["started_at"], _state["steps"])
+
+
+def start_warmup():
+    """Run the warm-up once in a background thread (idempotent)."""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return _thread
+        _thread = threading.Thread(target=run_warmup, name="cache-warmup", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def is_ready():
+    return _state["finished_at"] is not None
+
+
+def warmup_status():
+    with _lock:
+        return {
+            "ready": _state["finished_at"] is not None,
+            "started_at": _state["started_at"],
+            "finished_at": _state["finished_at"],
+            "steps": dict(_state["steps"]),
+            "errors": dict(_state["errors"]),
+        }